@@ -0,0 +1,107 @@
+import collections
+import functools
+import threading
+from utils import Logs
+
+
+class SSH_Algorithm_Negotiation():
+    """
+    Description:
+        Chooses the algorithms of a connection from the client's and server's SSH_MSG_KEXINIT name-lists.
+
+        For every category the chosen algorithm is the first one in the client's list that is also in the
+        server's list (RFC 4253 7.1). The server's lists are turned into sets once, and results are memoized in a
+        bounded LRU shared by every connection, because in practice the same few clients send the same lists over
+        and over.
+    """
+
+    # Categories in the order they appear in SSH_MSG_KEXINIT
+    CATEGORIES = [
+        "kex_algorithms",
+        "server_host_key_algorithms",
+        "encryption_algorithms_client_to_server",
+        "encryption_algorithms_server_to_client",
+        "mac_algorithms_client_to_server",
+        "mac_algorithms_server_to_client",
+        "compression_algorithms_client_to_server",
+        "compression_algorithms_server_to_client",
+        "languages_client_to_server",
+        "languages_server_to_client"
+    ]
+    # Categories where finding no common algorithm is not an error
+    OPTIONAL_CATEGORIES = {"languages_client_to_server", "languages_server_to_client"}
+
+    CACHE_SIZE = 1024
+
+    cache = collections.OrderedDict()
+    hits = 0
+    misses = 0
+    lock = threading.Lock()
+
+    def negotiate(client_name_lists:list, server_name_lists:list):
+        """
+        Description:
+            Negotiates the algorithms of every category.
+
+        Parameters:
+            `client_name_lists`: the ten name-lists of the client's KEXINIT.
+            `server_name_lists`: the ten name-lists of the server's KEXINIT.
+
+        Returns:
+            A tuple with the chosen algorithm of every category, in KEXINIT order. A category is None if neither
+            side offered anything for it (or it's optional and there was no match).
+        """
+        N = SSH_Algorithm_Negotiation
+        client_key = tuple(tuple(name_list) for name_list in client_name_lists)
+        server_key = tuple(tuple(name_list) for name_list in server_name_lists)
+        key = (client_key, server_key)
+
+        with N.lock:
+            result = N.cache.get(key)
+            if result is not None:
+                N.hits += 1
+                N.cache.move_to_end(key)
+                return result
+            N.misses += 1
+
+        result = N.__negotiate(client_key, N.__server_index(server_key))
+
+        with N.lock:
+            N.cache[key] = result
+            if len(N.cache) > N.CACHE_SIZE:
+                N.cache.popitem(last=False)
+        return result
+
+    def cache_info():
+        """
+        Returns:
+            A dictionary with the hits, misses and current size of the negotiation cache.
+        """
+        N = SSH_Algorithm_Negotiation
+        with N.lock:
+            return {"hits" : N.hits, "misses" : N.misses, "size" : len(N.cache), "max_size" : N.CACHE_SIZE}
+
+    def clear_cache():
+        N = SSH_Algorithm_Negotiation
+        with N.lock:
+            N.cache.clear()
+            N.hits = N.misses = 0
+
+
+    """ Private Methods """
+    @functools.lru_cache(maxsize=64)
+    def __server_index(server_key:tuple):
+        return tuple(frozenset(name_list) for name_list in server_key)
+
+    def __negotiate(client_key:tuple, server_index:tuple):
+        N = SSH_Algorithm_Negotiation
+        if len(client_key) != len(N.CATEGORIES) or len(server_index) != len(N.CATEGORIES):
+            Logs.error(msg="Algorithm negotiation needs the ten KEXINIT name-lists!", additional=f"Client: {len(client_key)} Server: {len(server_index)}")
+
+        result = []
+        for category, client_list, server_set in zip(N.CATEGORIES, client_key, server_index):
+            chosen = next((name for name in client_list if name in server_set), None)
+            if chosen is None and (client_list or server_set) and category not in N.OPTIONAL_CATEGORIES:
+                Logs.error(msg=f"No common algorithm for {category}!", additional=f"Client: {client_list}\n\tServer: {sorted(server_set)}", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+            result.append(chosen)
+        return tuple(result)
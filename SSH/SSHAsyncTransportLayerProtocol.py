@@ -0,0 +1,666 @@
+import time
+import asyncio
+import collections
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol, SSH_Config
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+from SSH.SSHAlgorithmNegotiation import SSH_Algorithm_Negotiation
+from SSH.SSHKeyExchange import SSH_Key_Exchange
+from SSH.SSHHostKey import SSH_Host_Key
+from SSH.SSHInstrumentation import SSH_Instrumentation
+from SSH.SSHTranscript import SSH_Transcript
+from SSH.SSHTimerWheel import SSH_Timer_Wheel
+from SSH.SSHValidator import SSH_Validator
+from utils import Logs
+
+
+class SSH_Async_Transport_Layer_Protocol(asyncio.BufferedProtocol):
+    """
+    Description:
+        asyncio version of `SSH_Transport_Layer_Protocol`. One listener accepts any number of connections and
+        every connection runs its version exchange, algorithm negotiation and key exchange as a coroutine on
+        the event loop.
+
+        Received bytes are written by the event loop straight into the connection's `SSH_Packet_Decoder` buffer
+        (`get_buffer`/`buffer_updated`), so no intermediate bytes objects are created while reading. The first
+        read of a server connection goes to the thread's `SSH_Validator.scratch` buffer instead and is screened
+        there (`SSH_Validator.screen`): junk is dropped before the connection takes a buffer from the pool.
+
+        Keys are re-exchanged (RFC 4253 9) once `rekey_bytes` bytes or `rekey_packets` packets went through the
+        connection, or `rekey_seconds` passed, since the last exchange; or when the other side starts it. The
+        exchange runs in the background: packets already encoded keep going out under the old keys, data sent
+        meanwhile is held (without blocking the sender, up to `MAX_PENDING_BYTES`) and goes out under the new keys
+        as soon as own SSH_MSG_NEWKEYS is sent, and recieved data keeps being delivered.
+
+        Packets sent during one iteration of the event loop are coalesced and handed to the transport in a single
+        `writelines` call (earlier if `FLUSH_THRESHOLD` bytes are waiting), so chatty senders make one system call
+        per iteration instead of one per packet.
+
+        Connections are kept small for servers holding many idle sessions: attributes are `__slots__`, the
+        configuration is a shared `SSH_Config` and the recieve buffer is only held while bytes are buffered (see
+        `SSH_Packet_Decoder.release`). `benchmarks/SSHConnectionMemoryBenchmark.py` measures the memory of an idle
+        connection.
+
+        Timeouts and keepalives are timers on the event loop's `SSH_Timer_Wheel`, not one `call_later` each:
+            - the other side's ID string must arrive within `VERSION_EXCHANGE_TIMEOUT` seconds and the rest of
+              the handshake within `HANDSHAKE_TIMEOUT` seconds after it.
+            - once established, a connection that recieved nothing for `IDLE_TIMEOUT` seconds is disconnected.
+            - a SSH_MSG_IGNORE is sent when nothing was sent for `KEEPALIVE_INTERVAL` seconds.
+        Timeouts send SSH_MSG_DISCONNECT with their reason before closing (see `disconnect`). None disables a
+        timer. Activity is a timestamp updated once per read or write, timers only look at it when they expire.
+
+        Clients check the server's host key with their `host_key_verifier`, as `SSH_Transport_Layer_Protocol` does.
+    """
+
+    __slots__ = ("server_role", "on_connection", "transport", "id_str", "others_id_str", "own_kexinit", "others_kexinit",
+                 "others_name_lists", "algorithms", "shared_secret", "exchange_hash", "session_id", "config", "encoder",
+                 "decoder", "id_str_reader", "packets", "kex_packets", "outgoing", "outgoing_bytes", "flush_scheduled",
+                 "closed", "paused_reading", "stats", "transcript", "rekey_bytes", "rekey_packets", "rekey_seconds",
+                 "kex_in_progress", "awaiting_newkeys", "rekey_due", "pending_sends", "pending_bytes", "bytes_since_kex",
+                 "packets_since_kex", "rekeys", "handshake_done", "timer_wheel", "version_exchange_timeout",
+                 "handshake_timeout", "idle_timeout", "keepalive_interval", "last_received", "last_sent",
+                 "disconnect_reason", "host_key_verifier", "__id_str_waiter", "__packet_waiter", "__kex_waiter", "__kex_done",
+                 "__drain_waiter", "__rekey_timer", "__timer", "__keepalive_timer")
+
+    # Stop reading from the socket while this many received packets are waiting for `receive`
+    MAX_QUEUED_PACKETS = 64
+    # Message numbers of algorithm negotiation and key exchange (RFC 4250 4.1.2)
+    KEX_MESSAGES = (20, 49)
+    # Bytes of coalesced outgoing packets written without waiting for the end of the event loop iteration
+    FLUSH_THRESHOLD = 16 * 1024
+    # RFC 4253 9: keys should be re-exchanged after 1 GB of data or 1 hour, whichever comes first
+    REKEY_BYTES = 2**30
+    REKEY_PACKETS = 2**31
+    REKEY_SECONDS = 3600.0
+    # Bytes of payloads held while keys are re-exchanged before `send` waits for the exchange to finish
+    MAX_PENDING_BYTES = 1024 * 1024
+    # Seconds, None disables the timer
+    VERSION_EXCHANGE_TIMEOUT = 10.0
+    HANDSHAKE_TIMEOUT = 60.0
+    IDLE_TIMEOUT = None
+    KEEPALIVE_INTERVAL = None
+    MSG_IGNORE = SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_IGNORE"]
+    MSG_DISCONNECT = SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_DISCONNECT"]
+    KEEPALIVE = MSG_IGNORE.to_bytes(1) + SSH_Transport_Layer_Protocol_Utils.string_to_bytes(b"")
+
+    """ Constructors """
+    async def server(port:int, config:dict={}, on_connection=None, ip:str="localhost", backlog:int=4096, sock=None):
+        """
+        Description:
+            Starts listening on `ip`:`port`.
+
+        Parameters:
+            `port`: port to listen on. 0 chooses a free one.
+            `config`: configuration dictionary (see `SSH_Transport_Layer_Protocol.VALID_CONFIGS`).
+            `on_connection`: coroutine function called with every connection once its handshake is done.
+            `ip`: address to bind.
+            `backlog`: listen backlog.
+            `sock`: already bound socket to listen on instead of `ip`:`port` (e.g. one inherited from a parent
+                    process, or bound with SO_REUSEPORT).
+
+        Returns:
+            The `asyncio.Server`.
+
+        Notes:
+            Host keys missing for the algorithms of `config` are generated first (see `SSH_Host_Key.generate_signers`),
+            in a thread so the event loop keeps running.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, SSH_Host_Key.generate_signers, SSH_Config.intern(config)["SERVER_HOST_KEY_ALGS"])
+        def factory():
+            return SSH_Async_Transport_Layer_Protocol(server_role=True, config=config, on_connection=on_connection)
+        if sock is not None:
+            return await loop.create_server(factory, sock=sock, backlog=backlog)
+        return await loop.create_server(factory, ip, port, backlog=backlog)
+
+    async def client(port:int, ip:str, config:dict={}, host_key_verifier=None):
+        """
+        Description:
+            Connects to `ip`:`port` and waits for the handshake to finish.
+
+        Parameters:
+            `host_key_verifier`: called with `ip`, `port` and the server's public host key blob, returns whether
+                                 the key is known (see `SSH_Host_Key.known_hosts`). None accepts any key.
+
+        Returns:
+            The connected `SSH_Async_Transport_Layer_Protocol`.
+        """
+        loop = asyncio.get_running_loop()
+        verifier = None if host_key_verifier is None else lambda k_s: host_key_verifier(ip, port, k_s)
+        _, protocol = await loop.create_connection(
+            lambda: SSH_Async_Transport_Layer_Protocol(server_role=False, config=config, host_key_verifier=verifier), ip, port)
+        await protocol.handshake_done
+        return protocol
+
+    def __init__(self, server_role:bool, config:dict, on_connection=None, host_key_verifier=None):
+        self.server_role = server_role
+        self.on_connection = on_connection
+        self.host_key_verifier = host_key_verifier    # Called with K_S only, `client` binds the address
+        self.transport = None
+        self.id_str = None
+        self.others_id_str = None
+        self.own_kexinit = None
+        self.others_kexinit = None
+        self.others_name_lists = None
+        self.algorithms = None
+        self.shared_secret = None
+        self.exchange_hash = None
+        self.session_id = None
+        # Shared with every connection configured the same way
+        self.config = SSH_Config.intern(config)
+
+        self.encoder = SSH_Packet_Encoder()
+        self.decoder = SSH_Packet_Decoder()
+        # Only servers may send lines before their ID string (RFC 4253 4.2)
+        self.id_str_reader = SSH_ID_String_Reader(max_pre_id_lines=0 if server_role else SSH_ID_String_Reader.DEFAULT_MAX_PRE_ID_LINES)
+        self.packets = collections.deque()
+        # Lists rather than deques: they are empty most of the time and an empty list is much smaller
+        self.kex_packets = []  # Key exchange messages (20 to 49), read by the key exchange
+        self.outgoing = []
+        self.outgoing_bytes = 0
+        self.flush_scheduled = False
+        self.closed = False
+        self.paused_reading = False
+        self.stats = SSH_Instrumentation.connection_stats(server_role)
+        self.transcript = SSH_Transcript.recorder(server_role)
+
+        self.rekey_bytes = SSH_Async_Transport_Layer_Protocol.REKEY_BYTES
+        self.rekey_packets = SSH_Async_Transport_Layer_Protocol.REKEY_PACKETS
+        self.rekey_seconds = SSH_Async_Transport_Layer_Protocol.REKEY_SECONDS
+        self.kex_in_progress = True     # Until own SSH_MSG_NEWKEYS of the first exchange is sent
+        self.awaiting_newkeys = False   # Between own SSH_MSG_NEWKEYS and the other side's
+        self.rekey_due = False
+        self.pending_sends = []
+        self.pending_bytes = 0
+        self.bytes_since_kex = 0
+        self.packets_since_kex = 0
+        self.rekeys = 0
+
+        loop = asyncio.get_running_loop()
+        self.timer_wheel = SSH_Timer_Wheel.of_loop(loop)
+        self.version_exchange_timeout = SSH_Async_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT
+        self.handshake_timeout = SSH_Async_Transport_Layer_Protocol.HANDSHAKE_TIMEOUT
+        self.idle_timeout = SSH_Async_Transport_Layer_Protocol.IDLE_TIMEOUT
+        self.keepalive_interval = SSH_Async_Transport_Layer_Protocol.KEEPALIVE_INTERVAL
+        self.last_received = self.last_sent = time.monotonic()
+        self.disconnect_reason = None   # (reason, description) of the other side's SSH_MSG_DISCONNECT
+
+        self.handshake_done = loop.create_future()
+        self.__id_str_waiter = loop.create_future()
+        self.__packet_waiter = None
+        self.__kex_waiter = None
+        self.__kex_done = None
+        self.__drain_waiter = None
+        self.__rekey_timer = None
+        self.__timer = None             # Handshake timeout, then idle timeout
+        self.__keepalive_timer = None
+
+
+    """ asyncio callbacks """
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.version_exchange_timeout is not None:
+            self.__timer = self.timer_wheel.schedule(self.version_exchange_timeout, self.__version_exchange_timeout)
+        asyncio.get_running_loop().create_task(self.__handshake())
+
+    def get_buffer(self, sizehint:int):
+        if self.__screening():
+            return SSH_Validator.scratch()
+        return self.decoder.writable()
+
+    def buffer_updated(self, nbytes:int):
+        if self.__screening():
+            preamble = SSH_Validator.scratch()[:nbytes]
+            reason = SSH_Validator.screen(preamble)
+            if reason is not None:
+                self.__fail(ConnectionError(f"Preamble rejected: {reason}"))
+                return
+            self.decoder.feed(preamble)
+        else:
+            self.decoder.advance(nbytes)
+        self.last_received = time.monotonic()
+        if self.stats is not None:
+            self.stats.received_bytes(nbytes)
+        if self.transcript is not None: # Before decoding, which decrypts in place
+            self.transcript.inbound(self.decoder.view[self.decoder.end-nbytes:self.decoder.end])
+
+        if self.others_id_str is None:
+            try:
+                self.others_id_str = self.id_str_reader.read_from(self.decoder)
+            except Exception as e:
+                self.__fail(e)
+                return
+            if self.others_id_str is None:
+                return
+            self.id_str_reader = None
+            self.__id_str_waiter.set_result(self.others_id_str)
+            self.__cancel_timer()
+            if self.handshake_timeout is not None:
+                self.__timer = self.timer_wheel.schedule(self.handshake_timeout, self.__handshake_timeout)
+
+        self.__decode_buffered()
+
+    def __decode_buffered(self):
+        try:
+            for payload in self.decoder.packets():
+                self.bytes_since_kex += len(payload)
+                self.packets_since_kex += 1
+                if self.stats is not None:
+                    self.stats.received(payload)
+                if payload and SSH_Async_Transport_Layer_Protocol.KEX_MESSAGES[0] <= payload[0] <= SSH_Async_Transport_Layer_Protocol.KEX_MESSAGES[1]:
+                    self.kex_packets.append(bytes(payload))
+                    if payload[0] == SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_KEXINIT"] and not self.kex_in_progress:
+                        self.__start_rekey() # Started by the other side
+                    self.__wake(self.__kex_waiter)
+                elif payload and payload[0] == SSH_Async_Transport_Layer_Protocol.MSG_IGNORE:
+                    continue
+                elif payload and payload[0] == SSH_Async_Transport_Layer_Protocol.MSG_DISCONNECT:
+                    self.disconnect_reason = SSH_Transport_Layer_Protocol_Utils.parse_disconnect_packet(payload)
+                    Logs.error(msg="Disconnected by the other side!", additional=f"Reason: {self.disconnect_reason[0]}\n\tDescription: {self.disconnect_reason[1]}", reason=self.disconnect_reason[0])
+                else:
+                    self.packets.append(bytes(payload))
+        except Exception as e:
+            self.__fail(e)
+            return
+        self.__check_rekey()
+        # Payloads were copied, so the buffer can go back to the pool until more bytes arrive
+        self.decoder.release()
+
+        if self.packets:
+            self.__wake(self.__packet_waiter)
+            if len(self.packets) >= SSH_Async_Transport_Layer_Protocol.MAX_QUEUED_PACKETS and not self.paused_reading:
+                self.paused_reading = True
+                self.transport.pause_reading()
+
+    def pause_writing(self):
+        if self.__drain_waiter is None:
+            self.__drain_waiter = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        waiter, self.__drain_waiter = self.__drain_waiter, None
+        self.__wake(waiter)
+
+    def connection_lost(self, exc):
+        self.closed = True
+        # The last read (the one that saw EOF) took a buffer
+        self.decoder.release()
+        if self.transcript is not None:
+            self.transcript.close()
+        for timer in (self.__rekey_timer, self.__timer, self.__keepalive_timer):
+            if timer is not None:
+                timer.cancel()
+        self.__rekey_timer = self.__timer = self.__keepalive_timer = None
+        error = exc if exc is not None else ConnectionError("Connection closed by peer")
+        for waiter in (self.__id_str_waiter, self.__packet_waiter, self.__kex_waiter, self.__kex_done, self.__drain_waiter, self.handshake_done):
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(error)
+        # Nobody may be awaiting these, don't let asyncio report them as never retrieved
+        for waiter in (self.__id_str_waiter, self.__kex_done, self.handshake_done):
+            if waiter is not None and waiter.done() and not waiter.cancelled():
+                waiter.exception()
+
+
+    """ Handshake """
+    async def __handshake(self):
+        # The event loop already connected the socket, so there is no "connect" phase
+        try:
+            self.__phase("version_exchange")
+            await self.__protocol_version_exchange(sw_version="None", comments="None")
+            self.__phase("algorithm_negotiation")
+            await self.__algorithm_negotiation()
+            self.__phase("key_exchange")
+            await self.__key_exchange()
+        except Exception as e:
+            self.__phase("failed")
+            self.__fail(e)
+            return
+        self.__phase("established")
+        self.__cancel_timer()
+        if self.idle_timeout is not None:
+            self.__timer = self.timer_wheel.schedule(self.idle_timeout, self.__idle_timeout)
+        if self.keepalive_interval is not None:
+            self.__keepalive_timer = self.timer_wheel.schedule(self.keepalive_interval, self.__keepalive)
+        if not self.handshake_done.done():
+            self.handshake_done.set_result(True)
+        if self.on_connection is not None:
+            await self.on_connection(self)
+
+    # 2nd Step: Change ID strings
+    async def __protocol_version_exchange(self, sw_version:str, comments:str):
+        """
+            Description:
+                Does a ID String exchange and raises a exception if they are not compatible.
+        """
+        self.id_str = SSH_Transport_Layer_Protocol_Utils.create_id_str(SSH_Transport_Layer_Protocol.SSH_PROTOVERSION, sw_version, comments=comments)
+
+        # Own KEXINIT goes out in the same write as the ID string
+        self.own_kexinit = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, self.config)
+        data = self.id_str.encode() + self.encoder.encode(self.own_kexinit)
+        self.transport.write(data)
+        if self.transcript is not None:
+            self.transcript.outbound(data)
+        if self.stats is not None:
+            self.stats.sent(self.own_kexinit, len(data))
+        others_id_str = await self.__id_str_waiter
+
+        compatible, msg = SSH_Transport_Layer_Protocol_Utils.compare_id_strs(self.id_str, others_id_str, SSH_Transport_Layer_Protocol.SSH_PROTOVERSION)
+        if not compatible:
+            Logs.error(msg=msg, additional=f"Own ID string: {repr(self.id_str)}\n\tOther's ID string: {repr(others_id_str)}", reason="SSH_DISCONNECT_PROTOCOL_VERSION_NOT_SUPPORTED")
+
+    # 3rd Step: Algorithm Negotiation
+    async def __algorithm_negotiation(self):
+        """
+            Description:
+                Recieves the other side's SSH_MSG_KEXINIT. Own one was sent with the ID string.
+        """
+        self.others_kexinit = await self.__read_kex_packet()
+        _, self.others_name_lists, _ = SSH_Transport_Layer_Protocol_Utils.parse_kex_packet(self.others_kexinit)
+
+        own_name_lists = self.config.name_lists
+        if self.server_role:
+            client_name_lists, server_name_lists = self.others_name_lists, own_name_lists
+        else:
+            client_name_lists, server_name_lists = own_name_lists, self.others_name_lists
+        chosen = SSH_Algorithm_Negotiation.negotiate(client_name_lists, server_name_lists)
+        self.algorithms = dict(zip(SSH_Transport_Layer_Protocol.VALID_CONFIGS, chosen))
+
+    # 4th Step: Key exchange
+    async def __key_exchange(self):
+        """
+            Description:
+                Diffie-Hellman key exchange, with H signed by the server's host key, followed by SSH_MSG_NEWKEYS. The ephemeral keypair comes from the
+                keypair pool when one is running, so only the exponentiation with the other side's value is done here.
+        """
+        method = self.algorithms["DEFAULT_KEX_ALGS"]
+        if method is None: # Nothing to negotiate
+            return
+
+        host_key_algorithm = self.algorithms["SERVER_HOST_KEY_ALGS"]
+
+        if self.server_role: # It's a server
+            e = SSH_Key_Exchange.parse_kexdh_init(await self.__read_kex_packet())
+            y, f = SSH_Key_Exchange.get_keypair(method)
+            k = SSH_Key_Exchange.shared_secret(method, e, y)
+            signer = SSH_Host_Key.get_signer(host_key_algorithm) if host_key_algorithm is not None else None
+            k_s = signer.k_s if signer is not None else b""
+            h = SSH_Key_Exchange.exchange_hash(method, self.others_id_str, self.id_str, self.others_kexinit, self.own_kexinit, k_s, e, f, k)
+            signature = await asyncio.wrap_future(signer.submit(h)) if signer is not None else b""
+            await self.__send_packet(SSH_Key_Exchange.create_kexdh_reply(k_s, f, signature))
+        else: # It's a client
+            x, e = SSH_Key_Exchange.get_keypair(method)
+            await self.__send_packet(SSH_Key_Exchange.create_kexdh_init(e))
+            k_s, f, signature = SSH_Key_Exchange.parse_kexdh_reply(await self.__read_kex_packet())
+            k = SSH_Key_Exchange.shared_secret(method, f, x)
+            h = SSH_Key_Exchange.exchange_hash(method, self.id_str, self.others_id_str, self.own_kexinit, self.others_kexinit, k_s, e, f, k)
+            if host_key_algorithm is not None:
+                if SSH_Transport_Layer_Protocol_Utils.read_string(k_s, 0)[0] != host_key_algorithm.encode() or not SSH_Host_Key.verify(k_s, h, signature):
+                    self.__reject_host_key("Server's host key signature is not valid!", host_key_algorithm)
+            if self.host_key_verifier is not None and not self.host_key_verifier(bytes(k_s)):
+                self.__reject_host_key("Server's host key is not known!", host_key_algorithm)
+
+        self.shared_secret = k
+        self.exchange_hash = h
+        if self.session_id is None:
+            self.session_id = h
+        # Only needed for the exchange hash, don't keep them for the rest of the connection
+        self.own_kexinit = self.others_kexinit = self.others_name_lists = None
+
+        outgoing_keys, incoming_keys = SSH_Key_Exchange.derive_session_keys(method, k, h, self.session_id, self.algorithms, self.server_role)
+
+        # Each direction switches to the new keys at its own SSH_MSG_NEWKEYS
+        await self.__send_packet(SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_NEWKEYS"].to_bytes(1))
+        self.encoder.set_keys(**outgoing_keys)
+        self.__finish_kex()
+        if await self.__read_kex_packet() != SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_NEWKEYS"].to_bytes(1):
+            Logs.error(msg="Expected SSH_MSG_NEWKEYS!", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+        self.decoder.set_keys(**incoming_keys)
+        self.awaiting_newkeys = False
+        # Packets recieved after SSH_MSG_NEWKEYS waited in the buffer for the new keys
+        self.__decode_buffered()
+
+
+    """ Private Methods """
+    def __phase(self, name:str):
+        if self.stats is not None:
+            self.stats.phase(name)
+
+    def __screening(self):
+        # Nothing recieved yet on a server connection. `get_buffer` and `buffer_updated` of a read run back to
+        # back, so both see the same answer and the scratch buffer isn't overwritten in between
+        return self.server_role and self.others_id_str is None and self.decoder.buffer is None
+
+    def __wake(self, waiter):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def __fail(self, error:Exception):
+        if not self.handshake_done.done():
+            self.handshake_done.set_exception(error)
+            self.handshake_done.exception()
+        # Already closing after `disconnect`: aborting would drop the SSH_MSG_DISCONNECT
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.abort()
+
+    def __reject_host_key(self, msg:str, host_key_algorithm:str):
+        self.disconnect("SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE", msg)
+        Logs.error(msg=msg, additional=f"Algorithm: {host_key_algorithm}", reason="SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE")
+
+    async def __send_packet(self, payload):
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        self.__write_packet(payload)
+        if self.__drain_waiter is not None:
+            await self.__drain_waiter
+
+    def __write_packet(self, payload):
+        packet = self.encoder.encode(payload)
+        self.outgoing.append(packet)
+        self.outgoing_bytes += len(packet)
+        if self.outgoing_bytes >= SSH_Async_Transport_Layer_Protocol.FLUSH_THRESHOLD:
+            self.__flush()
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.__flush)
+        if self.stats is not None:
+            self.stats.sent(payload, len(packet))
+        self.bytes_since_kex += len(packet)
+        self.packets_since_kex += 1
+
+    def __flush(self):
+        self.flush_scheduled = False
+        if self.outgoing and not self.closed:
+            self.transport.writelines(self.outgoing)
+            self.last_sent = time.monotonic()
+            if self.transcript is not None:
+                for packet in self.outgoing:
+                    self.transcript.outbound(packet)
+        self.outgoing = []
+        self.outgoing_bytes = 0
+
+    async def __read_kex_packet(self):
+        while not self.kex_packets:
+            if self.closed:
+                raise ConnectionError("Connection is closed")
+            self.__kex_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__kex_waiter
+            finally:
+                self.__kex_waiter = None
+        return self.kex_packets.pop(0)
+
+    async def __read_packet(self):
+        while not self.packets:
+            if self.closed:
+                raise ConnectionError("Connection is closed")
+            self.__packet_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__packet_waiter
+            finally:
+                self.__packet_waiter = None
+
+        payload = self.packets.popleft()
+        if self.paused_reading and len(self.packets) < SSH_Async_Transport_Layer_Protocol.MAX_QUEUED_PACKETS // 2:
+            self.paused_reading = False
+            self.transport.resume_reading()
+        return payload
+
+
+    """ Key Re-exchange """
+    def __check_rekey(self):
+        # A new exchange can't start before the last one's SSH_MSG_NEWKEYS has been read
+        if self.kex_in_progress or self.awaiting_newkeys or self.closed:
+            return
+        if self.rekey_due or self.bytes_since_kex >= self.rekey_bytes or self.packets_since_kex >= self.rekey_packets:
+            self.__start_rekey()
+
+    def __rekey_timeout(self):
+        self.__rekey_timer = None
+        self.rekey_due = True
+        self.__check_rekey()
+
+    def __start_rekey(self):
+        """
+        Description:
+            Sends own SSH_MSG_KEXINIT, after the packets already queued, and runs the exchange in the background.
+        """
+        self.kex_in_progress = True
+        self.rekey_due = False
+        self.__kex_done = asyncio.get_running_loop().create_future()
+        self.own_kexinit = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, self.config)
+        self.__write_packet(self.own_kexinit)
+        asyncio.get_running_loop().create_task(self.__rekey())
+
+    async def __rekey(self):
+        try:
+            await self.__algorithm_negotiation()
+            await self.__key_exchange()
+        except Exception as e:
+            self.__fail(e)
+            return
+        self.rekeys += 1
+
+    def __finish_kex(self):
+        """
+        Description:
+            Called right after own SSH_MSG_NEWKEYS: new packets use the new keys from now on, so the payloads held
+            during the exchange go out now, without waiting for the other side's SSH_MSG_NEWKEYS.
+        """
+        self.kex_in_progress = False
+        self.awaiting_newkeys = True
+        self.bytes_since_kex = 0
+        self.packets_since_kex = 0
+        pending_sends, self.pending_sends = self.pending_sends, []
+        for payload in pending_sends:
+            self.__write_packet(payload)
+        self.pending_bytes = 0
+        self.__wake(self.__kex_done)
+        if self.__rekey_timer is not None:
+            self.__rekey_timer.cancel()
+        self.__rekey_timer = self.timer_wheel.schedule(self.rekey_seconds, self.__rekey_timeout)
+
+
+    """ Timeouts and Keepalives """
+    def __cancel_timer(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def __version_exchange_timeout(self):
+        self.__timer = None
+        self.disconnect("SSH_DISCONNECT_PROTOCOL_ERROR", "Timed out waiting for the identification string")
+
+    def __handshake_timeout(self):
+        self.__timer = None
+        self.disconnect("SSH_DISCONNECT_KEY_EXCHANGE_FAILED", "Timed out waiting for the key exchange")
+
+    def __idle_timeout(self):
+        self.__timer = None
+        idle = time.monotonic() - self.last_received
+        if idle < self.idle_timeout: # Something was recieved since the timer was armed
+            self.__timer = self.timer_wheel.schedule(self.idle_timeout - idle, self.__idle_timeout)
+            return
+        self.disconnect("SSH_DISCONNECT_BY_APPLICATION", "Idle timeout")
+
+    def __keepalive(self):
+        self.__keepalive_timer = None
+        if self.closed:
+            return
+        quiet = time.monotonic() - self.last_sent
+        if quiet >= self.keepalive_interval:
+            # Generic transport messages are allowed during key re-exchange too (RFC 4253 7.1)
+            self.__write_packet(SSH_Async_Transport_Layer_Protocol.KEEPALIVE)
+            quiet = 0.0
+        self.__keepalive_timer = self.timer_wheel.schedule(self.keepalive_interval - quiet, self.__keepalive)
+
+
+    """ With Methods """
+    async def __aenter__(self):
+        await self.handshake_done
+        return self
+
+    async def __aexit__(self, *exc_details):
+        self.close()
+
+
+    """ API Methods """
+    async def send(self, payload):
+        """
+        Description:
+            Sends `payload` in a binary packet. Waits if the transport's write buffer is full. While keys are
+            re-exchanged the payload is held and sent under the new keys, so this doesn't wait for the exchange.
+        """
+        await self.handshake_done
+        while self.kex_in_progress and self.pending_bytes >= SSH_Async_Transport_Layer_Protocol.MAX_PENDING_BYTES:
+            await self.__kex_done
+        if self.kex_in_progress:
+            # Only key exchange messages may be sent until own SSH_MSG_NEWKEYS
+            if self.closed:
+                raise ConnectionError("Connection is closed")
+            self.pending_sends.append(payload)
+            self.pending_bytes += len(payload)
+            return
+        await self.__send_packet(payload)
+        self.__check_rekey()
+
+    async def receive(self):
+        """
+        Description:
+            Waits for the next packet.
+
+        Returns:
+            The packet's payload as bytes.
+        """
+        await self.handshake_done
+        return await self.__read_packet()
+
+    def start_delayed_compression(self):
+        """
+        Description:
+            Starts `zlib@openssh.com` compression in both directions. Must be called once the user is authenticated.
+        """
+        self.encoder.compressor.activate()
+        self.decoder.decompressor.activate()
+
+    def disconnect(self, reason:str, description:str=""):
+        """
+        Description:
+            Sends SSH_MSG_DISCONNECT and closes the connection once it's written. A handshake still running fails.
+
+        Parameters:
+            `reason`: name of the reason in `DISCONNECT_MSG_CODES`.
+            `description`: human readable description of the reason.
+        """
+        if self.transport is None or self.closed:
+            return
+        self.__write_packet(SSH_Transport_Layer_Protocol_Utils.create_disconnect_packet(reason, description))
+        if not self.handshake_done.done():
+            self.handshake_done.set_exception(ConnectionError(f"Disconnected: {reason} ({description})"))
+            self.handshake_done.exception()
+        self.close()
+
+    def close(self):
+        if self.transport is not None and not self.closed:
+            self.__flush()
+            self.transport.close()
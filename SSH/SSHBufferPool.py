@@ -0,0 +1,62 @@
+import collections
+
+
+class SSH_Buffer_Pool():
+    """
+    Description:
+        Process-wide pool of receive buffers. Connections take a buffer when data arrives and give it back once
+        everything in it is consumed, so idle connections hold no buffer and a buffer is only allocated when more
+        connections are reading at the same time than ever before.
+
+        At most `MAX_FREE` free buffers of every size are kept, which bounds the memory the pool holds on to
+        after a burst of activity.
+
+    Notes:
+        Buffers are not cleared between owners. Whoever takes one must only read what it wrote into it.
+    """
+
+    MAX_FREE = 64
+
+    free = {}   # Size -> deque of free bytearrays
+    allocated = 0
+    reused = 0
+
+    def acquire(size:int):
+        """
+        Returns:
+            A bytearray of `size` bytes, reused if a free one exists.
+        """
+        free = SSH_Buffer_Pool.free.get(size)
+        if free:
+            try:
+                # deque.pop is atomic, so threads of the blocking transport can share the pool without a lock
+                buffer = free.pop()
+                SSH_Buffer_Pool.reused += 1
+                return buffer
+            except IndexError:
+                pass
+        SSH_Buffer_Pool.allocated += 1
+        return bytearray(size)
+
+    def release(buffer:bytearray):
+        """
+        Description:
+            Gives back a buffer taken with `acquire`. No view of it may be used afterwards.
+        """
+        free = SSH_Buffer_Pool.free.setdefault(len(buffer), collections.deque())
+        if len(free) < SSH_Buffer_Pool.MAX_FREE:
+            free.append(buffer)
+
+    def stats():
+        """
+        Returns:
+            A dictionary with the buffers "allocated" and "reused" so far, and the "free" ones and their "free_bytes".
+        """
+        free = sum(len(buffers) for buffers in SSH_Buffer_Pool.free.values())
+        free_bytes = sum(size * len(buffers) for size, buffers in SSH_Buffer_Pool.free.items())
+        return {"allocated" : SSH_Buffer_Pool.allocated, "reused" : SSH_Buffer_Pool.reused, "free" : free, "free_bytes" : free_bytes}
+
+    def clear():
+        SSH_Buffer_Pool.free = {}
+        SSH_Buffer_Pool.allocated = 0
+        SSH_Buffer_Pool.reused = 0
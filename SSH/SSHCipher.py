@@ -0,0 +1,254 @@
+from utils import Logs
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError: # Optional: the pure Python backend is used instead
+    Cipher = None
+
+
+class SSH_Cipher():
+    """
+    Description:
+        Registry of the encryption algorithms the transport can negotiate (RFC 4253 6.3).
+
+        Every algorithm is registered with the class implementing it and the lengths of its key, IV and block.
+        The class is built with the key and IV and must have `block_size` and `process(view)`, which encrypts or
+        decrypts `view` (a writable memoryview) in place.
+    """
+
+    # Name -> (class, key length, IV length, block size), in order of preference
+    REGISTRY = {}
+
+    def register(name:str, cipher_class, key_length:int, iv_length:int, block_size:int):
+        SSH_Cipher.REGISTRY[name] = (cipher_class, key_length, iv_length, block_size)
+
+    def algorithms():
+        """
+        Returns:
+            The names of the registered algorithms, in order of preference.
+        """
+        return list(SSH_Cipher.REGISTRY)
+
+    def key_length(name:str):
+        return SSH_Cipher.__get(name)[1]
+
+    def iv_length(name:str):
+        return SSH_Cipher.__get(name)[2]
+
+    def block_size(name:str):
+        return SSH_Cipher.__get(name)[3]
+
+    def create(name:str, key:bytes=b"", iv:bytes=b""):
+        """
+        Returns:
+            A new cipher of algorithm `name`.
+        """
+        cipher_class, key_length, iv_length, _ = SSH_Cipher.__get(name)
+        return cipher_class(key[:key_length], iv[:iv_length])
+
+    def __get(name:str):
+        if name not in SSH_Cipher.REGISTRY:
+            Logs.error(msg="Unsupported encryption algorithm!", additional=f"Algorithm: {name}")
+        return SSH_Cipher.REGISTRY[name]
+
+
+class SSH_None_Cipher():
+
+    block_size = 8
+
+    def __init__(self, key:bytes=b"", iv:bytes=b""):
+        pass
+
+    def process(self, view):
+        pass
+
+
+class SSH_AES_CTR_Cipher():
+    """
+    Description:
+        AES in counter mode (RFC 4344). Encryption and decryption are the same operation: XOR with the keystream.
+
+        The keystream is generated ahead in large blocks, so processing a packet is a single XOR of the whole
+        packet (done on integers, which runs in C) instead of one AES call per 16-byte block. Blocks start at
+        `MIN_KEYSTREAM_CHUNK` bytes and double on every refill up to `MAX_KEYSTREAM_CHUNK`, so short connections
+        don't pay for keystream they never use.
+
+        The keystream is generated by a backend from `BACKENDS`: "cryptography" (OpenSSL) when the `cryptography`
+        package is installed, or "python" (`SSH_AES`) otherwise. `DEFAULT_BACKEND` is the one picked automatically.
+    """
+
+    block_size = 16
+    MIN_KEYSTREAM_CHUNK = 1024
+    MAX_KEYSTREAM_CHUNK = 64 * 1024
+
+    BACKENDS = {}
+    DEFAULT_BACKEND = None
+
+    def __init__(self, key:bytes, iv:bytes, backend:str=None):
+        backend = backend or SSH_AES_CTR_Cipher.DEFAULT_BACKEND
+        if backend not in SSH_AES_CTR_Cipher.BACKENDS:
+            Logs.error(msg="Unknown AES backend!", additional=f"Backend: {backend}")
+        self.backend = backend
+        self.generator = SSH_AES_CTR_Cipher.BACKENDS[backend](key, iv)
+        self.keystream = b""
+        self.position = 0
+        self.chunk = SSH_AES_CTR_Cipher.MIN_KEYSTREAM_CHUNK
+
+    def process(self, view):
+        """
+        Description:
+            Encrypts or decrypts `view` in place, continuing the keystream where the previous call stopped.
+        """
+        n = len(view)
+        if n == 0:
+            return
+        if len(self.keystream) - self.position < n:
+            size = max(n, self.chunk)
+            size += -size % SSH_AES_CTR_Cipher.block_size
+            self.chunk = min(2 * self.chunk, SSH_AES_CTR_Cipher.MAX_KEYSTREAM_CHUNK)
+            self.keystream = self.keystream[self.position:] + self.generator(size)
+            self.position = 0
+        keystream = memoryview(self.keystream)[self.position:self.position+n]
+        view[:] = (int.from_bytes(view) ^ int.from_bytes(keystream)).to_bytes(n)
+        self.position += n
+
+
+class SSH_AES():
+    """
+    Description:
+        Pure Python AES (FIPS-197) block encryption, with the usual 32-bit lookup tables. Only encryption is
+        needed: counter mode never uses the inverse cipher.
+    """
+
+    def __init__(self, key:bytes):
+        if len(key) not in (16, 24, 32):
+            Logs.error(msg="Invalid AES key length!", additional=f"Length: {len(key)}")
+        self.rounds = {16 : 10, 24 : 12, 32 : 14}[len(key)]
+        self.round_keys = SSH_AES.__expand_key(key, self.rounds)
+
+    def encrypt_block(self, block:bytes):
+        return self.encrypt_words(*(int.from_bytes(block[i:i+4]) for i in range(0, 16, 4))).to_bytes(16)
+
+    def encrypt_words(self, s0:int, s1:int, s2:int, s3:int):
+        """
+        Returns:
+            The encryption of the block made of the four big endian words, as a 128-bit integer.
+        """
+        T0, T1, T2, T3, S = SSH_AES.T0, SSH_AES.T1, SSH_AES.T2, SSH_AES.T3, SSH_AES.SBOX
+        rk = self.round_keys
+        s0 ^= rk[0]; s1 ^= rk[1]; s2 ^= rk[2]; s3 ^= rk[3]
+        i = 4
+        for _ in range(self.rounds - 1):
+            t0 = T0[s0 >> 24] ^ T1[(s1 >> 16) & 255] ^ T2[(s2 >> 8) & 255] ^ T3[s3 & 255] ^ rk[i]
+            t1 = T0[s1 >> 24] ^ T1[(s2 >> 16) & 255] ^ T2[(s3 >> 8) & 255] ^ T3[s0 & 255] ^ rk[i+1]
+            t2 = T0[s2 >> 24] ^ T1[(s3 >> 16) & 255] ^ T2[(s0 >> 8) & 255] ^ T3[s1 & 255] ^ rk[i+2]
+            t3 = T0[s3 >> 24] ^ T1[(s0 >> 16) & 255] ^ T2[(s1 >> 8) & 255] ^ T3[s2 & 255] ^ rk[i+3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            i += 4
+        o0 = (S[s0 >> 24] << 24 | S[(s1 >> 16) & 255] << 16 | S[(s2 >> 8) & 255] << 8 | S[s3 & 255]) ^ rk[i]
+        o1 = (S[s1 >> 24] << 24 | S[(s2 >> 16) & 255] << 16 | S[(s3 >> 8) & 255] << 8 | S[s0 & 255]) ^ rk[i+1]
+        o2 = (S[s2 >> 24] << 24 | S[(s3 >> 16) & 255] << 16 | S[(s0 >> 8) & 255] << 8 | S[s1 & 255]) ^ rk[i+2]
+        o3 = (S[s3 >> 24] << 24 | S[(s0 >> 16) & 255] << 16 | S[(s1 >> 8) & 255] << 8 | S[s2 & 255]) ^ rk[i+3]
+        return o0 << 96 | o1 << 64 | o2 << 32 | o3
+
+    def __expand_key(key:bytes, rounds:int):
+        S = SSH_AES.SBOX
+        nk = len(key) // 4
+        words = [int.from_bytes(key[i:i+4]) for i in range(0, len(key), 4)]
+        rcon = 1
+        for i in range(nk, 4 * (rounds + 1)):
+            t = words[i-1]
+            if i % nk == 0:
+                t = ((t << 8) & 0xFFFFFFFF) | (t >> 24)
+                t = S[t >> 24] << 24 | S[(t >> 16) & 255] << 16 | S[(t >> 8) & 255] << 8 | S[t & 255]
+                t ^= rcon << 24
+                rcon = SSH_AES.xtime(rcon)
+            elif nk > 6 and i % nk == 4:
+                t = S[t >> 24] << 24 | S[(t >> 16) & 255] << 16 | S[(t >> 8) & 255] << 8 | S[t & 255]
+            words.append(words[i-nk] ^ t)
+        return words
+
+    def xtime(a:int):
+        a <<= 1
+        return a ^ 0x11B if a & 0x100 else a
+
+    def build_tables():
+        """
+        Description:
+            Computes the S-box (multiplicative inverse in GF(2^8) followed by the affine transformation) and the
+            round tables.
+        """
+        exp, log = [0] * 256, [0] * 256
+        a = 1
+        for i in range(255):
+            exp[i], log[a] = a, i
+            a ^= SSH_AES.xtime(a) # Multiply by the generator 3
+        sbox = []
+        for x in range(256):
+            inv = exp[(255 - log[x]) % 255] if x else 0
+            s = inv
+            for shift in range(1, 5):
+                s ^= ((inv << shift) | (inv >> (8 - shift))) & 0xFF
+            sbox.append(s ^ 0x63)
+
+        t0 = [SSH_AES.xtime(s) << 24 | s << 16 | s << 8 | (SSH_AES.xtime(s) ^ s) for s in sbox]
+        ror = lambda w, n: ((w >> n) | (w << (32 - n))) & 0xFFFFFFFF
+        SSH_AES.SBOX = sbox
+        SSH_AES.T0 = t0
+        SSH_AES.T1 = [ror(w, 8) for w in t0]
+        SSH_AES.T2 = [ror(w, 16) for w in t0]
+        SSH_AES.T3 = [ror(w, 24) for w in t0]
+
+SSH_AES.build_tables()
+
+
+class SSH_Python_AES_CTR_Keystream():
+    """
+    Description:
+        Keystream generator of the "python" backend: encrypts consecutive counter blocks with `SSH_AES`.
+    """
+
+    COUNTER_MASK = (1 << 128) - 1
+
+    def __init__(self, key:bytes, iv:bytes):
+        self.aes = SSH_AES(key)
+        self.counter = int.from_bytes(iv)
+
+    def __call__(self, n:int):
+        """
+        Returns:
+            The next `n` bytes of keystream. `n` must be a multiple of the block size.
+        """
+        encrypt = self.aes.encrypt_words
+        counter = self.counter
+        blocks = []
+        for _ in range(n // 16):
+            blocks.append(encrypt(counter >> 96, (counter >> 64) & 0xFFFFFFFF, (counter >> 32) & 0xFFFFFFFF, counter & 0xFFFFFFFF).to_bytes(16))
+            counter = (counter + 1) & SSH_Python_AES_CTR_Keystream.COUNTER_MASK
+        self.counter = counter
+        return b"".join(blocks)
+
+
+class SSH_Cryptography_AES_CTR_Keystream():
+    """
+    Description:
+        Keystream generator of the "cryptography" backend (OpenSSL).
+    """
+
+    def __init__(self, key:bytes, iv:bytes):
+        self.encryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).encryptor()
+
+    def __call__(self, n:int):
+        return self.encryptor.update(bytes(n))
+
+
+SSH_AES_CTR_Cipher.BACKENDS["python"] = SSH_Python_AES_CTR_Keystream
+if Cipher is not None:
+    SSH_AES_CTR_Cipher.BACKENDS["cryptography"] = SSH_Cryptography_AES_CTR_Keystream
+SSH_AES_CTR_Cipher.DEFAULT_BACKEND = "cryptography" if Cipher is not None else "python"
+
+# The transport's default ENCRYP_*_ALGS
+SSH_Cipher.register("aes128-ctr", SSH_AES_CTR_Cipher, 16, 16, 16)   # RECOMMENDED     AES with 128-bit key in counter mode
+SSH_Cipher.register("aes192-ctr", SSH_AES_CTR_Cipher, 24, 16, 16)   # RECOMMENDED     AES with 192-bit key in counter mode
+SSH_Cipher.register("aes256-ctr", SSH_AES_CTR_Cipher, 32, 16, 16)   # RECOMMENDED     AES with 256-bit key in counter mode
+SSH_Cipher.register("none", SSH_None_Cipher, 0, 0, 8)               # OPTIONAL        no encryption; NOT RECOMMENDED
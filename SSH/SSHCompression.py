@@ -0,0 +1,141 @@
+import zlib
+import collections
+from utils import Logs
+
+
+class SSH_Compressor():
+    """
+    Description:
+        Outgoing compression of one direction (RFC 4253 6.2). The zlib stream is shared by every packet of the
+        direction: each payload is compressed and then flushed with Z_SYNC_FLUSH, so the other side can decompress
+        it right away while the compression state carries over.
+
+        The ratio is measured over a rolling window of packets. When payloads turn out to be incompressible (e.g. a
+        transfer of already compressed files) the compressor drops to `BYPASS_LEVEL`, and after `RETRY_AFTER`
+        packets it tries `level` again. The level is changed by continuing the stream with a new raw deflate
+        compressor: after a sync flush the stream is byte aligned, so new deflate blocks can follow.
+
+        With `zlib@openssh.com` compression only starts when `activate` is called (after user authentication).
+    """
+
+    ALGORITHMS = ["none", "zlib", "zlib@openssh.com"]
+
+    DEFAULT_LEVEL = 6
+    BYPASS_LEVEL = 0
+    # Packets in the rolling window
+    WINDOW = 32
+    # Compressed/uncompressed size above which payloads are considered incompressible
+    INCOMPRESSIBLE_RATIO = 0.95
+    # Packets sent at `BYPASS_LEVEL` before trying `level` again
+    RETRY_AFTER = 256
+
+    def __init__(self, algorithm:str, level:int=DEFAULT_LEVEL):
+        if algorithm not in SSH_Compressor.ALGORITHMS:
+            Logs.error(msg="Unsupported compression algorithm!", additional=f"Algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.level = level
+        self.current_level = level
+        self.active = algorithm == "zlib"
+        self.compressor = zlib.compressobj(level) if algorithm != "none" else None
+
+        self.window = collections.deque()
+        self.window_in = 0
+        self.window_out = 0
+        self.bypassed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def activate(self):
+        """
+        Description:
+            Starts delayed compression (`zlib@openssh.com`).
+        """
+        if self.compressor is not None:
+            self.active = True
+
+    def compress(self, payload):
+        """
+        Returns:
+            The compressed payload, or `payload` itself if compression isn't active.
+        """
+        if not self.active:
+            return payload
+        out = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.bytes_in += len(payload)
+        self.bytes_out += len(out)
+
+        if self.current_level == SSH_Compressor.BYPASS_LEVEL and self.level != SSH_Compressor.BYPASS_LEVEL:
+            self.bypassed += 1
+            if self.bypassed >= SSH_Compressor.RETRY_AFTER:
+                self.__set_level(self.level)
+        else:
+            self.__measure(len(payload), len(out))
+        return out
+
+    def ratio(self):
+        """
+        Returns:
+            Compressed/uncompressed size of everything sent so far.
+        """
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    def __measure(self, size_in:int, size_out:int):
+        self.window.append((size_in, size_out))
+        self.window_in += size_in
+        self.window_out += size_out
+        if len(self.window) > SSH_Compressor.WINDOW:
+            old_in, old_out = self.window.popleft()
+            self.window_in -= old_in
+            self.window_out -= old_out
+
+        if len(self.window) == SSH_Compressor.WINDOW and self.window_out > self.window_in * SSH_Compressor.INCOMPRESSIBLE_RATIO:
+            self.__set_level(SSH_Compressor.BYPASS_LEVEL)
+
+    def __set_level(self, level:int):
+        # Raw deflate: no zlib header, its blocks continue the current stream
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.current_level = level
+        self.bypassed = 0
+        self.window.clear()
+        self.window_in = self.window_out = 0
+
+
+class SSH_Decompressor():
+    """
+    Description:
+        Incoming decompression of one direction. A payload that decompresses to more than `max_output` bytes is
+        rejected without being inflated any further, which stops decompression bombs.
+    """
+
+    DEFAULT_MAX_OUTPUT = 256 * 1024
+
+    def __init__(self, algorithm:str, max_output:int=DEFAULT_MAX_OUTPUT):
+        if algorithm not in SSH_Compressor.ALGORITHMS:
+            Logs.error(msg="Unsupported compression algorithm!", additional=f"Algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.max_output = max_output
+        self.active = algorithm == "zlib"
+        self.decompressor = zlib.decompressobj() if algorithm != "none" else None
+
+    def activate(self):
+        """
+        Description:
+            Starts delayed decompression (`zlib@openssh.com`).
+        """
+        if self.decompressor is not None:
+            self.active = True
+
+    def decompress(self, payload):
+        """
+        Returns:
+            The decompressed payload, or `payload` itself if compression isn't active.
+        """
+        if not self.active:
+            return payload
+        try:
+            out = self.decompressor.decompress(payload, self.max_output)
+        except zlib.error as e:
+            Logs.error(msg="Invalid compressed payload!", additional=str(e), reason="SSH_DISCONNECT_COMPRESSION_ERROR")
+        if self.decompressor.unconsumed_tail:
+            Logs.error(msg="Decompressed payload is too big!", additional=f"Limit: {self.max_output}", reason="SSH_DISCONNECT_COMPRESSION_ERROR")
+        return out
@@ -0,0 +1,190 @@
+import time
+import threading
+import contextlib
+import collections
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol, SSH_Config
+from utils import Logs
+
+
+class SSH_Connection_Pool():
+    """
+    Description:
+        Pool of established client transports, so repeated connections to the same server reuse a transport
+        instead of doing a new TCP connection and handshake every time.
+
+        Transports are keyed by (ip, port, configuration): a transport is only reused by callers asking for the
+        same algorithms. On checkout the most recently used idle transport of the key is taken and checked to be
+        alive. At most `max_per_key` transports (idle or checked out) exist per key, and callers wait for one to
+        be returned when the key is full.
+
+        Idle transports are closed after `idle_ttl` seconds, and the least recently used ones are closed when
+        more than `max_idle` are idle in total. Expired transports are closed lazily, by the next `checkout` or
+        `checkin`: a pool nobody uses keeps its idle transports open until `close`. Transports are always closed
+        without holding the pool's lock, since closing one writes what it still has queued.
+    """
+
+    MAX_PER_KEY = 4
+    MAX_IDLE = 64
+    IDLE_TTL = 60.0
+
+    def __init__(self, max_per_key:int=MAX_PER_KEY, max_idle:int=MAX_IDLE, idle_ttl:float=IDLE_TTL):
+        self.max_per_key = max_per_key
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+
+        self.idle = {}      # Key -> OrderedDict of id(transport) -> (transport, time it was checked in)
+        self.lru = collections.OrderedDict()    # id(transport) -> key, least recently used first
+        self.counts = collections.Counter()     # Key -> transports open (idle or checked out)
+        self.condition = threading.Condition()
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+
+    def key(ip:str, port:int, config:dict):
+        """
+        Returns:
+            The hashable pool key of a connection to `ip`:`port` with `config`.
+        """
+        return (ip, port, SSH_Config.intern(config))
+
+
+    """ API Methods """
+    def checkout(self, ip:str, port:int, config:dict={}, timeout:float=None):
+        """
+        Description:
+            Returns an established transport to `ip`:`port`, reusing an idle one if one is alive, or connecting a
+            new one if the key isn't full. Otherwise waits up to `timeout` seconds for one to be checked in.
+
+        Returns:
+            A `SSH_Transport_Layer_Protocol` after its handshake. Give it back with `checkin`.
+        """
+        key = SSH_Connection_Pool.key(ip, port, config)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            closing = []
+            try:
+                with self.condition:
+                    if self.closed:
+                        Logs.error(msg="Connection pool is closed!")
+                    self.__evict_expired(closing)
+                    transport = self.__take_idle(key, closing)
+                    if transport is not None:
+                        self.hits += 1
+                        return transport
+                    if self.counts[key] < self.max_per_key:
+                        self.counts[key] += 1
+                        self.misses += 1
+                        break
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        Logs.error(msg="Timed out waiting for a pooled connection!", additional=f"Server: {ip}:{port}")
+                    if not closing: # Otherwise the key may have room now
+                        self.condition.wait(remaining)
+            finally:
+                SSH_Connection_Pool.__close_all(closing)
+
+        # Connect without holding the lock, handshakes are slow
+        try:
+            return SSH_Transport_Layer_Protocol.client(port, ip, config).__enter__()
+        except:
+            with self.condition:
+                self.counts[key] -= 1
+                self.condition.notify()
+            raise
+
+    def checkin(self, transport:SSH_Transport_Layer_Protocol, discard:bool=False):
+        """
+        Description:
+            Gives back a transport taken with `checkout`. With `discard` (e.g. after an error) it is closed
+            instead of kept.
+        """
+        key = SSH_Connection_Pool.key(transport.ip, transport.port, transport.config)
+        closing = []
+        with self.condition:
+            if discard or self.closed:
+                self.__discard(key, transport, closing)
+            else:
+                self.idle.setdefault(key, collections.OrderedDict())[id(transport)] = (transport, time.monotonic())
+                self.lru[id(transport)] = key
+                self.__evict_expired(closing)
+                while len(self.lru) > self.max_idle:
+                    oldest, oldest_key = next(iter(self.lru.items()))
+                    self.__discard(oldest_key, self.__remove_idle(oldest_key, oldest), closing)
+                self.condition.notify()
+        SSH_Connection_Pool.__close_all(closing)
+
+    @contextlib.contextmanager
+    def connection(self, ip:str, port:int, config:dict={}, timeout:float=None):
+        """
+        Description:
+            `with pool.connection(ip, port) as transport:` checks a transport out and back in, discarding it if
+            the block raises.
+        """
+        transport = self.checkout(ip, port, config, timeout)
+        try:
+            yield transport
+        except:
+            self.checkin(transport, discard=True)
+            raise
+        self.checkin(transport)
+
+    def close(self):
+        """
+        Description:
+            Closes every idle transport. Transports checked out are closed when checked in.
+        """
+        closing = []
+        with self.condition:
+            self.closed = True
+            for transport_id, key in list(self.lru.items()):
+                self.__discard(key, self.__remove_idle(key, transport_id), closing)
+            self.condition.notify_all()
+        SSH_Connection_Pool.__close_all(closing)
+
+    def stats(self):
+        with self.condition:
+            return {"hits" : self.hits, "misses" : self.misses, "idle" : len(self.lru), "open" : sum(self.counts.values())}
+
+
+    """ Private Methods """
+    def __take_idle(self, key:tuple, closing:list):
+        idle = self.idle.get(key)
+        while idle:
+            transport_id, (transport, _) = idle.popitem(last=True)
+            del self.lru[transport_id]
+            if transport.is_alive():
+                return transport
+            self.__discard(key, transport, closing)
+        return None
+
+    def __remove_idle(self, key:tuple, transport_id:int):
+        transport, _ = self.idle[key].pop(transport_id)
+        del self.lru[transport_id]
+        return transport
+
+    def __evict_expired(self, closing:list):
+        now = time.monotonic()
+        for transport_id, key in list(self.lru.items()):
+            _, checked_in = self.idle[key][transport_id]
+            if now - checked_in < self.idle_ttl:
+                break # The LRU order is also the order of check in
+            self.__discard(key, self.__remove_idle(key, transport_id), closing)
+
+    def __discard(self, key:tuple, transport:SSH_Transport_Layer_Protocol, closing:list):
+        """
+        Description:
+            Stops counting `transport` in its key and adds it to `closing`, closed by the caller once it released
+            the lock (see `__close_all`).
+        """
+        self.counts[key] -= 1
+        if self.counts[key] <= 0:
+            del self.counts[key]
+        self.condition.notify()
+        closing.append(transport)
+
+    def __close_all(transports:list):
+        for transport in transports:
+            try:
+                transport.__exit__(None, None, None)
+            except OSError:
+                pass
@@ -0,0 +1,465 @@
+import asyncio
+import struct
+import collections
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from utils import Logs
+
+
+class SSH_Connection_Protocol():
+    """
+    Description:
+        Channels (RFC 4254 5) multiplexed over one `SSH_Async_Transport_Layer_Protocol`, so many logical streams
+        share a single handshake.
+
+        Flow control: each side advertises a receive window per channel and never sends more data than the
+        other side's window allows. The window is given back with SSH_MSG_CHANNEL_WINDOW_ADJUST as the consumer
+        reads, so a slow consumer slows down its own channel only.
+
+        Outgoing data of all channels is sent by one writer task, which goes round-robin over the channels that
+        have data and window, sending at most one packet (`max_packet_size` bytes) per channel per turn. A busy
+        channel can't starve the others.
+
+        Incoming data is handed to consumers as memoryview slices of the received packet, without copying it.
+    """
+
+    DEFAULT_WINDOW_SIZE = 2 * 1024 * 1024
+    # Fits a SSH_MSG_CHANNEL_DATA packet in the 35000 bytes every implementation must accept
+    DEFAULT_MAX_PACKET_SIZE = 32 * 1024
+    MAX_CHANNELS = 1024
+    MAX_WINDOW_SIZE = 2**32 - 1
+
+    CHANNEL_DATA_HEADER = struct.Struct(">BII")
+
+    def __init__(self, transport, on_channel=None, window_size:int=DEFAULT_WINDOW_SIZE, max_packet_size:int=DEFAULT_MAX_PACKET_SIZE):
+        """
+        Parameters:
+            `transport`: a `SSH_Async_Transport_Layer_Protocol` whose handshake (and user authentication) is done.
+            `on_channel`: coroutine function called with every channel the other side opens. If None, they are
+                returned by `accept`.
+            `window_size`: receive window of every channel opened or accepted.
+            `max_packet_size`: biggest data packet accepted on every channel.
+        """
+        self.transport = transport
+        self.on_channel = on_channel
+        self.window_size = window_size
+        self.max_packet_size = max_packet_size
+
+        self.channels = {}  # Local ID -> channel
+        self.free_ids = collections.deque()
+        self.next_id = 0
+        self.accepted = collections.deque()
+        self.ready = collections.deque()    # Channels with data to send and window to send it
+        self.error = None
+
+        loop = asyncio.get_running_loop()
+        self.__accept_waiter = None
+        self.__ready_waiter = None
+        self.__reader = loop.create_task(self.__read_loop())
+        self.__writer = loop.create_task(self.__write_loop())
+
+
+    """ API Methods """
+    async def open_channel(self, channel_type:str="session", extra:bytes=b""):
+        """
+        Description:
+            Opens a channel and waits for the other side to confirm it.
+
+        Parameters:
+            `extra`: channel type specific data appended to SSH_MSG_CHANNEL_OPEN.
+
+        Returns:
+            The open `SSH_Channel`.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        self.__check()
+        channel = self.__new_channel(channel_type)
+        channel.opened = asyncio.get_running_loop().create_future()
+        await self.transport.send(
+            U.MSG_CODE["SSH_MSG_CHANNEL_OPEN"].to_bytes(1) + U.string_to_bytes(channel_type.encode())
+            + struct.pack(">III", channel.local_id, channel.window_size, channel.max_packet_size) + extra)
+        await channel.opened
+        return channel
+
+    async def accept(self):
+        """
+        Returns:
+            The next channel opened by the other side (only if there is no `on_channel`).
+        """
+        while not self.accepted:
+            self.__check()
+            self.__accept_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__accept_waiter
+            finally:
+                self.__accept_waiter = None
+        return self.accepted.popleft()
+
+    def close(self):
+        """
+        Description:
+            Stops the connection protocol and closes the transport.
+        """
+        self.__reader.cancel()
+        self.__writer.cancel()
+        self.transport.close()
+        self.__fail(ConnectionError("Connection closed"))
+
+
+    """ Channel Methods """
+    # Used by `SSH_Channel`
+
+    def schedule(self, channel):
+        """
+        Description:
+            Puts `channel` in the writer's round-robin if it has data it can send.
+        """
+        if not channel.scheduled and channel.can_send():
+            channel.scheduled = True
+            self.ready.append(channel)
+            self.__wake(self.__ready_waiter)
+
+    async def send(self, payload):
+        self.__check()
+        await self.transport.send(payload)
+
+    def release(self, channel):
+        """
+        Description:
+            Frees the ID of a channel closed by both sides.
+        """
+        if self.channels.pop(channel.local_id, None) is not None:
+            self.free_ids.append(channel.local_id)
+
+
+    """ Private Methods """
+    def __check(self):
+        if self.error is not None:
+            raise self.error
+
+    def __wake(self, waiter):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def __fail(self, error:Exception):
+        if self.error is None:
+            self.error = error
+        self.__wake(self.__accept_waiter)
+        self.__wake(self.__ready_waiter)
+        for channel in list(self.channels.values()):
+            channel.fail(self.error)
+
+    def __new_channel(self, channel_type:str):
+        local_id = self.free_ids.popleft() if self.free_ids else self.next_id
+        if local_id == self.next_id:
+            self.next_id += 1
+        channel = SSH_Channel(self, local_id, channel_type, self.window_size, self.max_packet_size)
+        self.channels[local_id] = channel
+        return channel
+
+    def __channel(self, local_id:int):
+        if local_id not in self.channels:
+            Logs.error(msg="Message for an unknown channel!", additional=f"Channel: {local_id}")
+        return self.channels[local_id]
+
+    async def __write_loop(self):
+        try:
+            while True:
+                while not self.ready:
+                    if self.error is not None:
+                        return
+                    self.__ready_waiter = asyncio.get_running_loop().create_future()
+                    try:
+                        await self.__ready_waiter
+                    finally:
+                        self.__ready_waiter = None
+
+                channel = self.ready.popleft()
+                channel.scheduled = False
+                chunk, done = channel.take_chunk()
+                if chunk is not None:
+                    await self.transport.send(SSH_Connection_Protocol.CHANNEL_DATA_HEADER.pack(
+                        SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_CHANNEL_DATA"], channel.remote_id, len(chunk)) + chunk)
+                    if done is not None and not done.done():
+                        done.set_result(None)
+                self.schedule(channel)
+        except Exception as e:
+            self.__fail(e)
+
+    async def __read_loop(self):
+        try:
+            while True:
+                await self.__dispatch(await self.transport.receive())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.__fail(e)
+            self.transport.close()
+
+    async def __dispatch(self, payload:bytes):
+        U = SSH_Transport_Layer_Protocol_Utils
+        code = payload[0]
+        if code == U.MSG_CODE["SSH_MSG_CHANNEL_DATA"]:
+            recipient, length = struct.unpack_from(">II", payload, 1)
+            if 9 + length > len(payload):
+                Logs.error(msg="Channel data length exceeds the packet!", additional=f"Length: {length}")
+            self.__channel(recipient).received(memoryview(payload)[9:9+length])
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_WINDOW_ADJUST"]:
+            recipient, n = struct.unpack_from(">II", payload, 1)
+            channel = self.__channel(recipient)
+            if channel.remote_window + n > SSH_Connection_Protocol.MAX_WINDOW_SIZE:
+                Logs.error(msg="Channel window over 2^32 - 1!", additional=f"Channel: {recipient}")
+            channel.remote_window += n
+            self.schedule(channel)
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_EXTENDED_DATA"]:
+            # Not delivered (e.g. stderr of a session), but it counts against the window like any data
+            recipient, _, length = struct.unpack_from(">III", payload, 1)
+            channel = self.__channel(recipient)
+            channel.received(memoryview(payload)[13:13+length], deliver=False)
+            await channel.adjust_window()
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_OPEN"]:
+            channel_type, index = U.read_string(payload, 1)
+            sender, window, max_packet = struct.unpack_from(">III", payload, index)
+            if len(self.channels) >= SSH_Connection_Protocol.MAX_CHANNELS:
+                await self.send(U.MSG_CODE["SSH_MSG_CHANNEL_OPEN_FAILURE"].to_bytes(1) + struct.pack(">II", sender, U.CHANNEL_OPEN_FAILURE_CODES["SSH_OPEN_RESOURCE_SHORTAGE"])
+                                + U.string_to_bytes(b"Too many channels") + U.string_to_bytes(b""))
+                return
+            channel = self.__new_channel(channel_type.decode())
+            channel.confirm(sender, window, max_packet)
+            await self.send(U.MSG_CODE["SSH_MSG_CHANNEL_OPEN_CONFIRMATION"].to_bytes(1)
+                            + struct.pack(">IIII", sender, channel.local_id, channel.window_size, channel.max_packet_size))
+            if self.on_channel is not None:
+                asyncio.get_running_loop().create_task(self.on_channel(channel))
+            else:
+                self.accepted.append(channel)
+                self.__wake(self.__accept_waiter)
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_OPEN_CONFIRMATION"]:
+            recipient, sender, window, max_packet = struct.unpack_from(">IIII", payload, 1)
+            channel = self.__channel(recipient)
+            channel.confirm(sender, window, max_packet)
+            self.__wake(channel.opened)
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_OPEN_FAILURE"]:
+            recipient, reason = struct.unpack_from(">II", payload, 1)
+            description, _ = U.read_string(payload, 9)
+            channel = self.__channel(recipient)
+            self.release(channel)
+            channel.opened.set_exception(ConnectionRefusedError(f"Channel open failed ({reason}): {description.decode(errors='replace')}"))
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_EOF"]:
+            self.__channel(struct.unpack_from(">I", payload, 1)[0]).on_eof()
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_CLOSE"]:
+            await self.__channel(struct.unpack_from(">I", payload, 1)[0]).on_close()
+
+        elif code == U.MSG_CODE["SSH_MSG_CHANNEL_REQUEST"]:
+            # No channel requests are supported yet
+            recipient = struct.unpack_from(">I", payload, 1)[0]
+            _, index = U.read_string(payload, 5)
+            if payload[index]:
+                channel = self.__channel(recipient)
+                await self.send(U.MSG_CODE["SSH_MSG_CHANNEL_FAILURE"].to_bytes(1) + struct.pack(">I", channel.remote_id))
+
+        elif code == U.MSG_CODE["SSH_MSG_GLOBAL_REQUEST"]:
+            _, index = U.read_string(payload, 1)
+            if payload[index]:
+                await self.send(U.MSG_CODE["SSH_MSG_REQUEST_FAILURE"].to_bytes(1))
+
+
+class SSH_Channel():
+    """
+    Description:
+        One channel of a `SSH_Connection_Protocol`. Created by `open_channel`, `accept` or `on_channel`.
+    """
+
+    def __init__(self, connection:SSH_Connection_Protocol, local_id:int, channel_type:str, window_size:int, max_packet_size:int):
+        self.connection = connection
+        self.local_id = local_id
+        self.channel_type = channel_type
+        self.window_size = window_size
+        self.max_packet_size = max_packet_size
+        self.remote_id = None
+        self.remote_window = 0
+        self.remote_max_packet_size = 0
+        self.opened = None
+
+        self.local_window = window_size
+        self.consumed = 0               # Bytes read since the window was last adjusted
+        self.incoming = collections.deque()
+        self.outgoing = collections.deque()     # [data not sent yet, future set once it's all sent]
+        self.scheduled = False
+
+        self.eof_sent = False
+        self.eof_received = False
+        self.close_sent = False
+        self.close_received = False
+        self.error = None
+        self.__read_waiter = None
+        self.__close_waiter = None
+
+
+    """ API Methods """
+    async def write(self, data):
+        """
+        Description:
+            Sends `data`, split in packets as the other side's window and maximum packet size allow. Waits until
+            all of it has been handed to the transport.
+        """
+        self.__check()
+        if self.eof_sent or self.close_sent:
+            Logs.error(msg="Write on a channel after EOF!", additional=f"Channel: {self.local_id}")
+        if not data:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self.outgoing.append([memoryview(data).cast("B"), done])
+        self.connection.schedule(self)
+        await done
+
+    async def read(self):
+        """
+        Returns:
+            The next data recieved as a memoryview of the packet it came in (not copied), or an empty memoryview
+            once the other side sent EOF or closed the channel.
+        """
+        while not self.incoming:
+            self.__check()
+            if self.eof_received or self.close_received:
+                return memoryview(b"")
+            self.__read_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__read_waiter
+            finally:
+                self.__read_waiter = None
+
+        data = self.incoming.popleft()
+        self.consumed += len(data)
+        await self.adjust_window()
+        return data
+
+    async def send_eof(self):
+        """
+        Description:
+            Sends SSH_MSG_CHANNEL_EOF after any data still waiting to be sent.
+        """
+        if self.eof_sent or self.close_sent:
+            return
+        await self.__drain()
+        self.eof_sent = True
+        await self.connection.send(SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_CHANNEL_EOF"].to_bytes(1) + struct.pack(">I", self.remote_id))
+
+    async def close(self):
+        """
+        Description:
+            Sends any data waiting to be sent, closes the channel and waits for the other side to close it too.
+        """
+        if not self.close_sent:
+            await self.__drain()
+            await self.__send_close()
+        if not self.close_received and self.error is None:
+            self.__close_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__close_waiter
+            finally:
+                self.__close_waiter = None
+        self.connection.release(self)
+
+
+    """ Connection Methods """
+    # Used by `SSH_Connection_Protocol`
+
+    def confirm(self, remote_id:int, remote_window:int, remote_max_packet_size:int):
+        self.remote_id = remote_id
+        self.remote_window = remote_window
+        self.remote_max_packet_size = remote_max_packet_size
+
+    def can_send(self):
+        return bool(self.outgoing) and self.remote_window > 0 and not self.close_sent
+
+    def take_chunk(self):
+        """
+        Returns:
+            A tuple with the next piece of data that fits in the other side's window and maximum packet size,
+            and the future to set once it's sent if it ends a `write` (otherwise None). (None, None) if nothing
+            can be sent.
+        """
+        if not self.can_send():
+            return None, None
+        item = self.outgoing[0]
+        data, done = item
+        n = min(len(data), self.remote_window, self.remote_max_packet_size)
+        self.remote_window -= n
+        if n == len(data):
+            self.outgoing.popleft()
+            return data, done
+        item[0] = data[n:]
+        return data[:n], None
+
+    def received(self, data:memoryview, deliver:bool=True):
+        if len(data) > self.local_window or len(data) > self.max_packet_size:
+            Logs.error(msg="Channel data exceeds the window or maximum packet size!", additional=f"Channel: {self.local_id} Length: {len(data)}")
+        self.local_window -= len(data)
+        if deliver:
+            self.incoming.append(data)
+            self.__wake(self.__read_waiter)
+        else:
+            self.consumed += len(data)
+
+    def on_eof(self):
+        self.eof_received = True
+        self.__wake(self.__read_waiter)
+
+    async def on_close(self):
+        self.close_received = True
+        self.__wake(self.__read_waiter)
+        self.__wake(self.__close_waiter)
+        for _, done in self.outgoing:
+            if not done.done():
+                done.set_exception(ConnectionError("Channel closed by the other side"))
+        self.outgoing.clear()
+        if not self.close_sent:
+            await self.__send_close()
+        self.connection.release(self)
+
+    async def adjust_window(self):
+        """
+        Description:
+            Gives the consumed part of the window back to the other side, in big steps rather than after every
+            packet.
+        """
+        if self.consumed >= self.window_size // 2 and not self.close_sent and not self.close_received:
+            U = SSH_Transport_Layer_Protocol_Utils
+            n, self.consumed = self.consumed, 0
+            self.local_window += n
+            await self.connection.send(U.MSG_CODE["SSH_MSG_CHANNEL_WINDOW_ADJUST"].to_bytes(1) + struct.pack(">II", self.remote_id, n))
+
+    def fail(self, error:Exception):
+        self.error = error
+        for waiter in (self.__read_waiter, self.__close_waiter, self.opened):
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(error)
+                waiter.exception()
+        for _, done in self.outgoing:
+            if not done.done():
+                done.set_exception(error)
+        self.outgoing.clear()
+
+
+    """ Private Methods """
+    def __check(self):
+        if self.error is not None:
+            raise self.error
+
+    def __wake(self, waiter):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def __drain(self):
+        if self.outgoing:
+            await self.outgoing[-1][1]
+
+    async def __send_close(self):
+        self.close_sent = True
+        await self.connection.send(SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_CHANNEL_CLOSE"].to_bytes(1) + struct.pack(">I", self.remote_id))
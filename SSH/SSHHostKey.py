@@ -0,0 +1,386 @@
+import os
+import hashlib
+import secrets
+import threading
+import concurrent.futures
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from utils import Logs
+
+
+class SSH_Host_Key():
+    """
+    Description:
+        Host keys used to sign the exchange hash H (RFC 4253 6.6) and the registry of the server's signers.
+
+        The server signs with the `SSH_Host_Key_Signer` registered for the negotiated algorithm (see `set_signer`).
+        Servers generate a key for every algorithm they offer that has no signer when they start (see
+        `generate_signers`) and keep it for the life of the process, so handshakes never wait for a key to be
+        generated: a 2048 bits RSA key takes about a second in pure Python.
+    """
+
+    # Key size of generated RSA keys
+    DEFAULT_RSA_BITS = 2048
+    # Odd primes used to discard most candidates before Miller-Rabin
+    SMALL_PRIMES = [p for p in range(3, 2000, 2) if all(p % d for d in range(3, int(p**0.5) + 1, 2))]
+
+    signers = {}
+    lock = threading.Lock()
+
+    def set_signer(algorithm:str, signer):
+        """
+        Description:
+            Registers the `SSH_Host_Key_Signer` used by servers for `algorithm`. Any previous one is closed.
+        """
+        with SSH_Host_Key.lock:
+            old = SSH_Host_Key.signers.get(algorithm)
+            SSH_Host_Key.signers[algorithm] = signer
+        if old is not None and old is not signer:
+            old.close()
+
+    def get_signer(algorithm:str):
+        """
+        Returns:
+            The signer registered for `algorithm`.
+        """
+        signer = SSH_Host_Key.signers.get(algorithm)
+        if signer is None:
+            Logs.error(msg="No host key for the algorithm!", additional=f"Algorithm: {algorithm}\n\tRegister one with `set_signer` or `generate_signers` before serving")
+        return signer
+
+    def generate_signers(algorithms:list):
+        """
+        Description:
+            Registers an inline signer with a new key for every algorithm of `algorithms` that has no signer.
+            Called by servers when they start, before any handshake.
+        """
+        with SSH_Host_Key.lock:
+            for algorithm in algorithms:
+                if algorithm in SSH_Host_Key.signers:
+                    continue
+                if algorithm == "ssh-rsa":
+                    key = SSH_RSA_Host_Key.generate(SSH_Host_Key.DEFAULT_RSA_BITS)
+                elif algorithm == "ssh-dss":
+                    key = SSH_DSS_Host_Key.generate()
+                else:
+                    Logs.error(msg="Unsupported host key algorithm!", additional=f"Algorithm: {algorithm}")
+                SSH_Host_Key.signers[algorithm] = SSH_Host_Key_Signer(key)
+
+    def reset():
+        """
+        Description:
+            Closes and forgets every registered signer.
+        """
+        with SSH_Host_Key.lock:
+            signers = list(SSH_Host_Key.signers.values())
+            SSH_Host_Key.signers.clear()
+        for signer in signers:
+            signer.close()
+
+    def verify(k_s:bytes, data:bytes, signature:bytes):
+        """
+        Description:
+            Verifies `signature` of `data` with the public host key blob `k_s`.
+
+        Returns:
+            True if the signature is valid, false otherwise.
+        """
+        algorithm, _ = SSH_Transport_Layer_Protocol_Utils.read_string(k_s, 0)
+        if algorithm == b"ssh-rsa":
+            return SSH_RSA_Host_Key.verify(k_s, data, signature)
+        if algorithm == b"ssh-dss":
+            return SSH_DSS_Host_Key.verify(k_s, data, signature)
+        return False
+
+    def known_hosts(keys:dict):
+        """
+        Description:
+            Makes a `host_key_verifier` for clients from the known host keys.
+
+        Parameters:
+            `keys`: host (the ip given to `client`) -> public host key blobs (K_S) accepted for it.
+
+        Returns:
+            A function of the server's ip, port and K_S, True if K_S is a known key of the host.
+        """
+        known = {host : frozenset(bytes(k_s) for k_s in blobs) for host, blobs in keys.items()}
+        def verifier(ip:str, port:int, k_s:bytes):
+            return k_s in known.get(ip, ())
+        return verifier
+
+    def is_probable_prime(n:int, rounds:int=40):
+        """
+        Description:
+            Miller-Rabin primality test.
+        """
+        if n < 2:
+            return False
+        for p in SSH_Host_Key.SMALL_PRIMES:
+            if n % p == 0:
+                return n == p
+        d, s = n - 1, 0
+        while d % 2 == 0:
+            d, s = d // 2, s + 1
+        for _ in range(rounds):
+            x = pow(secrets.randbelow(n - 3) + 2, d, n)
+            if x == 1 or x == n - 1:
+                continue
+            for _ in range(s - 1):
+                x = x * x % n
+                if x == n - 1:
+                    break
+            else:
+                return False
+        return True
+
+    def random_prime(bits:int):
+        """
+        Returns:
+            A random prime of exactly `bits` bits with the two highest bits set.
+        """
+        while True:
+            n = secrets.randbits(bits) | (3 << (bits - 2)) | 1
+            if SSH_Host_Key.is_probable_prime(n):
+                return n
+
+
+class SSH_RSA_Host_Key():
+    """
+    Description:
+        `ssh-rsa` host key (RFC 4253 6.6): RSASSA-PKCS1-v1_5 signatures with SHA-1. Signing uses the CRT.
+    """
+
+    ALGORITHM = "ssh-rsa"
+    PUBLIC_EXPONENT = 65537
+    # DER encoded DigestInfo prefix of SHA-1 (RFC 8017 9.2)
+    SHA1_DIGEST_INFO = bytes.fromhex("3021300906052b0e03021a05000414")
+
+    def __init__(self, n:int, e:int, d:int, p:int, q:int):
+        self.n, self.e, self.d, self.p, self.q = n, e, d, p, q
+        self.dp = d % (p - 1)
+        self.dq = d % (q - 1)
+        self.q_inv = pow(q, -1, p)
+        self.length = (n.bit_length() + 7) // 8
+
+    def generate(bits:int=2048):
+        """
+        Returns:
+            A new `SSH_RSA_Host_Key` with a modulus of `bits` bits.
+        """
+        e = SSH_RSA_Host_Key.PUBLIC_EXPONENT
+        while True:
+            p = SSH_Host_Key.random_prime(bits // 2)
+            q = SSH_Host_Key.random_prime(bits - bits // 2)
+            phi = (p - 1) * (q - 1)
+            if p != q and phi % e != 0:
+                return SSH_RSA_Host_Key(p * q, e, pow(e, -1, phi), p, q)
+
+    def public_blob(self):
+        """
+        Returns:
+            The public key blob (K_S): string "ssh-rsa", mpint e, mpint n.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.string_to_bytes(b"ssh-rsa") + U.mpint_to_bytes(self.e) + U.mpint_to_bytes(self.n)
+
+    def sign(self, data:bytes):
+        """
+        Returns:
+            The SSH signature blob of `data`: string "ssh-rsa", string signature.
+        """
+        m = int.from_bytes(SSH_RSA_Host_Key.encode(data, self.length))
+        s1 = pow(m, self.dp, self.p)
+        s2 = pow(m, self.dq, self.q)
+        s = s2 + self.q * (self.q_inv * (s1 - s2) % self.p)
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.string_to_bytes(b"ssh-rsa") + U.string_to_bytes(s.to_bytes(self.length))
+
+    def encode(data:bytes, length:int):
+        """
+        Description:
+            EMSA-PKCS1-v1_5 encoding of SHA-1(`data`) for a modulus of `length` bytes.
+        """
+        t = SSH_RSA_Host_Key.SHA1_DIGEST_INFO + hashlib.sha1(data).digest()
+        return b"\x00\x01" + b"\xff" * (length - len(t) - 3) + b"\x00" + t
+
+    def verify(k_s:bytes, data:bytes, signature:bytes):
+        U = SSH_Transport_Layer_Protocol_Utils
+        try:
+            _, index = U.read_string(k_s, 0)
+            e, index = U.read_mpint(k_s, index)
+            n, _ = U.read_mpint(k_s, index)
+            algorithm, index = U.read_string(signature, 0)
+            s, _ = U.read_string(signature, index)
+        except Exception:
+            return False
+        length = (n.bit_length() + 7) // 8
+        if algorithm != b"ssh-rsa" or len(s) > length or int.from_bytes(s) >= n:
+            return False
+        return pow(int.from_bytes(s), e, n).to_bytes(length) == SSH_RSA_Host_Key.encode(data, length)
+
+
+class SSH_DSS_Host_Key():
+    """
+    Description:
+        `ssh-dss` host key (RFC 4253 6.6): DSA with a 1024-bit p, a 160-bit q and SHA-1.
+    """
+
+    ALGORITHM = "ssh-dss"
+
+    def __init__(self, p:int, q:int, g:int, y:int, x:int):
+        self.p, self.q, self.g, self.y, self.x = p, q, g, y, x
+
+    def generate(l:int=1024, n:int=160):
+        """
+        Returns:
+            A new `SSH_DSS_Host_Key` with new domain parameters.
+        """
+        q = SSH_Host_Key.random_prime(n)
+        while True:
+            k = secrets.randbits(l - n) | (1 << (l - n - 1))
+            p = k * q + 1
+            if p.bit_length() == l and SSH_Host_Key.is_probable_prime(p):
+                break
+        h = 2
+        g = pow(h, (p - 1) // q, p)
+        while g == 1:
+            h += 1
+            g = pow(h, (p - 1) // q, p)
+        x = secrets.randbelow(q - 1) + 1
+        return SSH_DSS_Host_Key(p, q, g, pow(g, x, p), x)
+
+    def public_blob(self):
+        """
+        Returns:
+            The public key blob (K_S): string "ssh-dss", mpint p, mpint q, mpint g, mpint y.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.string_to_bytes(b"ssh-dss") + b"".join(U.mpint_to_bytes(v) for v in (self.p, self.q, self.g, self.y))
+
+    def sign(self, data:bytes):
+        """
+        Returns:
+            The SSH signature blob of `data`: string "ssh-dss", string r || s (20 bytes each).
+        """
+        z = int.from_bytes(hashlib.sha1(data).digest())
+        while True:
+            k = secrets.randbelow(self.q - 1) + 1
+            r = pow(self.g, k, self.p) % self.q
+            s = pow(k, -1, self.q) * (z + self.x * r) % self.q
+            if r != 0 and s != 0:
+                break
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.string_to_bytes(b"ssh-dss") + U.string_to_bytes(r.to_bytes(20) + s.to_bytes(20))
+
+    def verify(k_s:bytes, data:bytes, signature:bytes):
+        U = SSH_Transport_Layer_Protocol_Utils
+        try:
+            _, index = U.read_string(k_s, 0)
+            p, index = U.read_mpint(k_s, index)
+            q, index = U.read_mpint(k_s, index)
+            g, index = U.read_mpint(k_s, index)
+            y, _ = U.read_mpint(k_s, index)
+            algorithm, index = U.read_string(signature, 0)
+            rs, _ = U.read_string(signature, index)
+        except Exception:
+            return False
+        if algorithm != b"ssh-dss" or len(rs) != 40:
+            return False
+        r, s = int.from_bytes(rs[:20]), int.from_bytes(rs[20:])
+        if not (0 < r < q and 0 < s < q):
+            return False
+        w = pow(s, -1, q)
+        z = int.from_bytes(hashlib.sha1(data).digest())
+        v = pow(g, z * w % q, p) * pow(y, r * w % q, p) % p % q
+        return v == r
+
+
+class SSH_Host_Key_Signer():
+    """
+    Description:
+        Signs exchange hashes with a host key through a pluggable backend.
+
+        Backends are registered in `BACKENDS` by name. A backend is built with the host key and the number of
+        workers, and must have `submit(data)` (returning a `concurrent.futures.Future` with the signature) and
+        `close()`. The available ones are:
+            - "inline": signs in the calling thread.
+            - "process": signs in a `ProcessPoolExecutor`, so signatures of concurrent handshakes run on every
+              core instead of one after another behind the GIL.
+    """
+
+    BACKENDS = {}
+
+    def __init__(self, host_key, backend:str="inline", workers:int=None):
+        if backend not in SSH_Host_Key_Signer.BACKENDS:
+            Logs.error(msg="Unknown signing backend!", additional=f"Backend: {backend}")
+        self.host_key = host_key
+        self.algorithm = host_key.ALGORITHM
+        self.k_s = host_key.public_blob()
+        self.backend = SSH_Host_Key_Signer.BACKENDS[backend](host_key, workers)
+
+    def register_backend(name:str, backend_class):
+        SSH_Host_Key_Signer.BACKENDS[name] = backend_class
+
+    def submit(self, data:bytes):
+        """
+        Returns:
+            A `concurrent.futures.Future` with the signature blob of `data`. Await it with `asyncio.wrap_future`.
+        """
+        return self.backend.submit(bytes(data))
+
+    def sign(self, data:bytes):
+        """
+        Returns:
+            The signature blob of `data`. Blocks until it's ready.
+        """
+        return self.submit(data).result()
+
+    def close(self):
+        self.backend.close()
+
+
+class SSH_Inline_Signing_Backend():
+
+    def __init__(self, host_key, workers:int=None):
+        self.host_key = host_key
+
+    def submit(self, data:bytes):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(self.host_key.sign(data))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        pass
+
+
+class SSH_Process_Pool_Signing_Backend():
+    """
+    Description:
+        Signs in worker processes. The host key is sent once to every worker when it starts, so a request only
+        carries the data to sign.
+    """
+
+    worker_key = None   # Host key of the current worker process
+
+    def __init__(self, host_key, workers:int=None):
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=SSH_Process_Pool_Signing_Backend.load_key, initargs=(host_key,))
+
+    def load_key(host_key):
+        SSH_Process_Pool_Signing_Backend.worker_key = host_key
+
+    def sign_in_worker(data:bytes):
+        return SSH_Process_Pool_Signing_Backend.worker_key.sign(data)
+
+    def submit(self, data:bytes):
+        return self.executor.submit(SSH_Process_Pool_Signing_Backend.sign_in_worker, data)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+SSH_Host_Key_Signer.register_backend("inline", SSH_Inline_Signing_Backend)
+SSH_Host_Key_Signer.register_backend("process", SSH_Process_Pool_Signing_Backend)
@@ -0,0 +1,77 @@
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHValidator import SSH_Validator
+from utils import Logs
+
+
+class SSH_ID_String_Reader():
+    """
+    Description:
+        Incremental reader for the other side's identification string. It works on the buffer of a
+        `SSH_Packet_Decoder`: lines are searched in place, the ID line is consumed and every byte after it stays
+        in the decoder, so a KEXINIT sent in the same segment as the ID string is not lost.
+
+        RFC 4253 4.2 lets the server send other lines of data before its ID string. They are kept in
+        `pre_id_lines`, up to `max_pre_id_lines`. Servers allow none: then the beginning of a line is screened
+        (see `SSH_Validator.screen`) as it arrives, and junk is rejected without waiting for its CR LF.
+
+        The ID line is checked as bytes (`SSH_Validator.check_id_str`) before it is decoded.
+    """
+
+    __slots__ = ("max_pre_id_lines", "pre_id_lines", "id_str", "scanned")
+
+    DEFAULT_MAX_PRE_ID_LINES = 32
+    # Maximum length of a line before the ID string, CR LF included
+    MAX_PRE_ID_LINE_LEN = 1024
+
+    def __init__(self, max_pre_id_lines:int=DEFAULT_MAX_PRE_ID_LINES):
+        self.max_pre_id_lines = max_pre_id_lines
+        self.pre_id_lines = []
+        self.id_str = None
+        self.scanned = 0    # Bytes after `decoder.start` already known not to contain CR LF
+
+    def read_from(self, decoder):
+        """
+        Description:
+            Consumes the complete lines buffered in `decoder` until the ID string is found.
+
+        Parameters:
+            `decoder`: the `SSH_Packet_Decoder` the connection reads into.
+
+        Returns:
+            The ID string (CR LF included), or None if more data is needed.
+        """
+        buffer = decoder.buffer
+        if buffer is None: # Nothing recieved yet
+            return self.id_str
+        while self.id_str is None:
+            search_from = decoder.start + (self.scanned - 1 if self.scanned > 0 else 0)
+            index = buffer.find(b"\r\n", search_from, decoder.end)
+            if index == -1:
+                self.scanned = decoder.end - decoder.start
+                self.__check_line_length(self.scanned, buffer[decoder.start:decoder.start+4] == b"SSH-")
+                if self.max_pre_id_lines == 0:
+                    reason = SSH_Validator.screen(decoder.view[decoder.start:decoder.end])
+                    if reason is not None:
+                        Logs.error(msg="Invalid start of the ID string!", additional=f"Reason: {reason}", reason=reason)
+                return None
+
+            end = index + 2
+            line = bytes(buffer[decoder.start:end])
+            decoder.start = end
+            self.scanned = 0
+            self.__check_line_length(len(line), line.startswith(b"SSH-"))
+
+            if line.startswith(b"SSH-"):
+                if not SSH_Validator.check_id_str(line):
+                    Logs.error(msg="Other's side id string does not follow SSH's format!", additional=f"ID string: {repr(line)}", reason="SSH_DISCONNECT_PROTOCOL_ERROR")
+                self.id_str = line.decode()
+            else:
+                self.pre_id_lines.append(line)
+                if len(self.pre_id_lines) > self.max_pre_id_lines:
+                    Logs.error(msg="Too many lines before the ID string!", additional=f"Limit: {self.max_pre_id_lines}", reason="SSH_DISCONNECT_PROTOCOL_ERROR")
+        return self.id_str
+
+    def __check_line_length(self, length:int, is_id_str:bool):
+        limit = SSH_Transport_Layer_Protocol_Utils.MAX_CHAR_LEN_ID_STRING if is_id_str else SSH_ID_String_Reader.MAX_PRE_ID_LINE_LEN
+        if length > limit:
+            Logs.error(msg="Line before the binary packet protocol is too long!", additional=f"Length: {length} Limit: {limit}", reason="SSH_DISCONNECT_PROTOCOL_ERROR")
@@ -0,0 +1,200 @@
+import math
+import time
+import threading
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+
+
+class SSH_Instrumentation():
+    """
+    Description:
+        Process-wide switch, hooks and aggregate of the transport instrumentation.
+
+        While disabled (the default) transports get no `SSH_Connection_Stats` and only check `stats is not None`
+        on their hot paths, so instrumentation costs close to nothing. While enabled every connection records
+        phase timestamps, traffic counters and message counts, and its phase durations are added to the
+        process-wide histograms when the handshake ends.
+
+        Hooks are called as `hook(stats, phase)` on every phase transition of every connection, from the thread
+        (or event loop) running the connection, so they should return quickly.
+    """
+
+    # In the order a handshake goes through them. "failed" replaces the rest when an error stops the handshake.
+    PHASES = ["connect", "version_exchange", "algorithm_negotiation", "key_exchange", "established"]
+
+    enabled = False
+    hooks = []
+    histograms = {}
+    failures = 0
+    lock = threading.Lock()
+
+    def enable():
+        SSH_Instrumentation.enabled = True
+
+    def disable():
+        SSH_Instrumentation.enabled = False
+
+    def add_hook(hook):
+        SSH_Instrumentation.hooks.append(hook)
+
+    def remove_hook(hook):
+        SSH_Instrumentation.hooks.remove(hook)
+
+    def connection_stats(server_role:bool):
+        """
+        Returns:
+            A new `SSH_Connection_Stats`, or None if instrumentation is disabled.
+        """
+        return SSH_Connection_Stats(server_role) if SSH_Instrumentation.enabled else None
+
+    def record(stats):
+        """
+        Description:
+            Adds the phase durations of a finished handshake to the process-wide histograms.
+        """
+        with SSH_Instrumentation.lock:
+            if stats.failed:
+                SSH_Instrumentation.failures += 1
+                return
+            for phase, duration in stats.durations().items():
+                if phase not in SSH_Instrumentation.histograms:
+                    SSH_Instrumentation.histograms[phase] = SSH_Histogram()
+                SSH_Instrumentation.histograms[phase].add(duration)
+
+    def summary():
+        """
+        Returns:
+            A dictionary with the count, p50, p95, p99 and maximum (in seconds) of every phase, plus "handshake" for
+            the whole handshake, and the number of failed handshakes.
+        """
+        with SSH_Instrumentation.lock:
+            phases = {phase : histogram.summary() for phase, histogram in SSH_Instrumentation.histograms.items()}
+            return {"phases" : phases, "failures" : SSH_Instrumentation.failures}
+
+    def reset():
+        with SSH_Instrumentation.lock:
+            SSH_Instrumentation.histograms = {}
+            SSH_Instrumentation.failures = 0
+
+
+class SSH_Connection_Stats():
+    """
+    Description:
+        Instrumentation of one connection: monotonic timestamps of its phases, bytes and packets in each
+        direction and the number of packets of every message type (by `MSG_CODE` name).
+    """
+
+    __slots__ = ("server_role", "timestamps", "failed", "bytes_sent", "bytes_received", "packets_sent",
+                 "packets_received", "messages_sent", "messages_received")
+
+    MSG_NAMES = {code : name for name, code in SSH_Transport_Layer_Protocol_Utils.MSG_CODE.items()}
+
+    def __init__(self, server_role:bool):
+        self.server_role = server_role
+        self.timestamps = {}
+        self.failed = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+        # Indexed by message number, turned into names by `message_counts`
+        self.messages_sent = [0] * 256
+        self.messages_received = [0] * 256
+
+    def phase(self, name:str):
+        """
+        Description:
+            Marks the start of phase `name` (one of `SSH_Instrumentation.PHASES`, or "failed") and calls the hooks.
+            "established" and "failed" end the handshake and record it in the process-wide aggregate.
+        """
+        self.timestamps[name] = time.monotonic()
+        if name == "failed":
+            self.failed = True
+        for hook in SSH_Instrumentation.hooks:
+            hook(self, name)
+        if name == "established" or name == "failed":
+            SSH_Instrumentation.record(self)
+
+    def sent(self, payload, nbytes:int):
+        """
+        Parameters:
+            `payload`: the packet's payload.
+            `nbytes`: bytes written to the socket for it.
+        """
+        self.bytes_sent += nbytes
+        self.packets_sent += 1
+        if payload:
+            self.messages_sent[payload[0]] += 1
+
+    def received(self, payload):
+        self.packets_received += 1
+        if payload:
+            self.messages_received[payload[0]] += 1
+
+    def received_bytes(self, nbytes:int):
+        self.bytes_received += nbytes
+
+    def durations(self):
+        """
+        Returns:
+            A dictionary with the duration in seconds of every phase reached so far, plus "handshake" from the
+            first phase to "established".
+        """
+        phases = [phase for phase in SSH_Instrumentation.PHASES if phase in self.timestamps]
+        durations = {}
+        for phase, following in zip(phases, phases[1:]):
+            durations[phase] = self.timestamps[following] - self.timestamps[phase]
+        if "established" in self.timestamps and phases:
+            durations["handshake"] = self.timestamps["established"] - self.timestamps[phases[0]]
+        return durations
+
+    def message_counts(self):
+        """
+        Returns:
+            A tuple (sent, received) of dictionaries from message name to number of packets. Unknown message
+            numbers are keyed by the number.
+        """
+        def named(counts):
+            return {SSH_Connection_Stats.MSG_NAMES.get(code, code) : n for code, n in enumerate(counts) if n}
+        return named(self.messages_sent), named(self.messages_received)
+
+
+class SSH_Histogram():
+    """
+    Description:
+        Log-linear histogram of durations: every power of two is split into `SUB_BUCKETS` buckets, so
+        percentiles are off by less than 1/`SUB_BUCKETS` of the value whatever the range of durations.
+    """
+
+    SUB_BUCKETS = 16
+    # Smallest duration told apart (1 microsecond)
+    RESOLUTION = 1e-6
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value:float):
+        units = max(value / SSH_Histogram.RESOLUTION, 1.0)
+        bucket = int(math.log2(units) * SSH_Histogram.SUB_BUCKETS)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, p:float):
+        """
+        Returns:
+            The upper bound of the bucket holding the `p`-th percentile (0 < `p` <= 100), or 0.0 if empty.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / SSH_Histogram.SUB_BUCKETS) * SSH_Histogram.RESOLUTION, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count" : self.count, "p50" : self.percentile(50), "p95" : self.percentile(95), "p99" : self.percentile(99), "max" : self.max}
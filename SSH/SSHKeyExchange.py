@@ -0,0 +1,339 @@
+import os
+import hashlib
+import queue
+import secrets
+import threading
+import time
+import concurrent.futures
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHCipher import SSH_Cipher
+from SSH.SSHMac import SSH_MAC
+from SSH.SSHCompression import SSH_Compressor, SSH_Decompressor
+from utils import Logs
+
+
+class SSH_Key_Exchange():
+    """
+    Description:
+        Diffie-Hellman key exchange (RFC 4253 8) for `diffie-hellman-group1-sha1` and `diffie-hellman-group14-sha1`.
+
+        Computing our ephemeral public value (g^x mod p) is the most expensive step of the exchange and does not
+        depend on the other side, so it can be done ahead of time by a `SSH_DH_Keypair_Pool`. When a pool is running
+        (see `start_keypair_pool`) a handshake only does the modular exponentiation that needs the other side's value.
+    """
+
+    # Oakley Group 2 (RFC 2409 6.2), 1024 bits
+    GROUP1_P = int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+        "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+        "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE65381FFFFFFFFFFFFFFFF", 16)
+    # 2048-bit MODP Group (RFC 3526 3)
+    GROUP14_P = int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+        "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+        "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+        "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+        "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+        "3995497CEA956AE515D2261898FA051015728E5A8AACAA68FFFFFFFFFFFFFFFF", 16)
+
+    # Method name -> (p, g, hash function)
+    GROUPS = {
+        "diffie-hellman-group1-sha1"    :   (GROUP1_P, 2, hashlib.sha1),
+        "diffie-hellman-group14-sha1"   :   (GROUP14_P, 2, hashlib.sha1)
+    }
+
+    # Key letters (RFC 4253 7.2) and algorithm configuration keys of each direction
+    DIRECTIONS = {
+        "client_to_server"  :   {"iv" : "A", "encryption" : "C", "integrity" : "E", "cipher" : "ENCRYP_CLIENT_TO_SERVER_ALGS", "mac" : "MAC_CLIENT_TO_SERVER_ALGS", "compression" : "COMPRSS_CLIENT_TO_SERVER_ALGS"},
+        "server_to_client"  :   {"iv" : "B", "encryption" : "D", "integrity" : "F", "cipher" : "ENCRYP_SERVER_TO_CLIENT_ALGS", "mac" : "MAC_SERVER_TO_CLIENT_ALGS", "compression" : "COMPRSS_SERVER_TO_CLIENT_ALGS"}
+    }
+
+    keypair_pool = None
+
+    def generate_keypair(method:str):
+        """
+        Description:
+            Generates an ephemeral keypair for `method`: a random x with 1 < x < q, where q = (p-1)/2, and g^x mod p.
+
+        Returns:
+            A tuple (x, g^x mod p).
+        """
+        p, g, _ = SSH_Key_Exchange.GROUPS[method]
+        x = secrets.randbelow((p - 1) // 2 - 2) + 2
+        return x, pow(g, x, p)
+
+    def get_keypair(method:str):
+        """
+        Description:
+            Takes a precomputed keypair from the running pool, or generates one if there isn't a pool or it's empty.
+        """
+        pool = SSH_Key_Exchange.keypair_pool
+        keypair = pool.get(method) if pool is not None else None
+        return keypair if keypair is not None else SSH_Key_Exchange.generate_keypair(method)
+
+    def start_keypair_pool(size:int=16, use_processes:bool=False, workers:int=1):
+        """
+        Description:
+            Starts the process-wide pool of precomputed keypairs used by `get_keypair`.
+
+        Parameters:
+            `size`: number of ready keypairs kept per method.
+            `use_processes`: compute keypairs in worker processes instead of a background thread.
+            `workers`: number of worker processes.
+
+        Returns:
+            The started `SSH_DH_Keypair_Pool`.
+        """
+        SSH_Key_Exchange.stop_keypair_pool()
+        SSH_Key_Exchange.keypair_pool = SSH_DH_Keypair_Pool(list(SSH_Key_Exchange.GROUPS), size, use_processes, workers)
+        SSH_Key_Exchange.keypair_pool.start()
+        return SSH_Key_Exchange.keypair_pool
+
+    def stop_keypair_pool():
+        if SSH_Key_Exchange.keypair_pool is not None:
+            SSH_Key_Exchange.keypair_pool.stop()
+            SSH_Key_Exchange.keypair_pool = None
+
+    def check_public_value(method:str, value:int):
+        """
+        Description:
+            Checks that the other side's public value (e or f) is in the range (1, p-1).
+        """
+        p, _, _ = SSH_Key_Exchange.GROUPS[method]
+        if not 1 < value < p - 1:
+            Logs.error(msg="Diffie-Hellman public value out of range!", additional=f"Method: {method}", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+
+    def shared_secret(method:str, others_value:int, x:int):
+        """
+        Returns:
+            The shared secret K = others_value^x mod p.
+        """
+        SSH_Key_Exchange.check_public_value(method, others_value)
+        p, _, _ = SSH_Key_Exchange.GROUPS[method]
+        return pow(others_value, x, p)
+
+    def exchange_hash(method:str, v_c:str, v_s:str, i_c:bytes, i_s:bytes, k_s:bytes, e:int, f:int, k:int):
+        """
+        Description:
+            Computes the exchange hash H = HASH(V_C || V_S || I_C || I_S || K_S || e || f || K).
+
+        Parameters:
+            `v_c`, `v_s`: client's and server's ID strings (CR LF is removed).
+            `i_c`, `i_s`: payloads of the client's and server's SSH_MSG_KEXINIT.
+            `k_s`: server's public host key blob.
+            `e`, `f`: client's and server's public values.
+            `k`: shared secret.
+
+        Returns:
+            The exchange hash as bytes.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        h = SSH_Key_Exchange.GROUPS[method][2]()
+        h.update(U.string_to_bytes(v_c.rstrip("\r\n").encode()))
+        h.update(U.string_to_bytes(v_s.rstrip("\r\n").encode()))
+        h.update(U.string_to_bytes(bytes(i_c)))
+        h.update(U.string_to_bytes(bytes(i_s)))
+        h.update(U.string_to_bytes(k_s))
+        h.update(U.mpint_to_bytes(e))
+        h.update(U.mpint_to_bytes(f))
+        h.update(U.mpint_to_bytes(k))
+        return h.digest()
+
+    def create_kexdh_init(e:int):
+        """
+        Description:
+            Creates the SSH_MSG_KEXDH_INIT payload:
+                byte      SSH_MSG_KEXDH_INIT
+                mpint     e
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.MSG_CODE["SSH_MSG_KEXDH_INIT"].to_bytes(1) + U.mpint_to_bytes(e)
+
+    def parse_kexdh_init(payload):
+        """
+        Returns:
+            The client's public value e.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        if len(payload) < 5 or payload[0] != U.MSG_CODE["SSH_MSG_KEXDH_INIT"]:
+            Logs.error(msg="Expected SSH_MSG_KEXDH_INIT!", additional=f"Message code: {payload[0] if len(payload) else None}", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+        e, _ = U.read_mpint(payload, 1)
+        return e
+
+    def create_kexdh_reply(k_s:bytes, f:int, signature:bytes):
+        """
+        Description:
+            Creates the SSH_MSG_KEXDH_REPLY payload:
+                byte      SSH_MSG_KEXDH_REPLY
+                string    server public host key and certificates (K_S)
+                mpint     f
+                string    signature of H
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.MSG_CODE["SSH_MSG_KEXDH_REPLY"].to_bytes(1) + U.string_to_bytes(k_s) + U.mpint_to_bytes(f) + U.string_to_bytes(signature)
+
+    def parse_kexdh_reply(payload):
+        """
+        Returns:
+            A tuple (K_S, f, signature).
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        if len(payload) < 13 or payload[0] != U.MSG_CODE["SSH_MSG_KEXDH_REPLY"]:
+            Logs.error(msg="Expected SSH_MSG_KEXDH_REPLY!", additional=f"Message code: {payload[0] if len(payload) else None}", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+        k_s, index = U.read_string(payload, 1)
+        f, index = U.read_mpint(payload, index)
+        signature, _ = U.read_string(payload, index)
+        return k_s, f, signature
+
+    def derive_key(method:str, k:int, h:bytes, letter:str, session_id:bytes, length:int):
+        """
+        Description:
+            Derives a key from the shared secret as RFC 4253 7.2 describes:
+                K1 = HASH(K || H || letter || session_id)
+                K2 = HASH(K || H || K1)
+                ...
+                key = K1 || K2 || ...
+
+        Parameters:
+            `letter`: "A" to "F", depending on the key (IVs, encryption keys and integrity keys of each direction).
+            `length`: number of bytes needed.
+
+        Returns:
+            The key as bytes.
+        """
+        hash_function = SSH_Key_Exchange.GROUPS[method][2]
+        prefix = SSH_Transport_Layer_Protocol_Utils.mpint_to_bytes(k) + h
+        key = hash_function(prefix + letter.encode() + session_id).digest()
+        while len(key) < length:
+            key += hash_function(prefix + key).digest()
+        return key[:length]
+
+    def derive_session_keys(method:str, k:int, h:bytes, session_id:bytes, algorithms:dict, server_role:bool):
+        """
+        Description:
+            Derives the keys of both directions and builds the objects that use them.
+
+        Parameters:
+            `algorithms`: negotiated algorithms, keyed like the transport's configuration dictionary.
+            `server_role`: whether the keys are for the server's side.
+
+        Returns:
+            A tuple (outgoing, incoming) of dictionaries with the keyword arguments of `SSH_Packet_Encoder.set_keys`
+            and `SSH_Packet_Decoder.set_keys`.
+        """
+        keys = {}
+        for direction, letters in SSH_Key_Exchange.DIRECTIONS.items():
+            cipher_algorithm = algorithms.get(letters["cipher"]) or "none"
+            iv = SSH_Key_Exchange.derive_key(method, k, h, letters["iv"], session_id, SSH_Cipher.iv_length(cipher_algorithm))
+            cipher_key = SSH_Key_Exchange.derive_key(method, k, h, letters["encryption"], session_id, SSH_Cipher.key_length(cipher_algorithm))
+            mac_algorithm = algorithms.get(letters["mac"]) or "none"
+            mac_key = SSH_Key_Exchange.derive_key(method, k, h, letters["integrity"], session_id, SSH_MAC.key_length(mac_algorithm))
+            keys[direction] = {"cipher" : SSH_Cipher.create(cipher_algorithm, cipher_key, iv), "mac" : SSH_MAC(mac_algorithm, mac_key), "compression" : algorithms.get(letters["compression"]) or "none"}
+
+        outgoing, incoming = ("server_to_client", "client_to_server") if server_role else ("client_to_server", "server_to_client")
+        return (
+            {"cipher" : keys[outgoing]["cipher"], "mac" : keys[outgoing]["mac"], "compressor" : SSH_Compressor(keys[outgoing]["compression"])},
+            {"cipher" : keys[incoming]["cipher"], "mac" : keys[incoming]["mac"], "decompressor" : SSH_Decompressor(keys[incoming]["compression"])}
+        )
+
+
+class SSH_DH_Keypair_Pool():
+    """
+    Description:
+        Bounded queues of ready Diffie-Hellman keypairs, one per method, refilled in the background.
+
+        A filler thread per method keeps its queue full. It either computes keypairs itself or, with
+        `use_processes`, hands the work to a `ProcessPoolExecutor` so it runs on other cores and does not compete
+        with handshakes for the GIL. Worker processes run at the lowest priority, so on a busy machine they only
+        use idle CPU time.
+    """
+
+    def __init__(self, methods:list, size:int=16, use_processes:bool=False, workers:int=1):
+        self.methods = methods
+        self.size = size
+        self.use_processes = use_processes
+        self.workers = workers
+        self.queues = {method : queue.Queue(maxsize=size) for method in methods}
+        self.executor = None
+        self.threads = []
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self.use_processes:
+            # Lowest priority: refilling must not take CPU from handshakes in progress
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                initializer=os.nice if hasattr(os, "nice") else None, initargs=(19,))
+        self.stopped = False
+        for method in self.methods:
+            thread = threading.Thread(target=self.__fill, args=(method,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def get(self, method:str):
+        """
+        Returns:
+            A ready keypair (x, g^x mod p), or None if the queue of `method` is empty.
+        """
+        try:
+            keypair = self.queues[method].get_nowait()
+        except queue.Empty:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.condition:
+            self.condition.notify_all()
+        return keypair
+
+    def wait_until_full(self, timeout:float=None):
+        """
+        Description:
+            Blocks until every queue is full. Useful before benchmarks.
+
+        Returns:
+            False if `timeout` seconds passed first, True otherwise.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(not q.full() for q in self.queues.values()):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def __fill(self, method:str):
+        q = self.queues[method]
+        while True:
+            with self.condition:
+                while q.full() and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+
+            if self.executor is not None:
+                try:
+                    keypair = self.executor.submit(SSH_Key_Exchange.generate_keypair, method).result()
+                except concurrent.futures.CancelledError:
+                    return
+            else:
+                keypair = SSH_Key_Exchange.generate_keypair(method)
+
+            try:
+                q.put_nowait(keypair)
+            except queue.Full:
+                pass
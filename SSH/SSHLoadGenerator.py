@@ -0,0 +1,172 @@
+import time
+import threading
+import itertools
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHInstrumentation import SSH_Instrumentation, SSH_Histogram
+
+
+class SSH_Load_Generator():
+    """
+    Description:
+        Opens many concurrent `SSH_Transport_Layer_Protocol.client` connections against a server and reports how
+        it held up: handshakes per second, the latency percentiles of every handshake phase, the errors by
+        disconnect reason and the throughput of bulk `send`.
+
+        `concurrency` threads run one connection at a time each until `connections` have been opened. Thread
+        `i` starts `ramp_up * i / concurrency` seconds after the first, so the load grows linearly instead of
+        starting with a burst of `concurrency` simultaneous handshakes. After its handshake a connection sends
+        `bulk_bytes` in SSH_MSG_IGNORE packets (if any) and closes.
+
+        Phase latencies come from the instrumentation (see `SSH_Instrumentation`), which is enabled for the run.
+    """
+
+    # Payload bytes of every bulk packet, under `MAX_PACKET_LEN` with room for the header, padding and MAC
+    BULK_PACKET_SIZE = 32 * 1024
+
+    # Reasons of errors raised without one of their own
+    CONNECTION_LOST = "SSH_DISCONNECT_CONNECTION_LOST"
+    PROTOCOL_ERROR = "SSH_DISCONNECT_PROTOCOL_ERROR"
+
+    def __init__(self, port:int, ip:str="localhost", config:dict={}, connections:int=1000, concurrency:int=100,
+                 ramp_up:float=0.0, bulk_bytes:int=0, timeout:float=30.0):
+        """
+        Parameters:
+            `port`, `ip`: the server.
+            `config`: configuration dictionary of the clients (see `SSH_Transport_Layer_Protocol.VALID_CONFIGS`).
+            `connections`: connections opened in total.
+            `concurrency`: connections open at the same time.
+            `ramp_up`: seconds until every thread has started.
+            `bulk_bytes`: bytes every connection sends after its handshake.
+            `timeout`: seconds a connection may wait for the socket before failing.
+        """
+        self.port = port
+        self.ip = ip
+        self.config = config
+        self.connections = connections
+        self.concurrency = max(min(concurrency, connections), 1)
+        self.ramp_up = ramp_up
+        self.bulk_bytes = bulk_bytes
+        self.timeout = timeout
+
+        code = SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_IGNORE"]
+        self.bulk_payload = code.to_bytes(1) + SSH_Transport_Layer_Protocol_Utils.string_to_bytes(bytes(SSH_Load_Generator.BULK_PACKET_SIZE - 5))
+
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.handshakes = 0
+        self.errors = {}        # Reason -> number of connections
+        self.histograms = {}    # Phase -> SSH_Histogram of the clients' durations
+        self.bulk_sent = 0
+        self.bulk_start = None
+        self.bulk_end = None
+
+
+    """ API Methods """
+    def run(self):
+        """
+        Description:
+            Opens the connections and waits for all of them to finish.
+
+        Returns:
+            The report (see `report`).
+        """
+        was_enabled = SSH_Instrumentation.enabled
+        SSH_Instrumentation.enable()
+        SSH_Instrumentation.add_hook(self.__record)
+        try:
+            start = time.perf_counter()
+            threads = [threading.Thread(target=self.__worker, args=(self.ramp_up * i / self.concurrency,), daemon=True)
+                       for i in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - start
+        finally:
+            SSH_Instrumentation.remove_hook(self.__record)
+            if not was_enabled:
+                SSH_Instrumentation.disable()
+        return self.report(seconds)
+
+    def report(self, seconds:float):
+        """
+        Returns:
+            A dictionary with the "connections" opened, the "handshakes" completed, the "seconds" the run took,
+            "handshakes_per_sec", the "phases" summaries (see `SSH_Instrumentation.summary`) of the clients, the
+            "errors" by disconnect reason, the "bulk_bytes" sent and "bulk_bytes_per_sec" from the first bulk
+            send to the last flush.
+        """
+        with self.lock:
+            bulk_seconds = self.bulk_end - self.bulk_start if self.bulk_start is not None else 0.0
+            return {"connections" : self.connections, "handshakes" : self.handshakes, "seconds" : seconds,
+                    "handshakes_per_sec" : self.handshakes / seconds if seconds else 0.0,
+                    "phases" : {phase : histogram.summary() for phase, histogram in self.histograms.items()},
+                    "errors" : dict(self.errors), "bulk_bytes" : self.bulk_sent,
+                    "bulk_bytes_per_sec" : self.bulk_sent / bulk_seconds if bulk_seconds else 0.0}
+
+    def disconnect_reason(error:Exception):
+        """
+        Returns:
+            The name in `DISCONNECT_MSG_CODES` of the reason `error` ended a connection: the one it was raised
+            with (see `SSH_Error`), e.g. the one the other side sent or the one of the handshake timeout that
+            expired, `CONNECTION_LOST` for socket errors and `PROTOCOL_ERROR` for any other error.
+        """
+        reason = getattr(error, "reason", None)
+        if reason is not None:
+            return reason
+        if isinstance(error, OSError): # Refused, reset or timed out
+            return SSH_Load_Generator.CONNECTION_LOST
+        return SSH_Load_Generator.PROTOCOL_ERROR
+
+
+    """ Private Methods """
+    def __worker(self, delay:float):
+        time.sleep(delay)
+        while next(self.counter) < self.connections:
+            self.__connection()
+
+    def __connection(self):
+        transport = SSH_Transport_Layer_Protocol.client(self.port, self.ip, self.config, socket_timeout=self.timeout)
+        try:
+            with transport:
+                if self.bulk_bytes:
+                    self.__bulk(transport)
+        except Exception as e:
+            reason = SSH_Load_Generator.disconnect_reason(e)
+            with self.lock:
+                self.errors[reason] = self.errors.get(reason, 0) + 1
+            # `__exit__` isn't called when the handshake fails
+            if transport.connection is not None and transport.connection.fileno() != -1:
+                try:
+                    transport.__exit__(None, None, None)
+                except Exception:
+                    pass
+
+    def __bulk(self, transport:SSH_Transport_Layer_Protocol):
+        start = time.perf_counter()
+        sent = 0
+        while sent < self.bulk_bytes:
+            transport.send(self.bulk_payload)
+            sent += len(self.bulk_payload)
+        transport.flush()
+        end = time.perf_counter()
+        with self.lock:
+            self.bulk_sent += sent
+            self.bulk_start = start if self.bulk_start is None else min(self.bulk_start, start)
+            self.bulk_end = end if self.bulk_end is None else max(self.bulk_end, end)
+
+    def __record(self, stats, phase:str):
+        """
+        Description:
+            Instrumentation hook: adds the phase durations of every client handshake of the process.
+        """
+        if stats.server_role or phase != "established":
+            return
+        durations = stats.durations()
+        with self.lock:
+            self.handshakes += 1
+            for name, duration in durations.items():
+                if name not in self.histograms:
+                    self.histograms[name] = SSH_Histogram()
+                self.histograms[name].add(duration)
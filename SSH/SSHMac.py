@@ -0,0 +1,90 @@
+import hmac
+import struct
+import hashlib
+from utils import Logs
+
+
+class SSH_MAC():
+    """
+    Description:
+        Message authentication code of one direction of a connection (RFC 4253 6.4):
+
+            mac = MAC(key, sequence_number || unencrypted_packet)
+
+        The HMAC is keyed once, when the keys are taken into use after SSH_MSG_NEWKEYS. Every packet then only
+        copies the keyed state, which skips hashing the key pads again, and feeds it the sequence number and the
+        packet without copying them.
+    """
+
+    # Algorithm -> (hash, length of the MAC, length of the key)
+    ALGORITHMS = {
+        "hmac-sha1"     :   (hashlib.sha1, 20, 20),
+        "hmac-sha1-96"  :   (hashlib.sha1, 12, 20),
+        "hmac-sha256"   :   (hashlib.sha256, 32, 32),
+        "hmac-md5"      :   (hashlib.md5, 16, 16),
+        "hmac-md5-96"   :   (hashlib.md5, 12, 16),
+        "none"          :   (None, 0, 0)
+    }
+
+    SEQUENCE_NUMBER = struct.Struct(">I")
+
+    def __init__(self, algorithm:str, key:bytes=b""):
+        if algorithm not in SSH_MAC.ALGORITHMS:
+            Logs.error(msg="Unsupported MAC algorithm!", additional=f"Algorithm: {algorithm}")
+        digestmod, self.length, key_length = SSH_MAC.ALGORITHMS[algorithm]
+        if len(key) < key_length:
+            Logs.error(msg="MAC key too short!", additional=f"Algorithm: {algorithm} Key length: {len(key)}")
+        self.algorithm = algorithm
+        self.keyed = hmac.new(key[:key_length], digestmod=digestmod) if digestmod is not None else None
+
+    def key_length(algorithm:str):
+        """
+        Returns:
+            The length of the key `algorithm` needs.
+        """
+        return SSH_MAC.ALGORITHMS[algorithm][2]
+
+    def compute(self, sequence_number:int, packet):
+        """
+        Parameters:
+            `sequence_number`: sequence number of the packet.
+            `packet`: the unencrypted packet (any object supporting the buffer protocol).
+
+        Returns:
+            The MAC as bytes (empty for "none").
+        """
+        if self.keyed is None:
+            return b""
+        h = self.keyed.copy()
+        h.update(SSH_MAC.SEQUENCE_NUMBER.pack(sequence_number & 0xFFFFFFFF))
+        h.update(packet)
+        return h.digest()[:self.length]
+
+    def compute_batch(self, first_sequence_number:int, packets:list):
+        """
+        Description:
+            MACs consecutive outgoing packets in one call.
+
+        Returns:
+            A list with the MAC of every packet.
+        """
+        if self.keyed is None:
+            return [b""] * len(packets)
+        keyed, pack, length = self.keyed, SSH_MAC.SEQUENCE_NUMBER.pack, self.length
+        macs = []
+        for i, packet in enumerate(packets):
+            h = keyed.copy()
+            h.update(pack((first_sequence_number + i) & 0xFFFFFFFF))
+            h.update(packet)
+            macs.append(h.digest()[:length])
+        return macs
+
+    def verify(self, sequence_number:int, packet, mac):
+        """
+        Description:
+            Checks a recieved MAC in constant time.
+
+        Returns:
+            True if `mac` is the MAC of `packet`, false otherwise.
+        """
+        return hmac.compare_digest(self.compute(sequence_number, packet), mac)
@@ -0,0 +1,284 @@
+import os
+import time
+import signal
+import socket
+import asyncio
+import threading
+import multiprocessing
+import multiprocessing.connection
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHTransportLayerProtocol import SSH_Config
+from SSH.SSHHostKey import SSH_Host_Key
+from SSH.SSHInstrumentation import SSH_Instrumentation
+from utils import Logs
+
+
+class SSH_Multi_Process_Server():
+    """
+    Description:
+        Runs `SSH_Async_Transport_Layer_Protocol.server` in several worker processes listening on the same port, so
+        handshakes (which are CPU bound) use every core instead of one.
+
+        With `reuse_port` every worker binds its own listener with SO_REUSEPORT and the kernel spreads incoming
+        connections between them. Without it (or where SO_REUSEPORT doesn't exist) the listener is bound before
+        forking and every worker accepts from the inherited one.
+
+        A supervisor thread in the parent process restarts workers that exit, and gathers the connection and
+        handshake counts every worker sends through its own pipe every `STATS_INTERVAL` seconds (see `stats`).
+        Pipes rather than one shared queue: a worker crashing while writing to a queue could leave its
+        cross-process lock held and silence every other worker.
+
+        `stop` drains: workers stop accepting, wait up to `drain_timeout` seconds for the connections they have
+        (handshakes and `on_connection` calls) to finish and then exit; the ones still running after that are
+        killed. Connections still waiting in the listen backlog of a worker's own SO_REUSEPORT listener are reset.
+
+        Workers are forked, so `on_connection` doesn't need to be picklable. After `on_connection` returns the
+        connection is closed. Host keys are created (see `SSH_Host_Key`) before forking, so every worker serves
+        the same ones.
+    """
+
+    STATS_INTERVAL = 0.5
+    DRAIN_TIMEOUT = 30.0
+    # A worker exiting sooner than this after starting is restarted after `RESTART_DELAY`, not right away
+    MIN_UPTIME = 1.0
+    RESTART_DELAY = 1.0
+    # Counts of a worker that are only meaningful while it runs
+    CURRENT_COUNTS = ("active", "handshaking")
+
+    def __init__(self, port:int, config:dict={}, on_connection=None, ip:str="localhost", workers:int=None,
+                 reuse_port:bool=None, drain_timeout:float=DRAIN_TIMEOUT, backlog:int=4096):
+        """
+        Parameters:
+            `port`: port to listen on. 0 chooses a free one, shared by every worker (see `port` after `start`).
+            `config`: configuration dictionary (see `SSH_Transport_Layer_Protocol.VALID_CONFIGS`).
+            `on_connection`: coroutine function called, in a worker, with every connection after its handshake.
+            `workers`: number of worker processes. Defaults to the number of CPUs.
+            `reuse_port`: whether workers bind their own SO_REUSEPORT listener. Defaults to whether the platform has it.
+        """
+        self.port = port
+        self.ip = ip
+        self.config = config
+        self.on_connection = on_connection
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.reuse_port = reuse_port if reuse_port is not None else hasattr(socket, "SO_REUSEPORT")
+        self.drain_timeout = drain_timeout
+        self.backlog = backlog
+
+        self.context = multiprocessing.get_context("fork")
+        self.listener = None    # Listener shared by the workers, or the socket holding the port with SO_REUSEPORT
+        self.processes = [None] * self.workers
+        self.pipes = [None] * self.workers     # Read ends of the workers' stats pipes
+        self.started = [0.0] * self.workers
+        self.restart_at = [None] * self.workers
+        self.worker_stats = {}  # Pid -> last counts it sent
+        self.restarts = 0
+        self.stopping = False
+        self.supervisor = None
+        self.lock = threading.Lock()
+
+
+    """ API Methods """
+    def start(self):
+        """
+        Description:
+            Binds the port, forks the workers and starts the supervisor. Returns once the workers are forked.
+        """
+        if self.reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            Logs.error(msg="SO_REUSEPORT isn't available on this platform!")
+        # Workers (also restarted ones) inherit the keys instead of each generating its own
+        SSH_Host_Key.generate_signers(SSH_Config.intern(self.config)["SERVER_HOST_KEY_ALGS"])
+        self.listener = self.__bind()
+        if not self.reuse_port:
+            self.listener.listen(self.backlog)
+        # Workers bind the same port, also when 0 was given
+        self.port = self.listener.getsockname()[1]
+
+        for index in range(self.workers):
+            self.__start_worker(index)
+        self.supervisor = threading.Thread(target=self.__supervise, daemon=True)
+        self.supervisor.start()
+
+    def stop(self):
+        """
+        Description:
+            Drains and stops every worker, then collects their last counts.
+        """
+        self.stopping = True
+        if self.supervisor is not None:
+            self.supervisor.join()
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate() # SIGTERM, the worker drains
+        deadline = time.monotonic() + self.drain_timeout + SSH_Multi_Process_Server.STATS_INTERVAL
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        for index in range(self.workers):
+            self.__close_pipe(index)
+        if self.listener is not None:
+            self.listener.close()
+
+    def serve_forever(self):
+        """
+        Description:
+            Starts the server and runs it until SIGINT or SIGTERM, then drains it. Must be called from the main thread.
+        """
+        stop = threading.Event()
+        previous = {signum : signal.signal(signum, lambda *_: stop.set()) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start()
+            while not stop.wait(SSH_Multi_Process_Server.STATS_INTERVAL):
+                pass
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.stop()
+
+    def stats(self):
+        """
+        Returns:
+            A dictionary with the total "connections", "handshakes" and "failures" of every worker (including
+            exited ones), the "active" connections in `on_connection` and "handshaking" connections of the running
+            workers, the number of running "workers" and of "restarts". Counts are up to `STATS_INTERVAL` old.
+        """
+        with self.lock:
+            alive = {process.pid for process in self.processes if process is not None and process.is_alive()}
+            totals = {"connections" : 0, "handshakes" : 0, "failures" : 0, "active" : 0, "handshaking" : 0}
+            for pid, counts in self.worker_stats.items():
+                for name, count in counts.items():
+                    if pid in alive or name not in SSH_Multi_Process_Server.CURRENT_COUNTS:
+                        totals[name] += count
+            totals["workers"] = len(alive)
+            totals["restarts"] = self.restarts
+            return totals
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_details):
+        self.stop()
+
+
+    """ Supervisor """
+    def __supervise(self):
+        while not self.stopping:
+            # Wakes up on stats and on workers exiting (their sentinel becomes ready)
+            waitables = [pipe for pipe in self.pipes if pipe is not None]
+            waitables += [process.sentinel for process in self.processes if process is not None]
+            for ready in multiprocessing.connection.wait(waitables, SSH_Multi_Process_Server.STATS_INTERVAL / 5):
+                if ready in self.pipes:
+                    self.__collect(self.pipes.index(ready))
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if self.stopping:
+                    return
+                if process is not None and not process.is_alive():
+                    process.join()
+                    self.__close_pipe(index)
+                    self.processes[index] = None
+                    with self.lock:
+                        self.restarts += 1
+                    # Don't fork in a loop a worker that crashes as soon as it starts
+                    quick = now - self.started[index] < SSH_Multi_Process_Server.MIN_UPTIME
+                    self.restart_at[index] = now + SSH_Multi_Process_Server.RESTART_DELAY if quick else now
+                if self.processes[index] is None and now >= self.restart_at[index]:
+                    self.__start_worker(index)
+
+    def __start_worker(self, index:int):
+        reader, writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=self.__worker, args=(writer,), daemon=True)
+        process.start()
+        writer.close() # Only the worker writes, so the reader sees EOF when it exits
+        self.processes[index] = process
+        self.pipes[index] = reader
+        self.started[index] = time.monotonic()
+        self.restart_at[index] = None
+
+    def __collect(self, index:int):
+        """
+        Description:
+            Reads every count message waiting in the stats pipe of worker `index`, without blocking.
+        """
+        pipe = self.pipes[index]
+        try:
+            while pipe.poll():
+                pid, counts = pipe.recv()
+                with self.lock:
+                    self.worker_stats[pid] = counts
+        except (EOFError, OSError): # The worker exited, its sentinel tells the supervisor
+            pass
+
+    def __close_pipe(self, index:int):
+        if self.pipes[index] is not None:
+            self.__collect(index) # Last counts sent before the worker exited
+            self.pipes[index].close()
+            self.pipes[index] = None
+
+    def __bind(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener.bind((self.ip, self.port))
+        return listener
+
+
+    """ Worker """
+    def __worker(self, stats_pipe):
+        # Ctrl-C reaches the whole process group: only the supervisor handles it, workers wait for SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if self.reuse_port:
+            # The parent's socket only holds the port, it never listens
+            self.listener.close()
+            listener = self.__bind()
+        else:
+            listener = self.listener
+        asyncio.run(self.__serve(listener, stats_pipe))
+
+    async def __serve(self, listener:socket.socket, stats_pipe):
+        counts = {"connections" : 0, "handshakes" : 0, "failures" : 0, "active" : 0, "handshaking" : 0}
+        def count_phases(stats, phase):
+            if phase == "version_exchange":
+                counts["connections"] += 1
+                counts["handshaking"] += 1
+            elif phase == "established":
+                counts["handshakes"] += 1
+                counts["handshaking"] -= 1
+            elif phase == "failed":
+                counts["failures"] += 1
+                counts["handshaking"] -= 1
+        SSH_Instrumentation.enable()
+        SSH_Instrumentation.add_hook(count_phases)
+
+        async def on_connection(connection):
+            counts["active"] += 1
+            try:
+                if self.on_connection is not None:
+                    await self.on_connection(connection)
+            finally:
+                counts["active"] -= 1
+                connection.close()
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        server = await SSH_Async_Transport_Layer_Protocol.server(self.port, self.config, on_connection, backlog=self.backlog, sock=listener)
+
+        while not stop.is_set():
+            stats_pipe.send((os.getpid(), dict(counts)))
+            try:
+                await asyncio.wait_for(stop.wait(), SSH_Multi_Process_Server.STATS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+        # Drain: stop accepting and let the connections already accepted finish
+        server.close()
+        deadline = loop.time() + self.drain_timeout
+        while (counts["active"] or counts["handshaking"]) and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        stats_pipe.send((os.getpid(), dict(counts)))
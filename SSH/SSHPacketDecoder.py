@@ -0,0 +1,202 @@
+import struct
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHCipher import SSH_Cipher, SSH_None_Cipher
+from SSH.SSHMac import SSH_MAC
+from SSH.SSHCompression import SSH_Decompressor
+from SSH.SSHBufferPool import SSH_Buffer_Pool
+from utils import Logs
+
+
+class SSH_Packet_Decoder():
+    """
+    Description:
+        Streaming decoder for the SSH binary packet protocol. Data read from the socket goes straight into a
+        reusable buffer (`recv_into`) and complete packets are returned as `memoryview` slices of that buffer,
+        so no bytes objects are created while decoding.
+
+        The stream can be split in any way across reads: incomplete packets simply stay in the buffer until the
+        rest of their bytes arrive.
+
+    Notes:
+        A payload returned by `next_packet` is a view into the internal buffer. It is only valid until the next
+        call to `recv_into`, `feed` or `writable`, which may move unconsumed bytes to the front of the buffer.
+        Copy it (`bytes(payload)`) if it has to outlive that.
+
+        Packets are decrypted in place. The first block is decrypted as soon as it arrives, to read the packet
+        length, and the rest once the whole packet is buffered.
+
+        After a SSH_MSG_NEWKEYS packet the decoder stops returning packets until `set_keys` is called, because
+        the packets that follow are protected with the new keys.
+
+        The buffer comes from `SSH_Buffer_Pool` when data first arrives and goes back with `release` once every
+        buffered byte is consumed, so an idle connection holds no buffer.
+    """
+
+    __slots__ = ("cipher_block_size", "buffer_size", "buffer", "view", "start", "end", "sequence_number", "cipher",
+                 "first_block_length", "first_block_decrypted", "mac", "decompressor", "waiting_for_keys")
+
+    # Room for two maximum sized packets, so a full packet always fits after compaction
+    DEFAULT_BUFFER_SIZE = 2 * (SSH_Transport_Layer_Protocol_Utils.MAX_PACKET_LEN + SSH_Transport_Layer_Protocol_Utils.PACKET_LENGTH_FIELD_LEN)
+
+    def __init__(self, cipher_block_size:int=8, buffer_size:int=DEFAULT_BUFFER_SIZE):
+        self.cipher_block_size = cipher_block_size if cipher_block_size > 8 else 8
+        self.buffer_size = buffer_size
+        self.buffer = None  # Taken from `SSH_Buffer_Pool` while there is buffered data
+        self.view = None
+        self.start = 0  # First byte not consumed yet
+        self.end = 0    # End of valid data
+        self.sequence_number = 0
+        self.cipher = SSH_Cipher.create("none")
+        self.first_block_length = SSH_Transport_Layer_Protocol_Utils.PACKET_HEADER_LEN
+        self.first_block_decrypted = False
+        self.mac = SSH_MAC("none")
+        self.decompressor = SSH_Decompressor("none")
+        self.waiting_for_keys = False
+
+
+    """ Keys """
+    def set_keys(self, cipher, mac:SSH_MAC, decompressor:SSH_Decompressor):
+        """
+        Description:
+            Takes the keys sent by the other side's SSH_MSG_NEWKEYS into use.
+        """
+        self.cipher = cipher
+        self.cipher_block_size = max(cipher.block_size, 8)
+        # Without encryption the header can be read before a whole block arrives
+        self.first_block_length = SSH_Transport_Layer_Protocol_Utils.PACKET_HEADER_LEN if isinstance(cipher, SSH_None_Cipher) else cipher.block_size
+        self.mac = mac
+        self.decompressor = decompressor
+        self.waiting_for_keys = False
+
+
+    """ Input """
+    def writable(self):
+        """
+        Description:
+            Returns the free part of the buffer, compacting it first if needed.
+
+        Returns:
+            A writable memoryview. Call `advance` with the number of bytes written into it.
+        """
+        if self.buffer is None:
+            self.buffer = SSH_Buffer_Pool.acquire(self.buffer_size)
+            self.view = memoryview(self.buffer)
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.start > 0 and len(self.buffer) - self.end < len(self.buffer) // 2:
+            pending = self.end - self.start
+            self.view[0:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        return self.view[self.end:]
+
+    def advance(self, n:int):
+        """
+        Description:
+            Marks `n` bytes written into the view returned by `writable` as valid data.
+        """
+        self.end += n
+
+    def recv_into(self, connection):
+        """
+        Description:
+            Reads from `connection` directly into the buffer.
+
+        Parameters:
+            `connection`: a socket (anything with a `recv_into` method).
+
+        Returns:
+            Number of bytes read. 0 means the peer closed the connection.
+        """
+        n = connection.recv_into(self.writable())
+        self.end += n
+        return n
+
+    def feed(self, data):
+        """
+        Description:
+            Copies `data` into the buffer. Used when the bytes were not read through `recv_into`
+            (e.g. leftover bytes of the version exchange).
+        """
+        free = self.writable()
+        if len(data) > len(free):
+            Logs.error(msg="Packet decoder buffer overflow!", additional=f"Free: {len(free)} Data: {len(data)}")
+        free[:len(data)] = data
+        self.end += len(data)
+
+    def release(self):
+        """
+        Description:
+            Gives the buffer back to `SSH_Buffer_Pool` if every byte in it was consumed. Payloads returned by
+            `next_packet` must not be used afterwards.
+
+        Returns:
+            Whether the buffer was given back.
+        """
+        if self.buffer is None or self.start != self.end:
+            return False
+        SSH_Buffer_Pool.release(self.buffer)
+        self.buffer = self.view = None
+        self.start = self.end = 0
+        return True
+
+
+    """ Output """
+    def pending(self):
+        """
+        Returns:
+            The number of buffered bytes not consumed yet.
+        """
+        return self.end - self.start
+
+    def next_packet(self):
+        """
+        Description:
+            Decodes the next complete packet in the buffer.
+
+        Returns:
+            The payload as a memoryview, or None if there isn't a complete packet buffered yet. Compressed payloads
+            are decompressed into a new buffer.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        first_block = self.first_block_length
+        if self.waiting_for_keys or self.end - self.start < first_block:
+            return None
+
+        if not self.first_block_decrypted:
+            self.cipher.process(self.view[self.start:self.start+first_block])
+            self.first_block_decrypted = True
+        packet_length, len_padding = struct.unpack_from(">IB", self.buffer, self.start)
+        total = U.PACKET_LENGTH_FIELD_LEN + packet_length
+        if packet_length > U.MAX_PACKET_LEN or total < U.MIN_PACKET_LEN or total % self.cipher_block_size != 0:
+            Logs.error(msg="Invalid packet length!", additional=f"Packet length: {packet_length}", reason="SSH_DISCONNECT_PROTOCOL_ERROR")
+        if len_padding < U.MIN_PADDING_LEN or len_padding > packet_length - 1:
+            Logs.error(msg="Invalid padding length!", additional=f"Padding length: {len_padding}", reason="SSH_DISCONNECT_PROTOCOL_ERROR")
+
+        mac_length = self.mac.length
+        if self.end - self.start < total + mac_length:
+            return None
+
+        start = self.start
+        self.cipher.process(self.view[start+first_block:start+total])
+        self.first_block_decrypted = False
+        if mac_length and not self.mac.verify(self.sequence_number, self.view[start:start+total], self.view[start+total:start+total+mac_length]):
+            Logs.error(msg="MAC error!", additional=f"Sequence number: {self.sequence_number}", reason="SSH_DISCONNECT_MAC_ERROR")
+
+        payload = self.view[start+U.PACKET_HEADER_LEN:start+total-len_padding]
+        if self.decompressor.active:
+            payload = memoryview(self.decompressor.decompress(payload))
+        self.start += total + mac_length
+        self.sequence_number = (self.sequence_number + 1) & 0xFFFFFFFF
+        if len(payload) == 1 and payload[0] == U.MSG_CODE["SSH_MSG_NEWKEYS"]:
+            self.waiting_for_keys = True
+        return payload
+
+    def packets(self):
+        """
+        Description:
+            Yields every complete packet currently buffered.
+        """
+        payload = self.next_packet()
+        while payload is not None:
+            yield payload
+            payload = self.next_packet()
@@ -0,0 +1,81 @@
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHCipher import SSH_Cipher
+from SSH.SSHMac import SSH_MAC
+from SSH.SSHCompression import SSH_Compressor
+
+
+class SSH_Packet_Encoder():
+    """
+    Description:
+        Outgoing half of the binary packet protocol: compresses payloads, frames them (see `write_base_packet`),
+        appends their MAC, encrypts them in place and keeps the sequence number.
+    """
+
+    __slots__ = ("cipher_block_size", "sequence_number", "cipher", "mac", "compressor")
+
+    def __init__(self, cipher_block_size:int=8):
+        self.cipher_block_size = cipher_block_size
+        self.sequence_number = 0
+        self.cipher = SSH_Cipher.create("none")
+        self.mac = SSH_MAC("none")
+        self.compressor = SSH_Compressor("none")
+
+    def set_keys(self, cipher, mac:SSH_MAC, compressor:SSH_Compressor):
+        """
+        Description:
+            Takes new keys into use. Must be called right after sending SSH_MSG_NEWKEYS. Packets are padded to
+            the block size of the new cipher from then on.
+        """
+        self.cipher = cipher
+        self.cipher_block_size = max(cipher.block_size, 8)
+        self.mac = mac
+        self.compressor = compressor
+
+    def encode(self, payload):
+        """
+        Returns:
+            A bytearray with the encrypted packet of `payload` followed by its MAC.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        payload = self.compressor.compress(payload)
+        total, _ = U.packet_lengths(len(payload), self.cipher_block_size)
+        packet = bytearray(total + self.mac.length)
+        U.write_base_packet(packet, 0, payload, self.cipher_block_size)
+        view = memoryview(packet)
+        if self.mac.length:
+            view[total:] = self.mac.compute(self.sequence_number, view[:total])
+        self.cipher.process(view[:total])
+        self.sequence_number = (self.sequence_number + 1) & 0xFFFFFFFF
+        return packet
+
+    def encode_batch(self, payloads:list):
+        """
+        Description:
+            Encodes several payloads into one buffer, computing all their MACs in one call.
+
+        Returns:
+            A bytearray with the encrypted packets, each followed by its MAC.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        payloads = [self.compressor.compress(payload) for payload in payloads]
+        sizes = [U.packet_lengths(len(payload), self.cipher_block_size)[0] for payload in payloads]
+        mac_length = self.mac.length
+        buffer = bytearray(sum(sizes) + mac_length * len(payloads))
+        view = memoryview(buffer)
+
+        offsets = []
+        offset = 0
+        for payload, size in zip(payloads, sizes):
+            U.write_base_packet(buffer, offset, payload, self.cipher_block_size)
+            offsets.append(offset)
+            offset += size + mac_length
+
+        packets = [view[o:o+size] for o, size in zip(offsets, sizes)]
+        if mac_length:
+            for o, size, mac in zip(offsets, sizes, self.mac.compute_batch(self.sequence_number, packets)):
+                view[o+size:o+size+mac_length] = mac
+        for packet in packets:
+            self.cipher.process(packet)
+
+        self.sequence_number = (self.sequence_number + len(payloads)) & 0xFFFFFFFF
+        return buffer
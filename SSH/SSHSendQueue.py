@@ -0,0 +1,224 @@
+import os
+import time
+import heapq
+import socket
+import itertools
+import threading
+import collections
+
+
+class SSH_Send_Queue():
+    """
+    Description:
+        Outgoing queue of a blocking socket. Packets are queued and written together with `socket.sendmsg`
+        (scatter-gather), so a burst of small packets costs one system call instead of one per packet.
+
+        Queued packets are written when:
+            - `flush_threshold` bytes are queued. This write doesn't block: whatever the socket doesn't take stays
+              queued.
+            - the oldest queued packet has waited `flush_deadline` seconds. A background thread does it, so a
+              last small packet doesn't wait for more to come. This write doesn't block either: what the socket
+              doesn't take is retried after another `flush_deadline`.
+            - `flush` is called (e.g. before waiting for a reply).
+
+        When `high_watermark` bytes are queued, producers block in `put` until the queue is written down to
+        `low_watermark` bytes.
+
+        Partial writes are handled: fully written buffers are dropped and the rest of a partly written one stays
+        at the front of the queue as a memoryview slice.
+
+        One background thread flushes every queue of the process: queues arm their deadline on its heap when a
+        packet is queued into an empty queue. It exits after `FLUSHER_IDLE_TIMEOUT` seconds without deadlines
+        and is started again by the next one, so connections don't keep a thread each. It never waits for a
+        queue's lock: a queue whose producer is blocked on its socket is retried after another `flush_deadline`.
+    """
+
+    __slots__ = ("connection", "flush_threshold", "flush_deadline", "high_watermark", "low_watermark", "buffers",
+                 "queued_bytes", "oldest", "condition", "closed", "error", "syscalls", "packets")
+
+    FLUSH_THRESHOLD = 16 * 1024
+    FLUSH_DEADLINE = 0.001
+    HIGH_WATERMARK = 1024 * 1024
+    LOW_WATERMARK = 256 * 1024
+    FLUSHER_IDLE_TIMEOUT = 1.0
+    try:
+        IOV_MAX = os.sysconf("SC_IOV_MAX")
+    except (AttributeError, ValueError, OSError):
+        IOV_MAX = 1024
+
+    # Shared flusher: heap of (deadline, sequence number, queue), the sequence number breaks ties
+    deadlines = []
+    sequence = itertools.count()
+    flusher = None
+    flusher_condition = threading.Condition()
+
+    def reset():
+        """
+        Description:
+            Forgets the shared flusher. Called in child processes after a fork, where its thread doesn't exist.
+        """
+        SSH_Send_Queue.deadlines = []
+        SSH_Send_Queue.flusher = None
+        SSH_Send_Queue.flusher_condition = threading.Condition()
+
+    def __init__(self, connection:socket.socket, flush_threshold:int=FLUSH_THRESHOLD, flush_deadline:float=FLUSH_DEADLINE,
+                 high_watermark:int=HIGH_WATERMARK, low_watermark:int=LOW_WATERMARK):
+        self.connection = connection
+        self.flush_threshold = flush_threshold
+        self.flush_deadline = flush_deadline
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+
+        self.buffers = collections.deque()
+        self.queued_bytes = 0
+        self.oldest = None  # When the oldest queued packet was queued
+        self.condition = threading.Condition()
+        self.closed = False
+        self.error = None   # Error of a background write, raised to the producer
+        self.syscalls = 0
+        self.packets = 0
+
+    def put(self, packet):
+        """
+        Description:
+            Queues an encoded packet. Blocks while the queue is over the high watermark.
+        """
+        with self.condition:
+            self.__check()
+            self.buffers.append(memoryview(packet))
+            self.queued_bytes += len(packet)
+            self.packets += 1
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+                if self.flush_deadline is not None:
+                    SSH_Send_Queue.__arm(self.oldest + self.flush_deadline, self)
+
+            if self.queued_bytes >= self.high_watermark:
+                self.__write(self.low_watermark, block=True)
+            elif self.queued_bytes >= self.flush_threshold:
+                self.__write(0, block=False)
+
+    def flush(self):
+        """
+        Description:
+            Writes everything queued, blocking until the socket took it.
+        """
+        with self.condition:
+            self.__check()
+            self.__write(0, block=True)
+
+    def close(self):
+        """
+        Description:
+            Writes everything queued. The background flusher skips the queue from then on. The socket stays open.
+        """
+        with self.condition:
+            if self.closed:
+                return
+            try:
+                self.__check()
+                self.__write(0, block=True)
+            finally:
+                self.closed = True
+
+
+    """ Private Methods """
+    def __check(self):
+        if self.error is not None:
+            raise self.error
+        if self.closed:
+            raise ConnectionError("Send queue is closed")
+
+    def __write(self, target:int, block:bool):
+        """
+        Description:
+            Writes queued buffers until at most `target` bytes remain queued. Must hold `self.condition`.
+            Without `block`, stops as soon as the socket would block.
+        """
+        flags = 0 if block else getattr(socket, "MSG_DONTWAIT", 0)
+        while self.queued_bytes > target:
+            buffers = [self.buffers[i] for i in range(min(len(self.buffers), SSH_Send_Queue.IOV_MAX))]
+            try:
+                sent = self.connection.sendmsg(buffers, [], flags)
+            except (BlockingIOError, InterruptedError):
+                if block:
+                    continue
+                return
+            self.syscalls += 1
+            self.__consume(sent)
+        if not self.buffers:
+            self.oldest = None
+
+    def __consume(self, sent:int):
+        self.queued_bytes -= sent
+        while sent:
+            first = self.buffers[0]
+            if sent >= len(first):
+                sent -= len(first)
+                self.buffers.popleft()
+            else:
+                self.buffers[0] = first[sent:]
+                sent = 0
+
+    def __flush_due(self):
+        """
+        Description:
+            Called by the flusher once the queue's deadline passed. Writes what the socket takes without blocking.
+
+        Returns:
+            The next deadline if bytes are still queued, None otherwise.
+        """
+        # Producers hold the lock while blocked on the socket (over the high watermark, `flush`, `close`): waiting
+        # for it would stall every other queue behind one peer that doesn't read, so try again later instead
+        if not self.condition.acquire(blocking=False):
+            return time.monotonic() + self.flush_deadline
+        try:
+            # Flushed since the deadline was armed: a packet queued after that armed its own
+            if self.closed or self.oldest is None or self.oldest + self.flush_deadline > time.monotonic():
+                return None
+            try:
+                self.__write(0, block=False)
+            except OSError as e:
+                self.error = e
+                self.buffers.clear()
+                self.queued_bytes = 0
+                self.oldest = None
+                return None
+            return time.monotonic() + self.flush_deadline if self.oldest is not None else None
+        finally:
+            self.condition.release()
+
+
+    """ Shared Flusher """
+    def __arm(deadline:float, queue):
+        with SSH_Send_Queue.flusher_condition:
+            heapq.heappush(SSH_Send_Queue.deadlines, (deadline, next(SSH_Send_Queue.sequence), queue))
+            if SSH_Send_Queue.flusher is None:
+                SSH_Send_Queue.flusher = threading.Thread(target=SSH_Send_Queue.__flush_loop, daemon=True)
+                SSH_Send_Queue.flusher.start()
+            elif SSH_Send_Queue.deadlines[0][2] is queue:
+                SSH_Send_Queue.flusher_condition.notify()
+
+    def __flush_loop():
+        condition = SSH_Send_Queue.flusher_condition
+        deadlines = SSH_Send_Queue.deadlines
+        while True:
+            with condition:
+                if not deadlines:
+                    if not condition.wait(SSH_Send_Queue.FLUSHER_IDLE_TIMEOUT) and not deadlines:
+                        SSH_Send_Queue.flusher = None
+                        return
+                    continue
+                remaining = deadlines[0][0] - time.monotonic()
+                if remaining > 0:
+                    condition.wait(remaining)
+                    continue
+                _, _, queue = heapq.heappop(deadlines)
+            # Without the flusher's lock: producers take it while holding their queue's
+            deadline = queue.__flush_due()
+            if deadline is not None:
+                SSH_Send_Queue.__arm(deadline, queue)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=SSH_Send_Queue.reset)
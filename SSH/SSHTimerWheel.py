@@ -0,0 +1,202 @@
+import os
+import sys
+import math
+import time
+import weakref
+import threading
+
+
+class SSH_Timer():
+    """
+    Description:
+        Timer armed on a `SSH_Timer_Wheel`. `tick` is None once it fired or was cancelled.
+    """
+
+    __slots__ = ("wheel", "tick", "callback")
+
+    def __init__(self, wheel, tick:int, callback):
+        self.wheel = wheel
+        self.tick = tick
+        self.callback = callback
+
+    def cancel(self):
+        """
+        Returns:
+            True if the timer was cancelled, False if it had already fired (or been cancelled).
+        """
+        return self.wheel.cancel(self)
+
+
+class SSH_Timer_Wheel():
+    """
+    Description:
+        Hashed timer wheel shared by many connections: `slots` sets, one for every `tick` seconds of a revolution.
+        A timer due at tick `t` goes in set `t % slots`, so arming and cancelling one is a set insertion or removal
+        whatever the number of timers, instead of a heap operation or a thread per connection. Every tick the
+        wheel looks at the next set and fires its timers that are due; the ones due a revolution or more later
+        stay for a later pass.
+
+        Timers never fire early and fire up to one tick late, so timeouts are only as precise as `tick`.
+
+        A wheel is driven by either:
+            - a background thread (`shared`, for the blocking transports). Callbacks run in that thread.
+            - its event loop (`of_loop`, for the asyncio transports): one `call_later` every tick. Callbacks run
+              on the loop, and timers must be armed and cancelled from it.
+
+        The driver only runs while timers are armed.
+    """
+
+    TICK = 0.1
+    SLOTS = 512
+
+    shared_wheel = None
+    loop_wheels = weakref.WeakKeyDictionary()   # Event loop -> its wheel
+    lock = threading.Lock()
+
+    def shared():
+        """
+        Returns:
+            The process-wide wheel driven by a background thread.
+        """
+        with SSH_Timer_Wheel.lock:
+            if SSH_Timer_Wheel.shared_wheel is None:
+                SSH_Timer_Wheel.shared_wheel = SSH_Timer_Wheel()
+            return SSH_Timer_Wheel.shared_wheel
+
+    def of_loop(loop):
+        """
+        Returns:
+            The wheel driven by event loop `loop`.
+        """
+        wheel = SSH_Timer_Wheel.loop_wheels.get(loop)
+        if wheel is None:
+            wheel = SSH_Timer_Wheel.loop_wheels[loop] = SSH_Timer_Wheel(loop)
+        return wheel
+
+    def reset():
+        """
+        Description:
+            Forgets the shared wheel. Called in child processes after a fork, where its thread doesn't exist.
+        """
+        SSH_Timer_Wheel.shared_wheel = None
+        SSH_Timer_Wheel.lock = threading.Lock()
+
+    def __init__(self, loop=None, tick:float=TICK, slots:int=SLOTS):
+        """
+        Parameters:
+            `loop`: event loop driving the wheel. None drives it with a thread.
+        """
+        # Weak, so a closed loop can be collected along with its entry in `loop_wheels`
+        self.loop = weakref.ref(loop) if loop is not None else None
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.current = math.floor(time.monotonic() / tick)    # Last tick looked at
+        self.timers = 0
+        self.driver = None  # Thread or `asyncio.TimerHandle` ticking the wheel, None while no timer is armed
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.timers
+
+
+    """ API Methods """
+    def schedule(self, delay:float, callback):
+        """
+        Description:
+            Arms a timer calling `callback()` in `delay` seconds.
+
+        Returns:
+            The `SSH_Timer`.
+        """
+        with self.lock:
+            tick = max(math.ceil((time.monotonic() + delay) / self.tick), self.current + 1)
+            timer = SSH_Timer(self, tick, callback)
+            self.slots[tick % len(self.slots)].add(timer)
+            self.timers += 1
+            if self.driver is None:
+                self.__start_driver()
+        return timer
+
+    def cancel(self, timer:SSH_Timer):
+        """
+        Returns:
+            True if the timer was cancelled, False if it had already fired (or been cancelled).
+        """
+        with self.lock:
+            if timer.tick is None:
+                return False
+            self.slots[timer.tick % len(self.slots)].discard(timer)
+            timer.tick = None
+            self.timers -= 1
+            return True
+
+    def advance(self):
+        """
+        Description:
+            Takes the timers due by now off the wheel. Called by the driver every tick.
+
+        Returns:
+            The callbacks of the timers due, for the caller to call.
+        """
+        now = math.floor(time.monotonic() / self.tick)
+        due = []
+        with self.lock:
+            n = len(self.slots)
+            # After a stall of more than a revolution every set is looked at once
+            for tick in range(max(self.current + 1, now - n + 1), now + 1):
+                slot = self.slots[tick % n]
+                if not slot:
+                    continue
+                fired = [timer for timer in slot if timer.tick <= now]
+                for timer in fired:
+                    slot.remove(timer)
+                    timer.tick = None
+                    due.append(timer.callback)
+            self.timers -= len(due)
+            self.current = max(self.current, now)
+        return due
+
+
+    """ Drivers """
+    def __start_driver(self):
+        if self.loop is None:
+            self.driver = threading.Thread(target=self.__run_thread, daemon=True)
+            self.driver.start()
+        else:
+            self.driver = self.loop().call_later(self.tick, self.__run_loop)
+
+    def __stop_driver(self):
+        """
+        Returns:
+            True if no timer is armed anymore and the driver must stop.
+        """
+        with self.lock:
+            if self.timers == 0:
+                self.driver = None
+                return True
+            return False
+
+    def __run_thread(self):
+        while True:
+            time.sleep(self.tick)
+            for callback in self.advance():
+                try:
+                    callback()
+                except Exception:
+                    sys.excepthook(*sys.exc_info())
+            if self.__stop_driver():
+                return
+
+    def __run_loop(self):
+        loop = self.loop()
+        for callback in self.advance():
+            try:
+                callback()
+            except Exception as e:
+                loop.call_exception_handler({"message" : "Timer callback failed", "exception" : e})
+        if not self.__stop_driver():
+            self.driver = loop.call_later(self.tick, self.__run_loop)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=SSH_Timer_Wheel.reset)
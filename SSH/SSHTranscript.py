@@ -0,0 +1,292 @@
+import os
+import mmap
+import time
+import socket
+import struct
+import threading
+import itertools
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+from utils import Logs
+
+
+class SSH_Transcript():
+    """
+    Description:
+        Process-wide switch of transcript recording. While enabled every new connection (of both transports)
+        records the raw bytes it recieves and sends, exactly as they cross the socket, to its own file in
+        `directory`. While disabled (the default) transports get no writer and only check `transcript is not None`.
+
+        File format (big endian), append-only:
+            header:  8 bytes magic "SSHTRNS1", 1 byte role (1 if the recording side is the server), 8 bytes
+                     float wall-clock time of the start of the recording
+            records: 1 byte direction (`INBOUND` or `OUTBOUND`), 8 bytes microseconds since the start,
+                     4 bytes length, then the bytes themselves
+
+        A record is one read or one write of the connection, so the files also keep how the stream was split.
+        Everything after SSH_MSG_NEWKEYS is encrypted, so only the handshake can be parsed again (see
+        `SSH_Transcript_Replay`).
+    """
+
+    MAGIC = b"SSHTRNS1"
+    HEADER = struct.Struct(">8sBd")
+    RECORD = struct.Struct(">BQI")
+    INBOUND = 0
+    OUTBOUND = 1
+    EXTENSION = ".sshtr"
+
+    directory = None
+    counter = itertools.count()
+
+    def enable(directory:str):
+        os.makedirs(directory, exist_ok=True)
+        SSH_Transcript.directory = directory
+
+    def disable():
+        SSH_Transcript.directory = None
+
+    def recorder(server_role:bool):
+        """
+        Returns:
+            A new `SSH_Transcript_Writer` in the recording directory, or None if recording is disabled.
+        """
+        directory = SSH_Transcript.directory
+        if directory is None:
+            return None
+        name = f"{time.time_ns()}-{os.getpid()}-{next(SSH_Transcript.counter)}-{'server' if server_role else 'client'}{SSH_Transcript.EXTENSION}"
+        return SSH_Transcript_Writer(os.path.join(directory, name), server_role)
+
+    def files(directory:str):
+        """
+        Returns:
+            The paths of the transcripts in `directory`, oldest first.
+        """
+        names = sorted(name for name in os.listdir(directory) if name.endswith(SSH_Transcript.EXTENSION))
+        return [os.path.join(directory, name) for name in names]
+
+
+class SSH_Transcript_Writer():
+    """
+    Description:
+        Appends the records of one connection to its transcript file. Writes are buffered, so recording costs
+        no system call per packet.
+    """
+
+    __slots__ = ("path", "file", "start", "lock")
+
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, path:str, server_role:bool):
+        self.path = path
+        self.file = open(path, "ab", buffering=SSH_Transcript_Writer.BUFFER_SIZE)
+        self.file.write(SSH_Transcript.HEADER.pack(SSH_Transcript.MAGIC, server_role, time.time()))
+        self.start = time.monotonic_ns()
+        # The send queue's flusher thread and the connection's thread can't interleave records, but the
+        # blocking transport's `send` and `recieve` may be called from different threads
+        self.lock = threading.Lock()
+
+    def inbound(self, data):
+        self.__write(SSH_Transcript.INBOUND, data)
+
+    def outbound(self, data):
+        self.__write(SSH_Transcript.OUTBOUND, data)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __write(self, direction:int, data):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(SSH_Transcript.RECORD.pack(direction, (time.monotonic_ns() - self.start) // 1000, len(data)))
+            self.file.write(data)
+
+
+class SSH_Transcript_Reader():
+    """
+    Description:
+        Reads a transcript through `mmap`: records are returned as memoryviews of the mapping, so reading a
+        transcript copies nothing and only touches the pages used.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < SSH_Transcript.HEADER.size:
+                Logs.error(msg="Not a transcript!", additional=f"File: {path}")
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, server_role, self.start_time = SSH_Transcript.HEADER.unpack_from(self.mmap)
+        if magic != SSH_Transcript.MAGIC:
+            self.close()
+            Logs.error(msg="Not a transcript!", additional=f"File: {path}")
+        self.server_role = bool(server_role)
+
+    def records(self):
+        """
+        Description:
+            Yields a tuple (direction, microseconds since the start, data) for every record. A last record cut
+            short (the process died while writing it) is skipped.
+        """
+        RECORD = SSH_Transcript.RECORD
+        offset, size = SSH_Transcript.HEADER.size, len(self.view)
+        while offset + RECORD.size <= size:
+            direction, microseconds, length = RECORD.unpack_from(self.mmap, offset)
+            offset += RECORD.size
+            if offset + length > size:
+                return
+            yield direction, microseconds, self.view[offset:offset+length]
+            offset += length
+
+    def client_direction(self):
+        """
+        Returns:
+            The direction of the records with the client's bytes.
+        """
+        return SSH_Transcript.INBOUND if self.server_role else SSH_Transcript.OUTBOUND
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_details):
+        self.close()
+
+
+class SSH_Transcript_Replay():
+    """
+    Description:
+        Replays recorded traffic without live peers:
+            - `parse` feeds a side's stream through the ID string reader and check, the packet decoder and the
+              KEXINIT parser (`bytes_to_name_lists`), as fast as they go.
+            - `through_socketpair` plays the client's bytes to a `SSH_Transport_Layer_Protocol` server over a local
+              socketpair, exercising the whole stack.
+
+        Both stop at SSH_MSG_NEWKEYS: the bytes after it are encrypted with keys of the recorded session.
+    """
+
+    def parse(reader:SSH_Transcript_Reader, direction:int):
+        """
+        Description:
+            Decodes the handshake of the stream of `direction` in the same chunks it was recorded in.
+
+        Returns:
+            A dictionary with the "id_str", whether it's valid ("valid_id_str"), the parsed KEXINIT "name_lists"
+            (or None), the "packets" decoded, the "bytes" parsed and the "handshake_length": bytes up to and
+            including SSH_MSG_NEWKEYS (None if the recording stops before it).
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        decoder = SSH_Packet_Decoder()
+        id_reader = SSH_ID_String_Reader()
+        result = {"id_str" : None, "valid_id_str" : False, "name_lists" : None, "packets" : 0, "bytes" : 0, "handshake_length" : None}
+        fed = 0
+        for record_direction, _, data in reader.records():
+            if record_direction != direction:
+                continue
+            offset = 0
+            while offset < len(data):
+                # Records of sent data can be larger than the decoder's free space
+                free = decoder.writable()
+                n = min(len(free), len(data) - offset)
+                free[:n] = data[offset:offset+n]
+                decoder.advance(n)
+                offset += n
+                fed += n
+
+                if result["id_str"] is None:
+                    if id_reader.read_from(decoder) is None:
+                        continue
+                    result["id_str"] = id_reader.id_str
+                    result["valid_id_str"] = U.check_identification_str(id_reader.id_str)
+
+                for payload in decoder.packets():
+                    result["packets"] += 1
+                    if payload[0] == U.MSG_CODE["SSH_MSG_KEXINIT"]:
+                        _, result["name_lists"], _ = U.parse_kex_packet(payload)
+                    elif payload[0] == U.MSG_CODE["SSH_MSG_NEWKEYS"]:
+                        result["handshake_length"] = result["bytes"] = fed - decoder.pending()
+                        return result
+        result["bytes"] = fed
+        return result
+
+    def parse_files(paths:list, repeat:int=1):
+        """
+        Description:
+            Parses both streams of every transcript in `paths`, `repeat` times.
+
+        Returns:
+            A dictionary with the "transcripts" and "bytes" parsed, the "seconds" it took, "bytes_per_sec",
+            "handshakes_per_sec" (both sides of a handshake counted as one) and the number of "invalid" streams
+            (invalid ID string or no KEXINIT).
+        """
+        readers = [SSH_Transcript_Reader(path) for path in paths]
+        parsed = invalid = 0
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for reader in readers:
+                    for direction in (SSH_Transcript.INBOUND, SSH_Transcript.OUTBOUND):
+                        result = SSH_Transcript_Replay.parse(reader, direction)
+                        parsed += result["bytes"]
+                        if not result["valid_id_str"] or result["name_lists"] is None:
+                            invalid += 1
+            seconds = time.perf_counter() - start
+        finally:
+            for reader in readers:
+                reader.close()
+        transcripts = len(readers) * repeat
+        return {"transcripts" : transcripts, "bytes" : parsed, "seconds" : seconds, "invalid" : invalid,
+                "bytes_per_sec" : parsed / seconds if seconds else 0.0,
+                "handshakes_per_sec" : transcripts / seconds if seconds else 0.0}
+
+    def through_socketpair(reader:SSH_Transcript_Reader, config:dict={}):
+        """
+        Description:
+            Sends the recorded client's handshake bytes, chunked as recorded, to a new server transport over a
+            socketpair and runs the server's handshake. The server must accept the algorithms the client offered.
+
+        Returns:
+            The server transport after its handshake (already closed).
+        """
+        # Imported here: the transport imports this module to record
+        from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+
+        direction = reader.client_direction()
+        length = SSH_Transcript_Replay.parse(reader, direction)["handshake_length"]
+        if length is None:
+            Logs.error(msg="Transcript has no complete handshake!", additional=f"File: {reader.path}")
+
+        server_socket, client_socket = socket.socketpair()
+        def play():
+            # Sent from a thread: the server only reads once it has written its own ID string and KEXINIT
+            remaining = length
+            try:
+                for record_direction, _, data in reader.records():
+                    if record_direction != direction:
+                        continue
+                    chunk = data[:remaining]
+                    client_socket.sendall(chunk)
+                    remaining -= len(chunk)
+                    if remaining == 0:
+                        break
+                # Read what the server sends until it closes, so it never blocks writing
+                while client_socket.recv(65536):
+                    pass
+            except OSError:
+                pass
+            finally:
+                client_socket.close()
+        player = threading.Thread(target=play)
+        player.start()
+        try:
+            with SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=config) as server:
+                pass
+        finally:
+            player.join()
+        return server
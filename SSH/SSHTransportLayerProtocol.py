@@ -1,12 +1,60 @@
 import socket
+import weakref
+import threading
+import collections.abc
 from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+from SSH.SSHAlgorithmNegotiation import SSH_Algorithm_Negotiation
+from SSH.SSHKeyExchange import SSH_Key_Exchange
+from SSH.SSHCipher import SSH_Cipher
+from SSH.SSHHostKey import SSH_Host_Key
+from SSH.SSHInstrumentation import SSH_Instrumentation
+from SSH.SSHSendQueue import SSH_Send_Queue
+from SSH.SSHTranscript import SSH_Transcript
+from SSH.SSHTimerWheel import SSH_Timer_Wheel
 from utils import Logs
 
 
 class SSH_Transport_Layer_Protocol():
+    """
+    Description:
+        Blocking transport, one connection per object, used as a context manager (the handshake runs in
+        `__enter__`).
+
+        A client waits up to `CONNECT_TIMEOUT` seconds to connect, then up to its `socket_timeout` for every
+        blocking operation on the socket (None: `socket.getdefaulttimeout()`). The other side's ID string must arrive within
+        `VERSION_EXCHANGE_TIMEOUT` seconds and the rest of the handshake within `HANDSHAKE_TIMEOUT` seconds after
+        it. These are timers on the process-wide `SSH_Timer_Wheel`: when one expires the wheel's thread shuts the
+        socket down, which wakes the blocked handshake, and the handshake sends SSH_MSG_DISCONNECT and fails.
+        None disables a timeout.
+
+        Idle timeouts and keepalives only exist in `SSH_Async_Transport_Layer_Protocol`: here packets are only
+        encoded by the caller's thread, so nothing can be sent from the timer wheel's.
+
+        A client checks the server's host key with its `host_key_verifier`, called with the server's ip, port and
+        public host key blob (K_S) once the signature of the exchange hash is verified; `SSH_Host_Key.known_hosts`
+        makes one from a list of known keys. A key it rejects, like an invalid signature, fails the handshake with
+        SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE. Without a verifier any host key with a valid signature is accepted.
+
+        Keys are only re-exchanged when the other side starts it (RFC 4253 9): the SSH_MSG_KEXINIT is answered
+        and the exchange runs when it's read, inside `recieve`. This transport never starts one itself, so a
+        connection that only sends leaves the other side's exchange waiting until it reads again.
+    """
+
+    __slots__ = ("ip", "port", "server_role", "connection", "send_queue", "id_str", "others_id_str", "own_kexinit",
+                 "others_kexinit", "others_name_lists", "algorithms", "shared_secret", "exchange_hash", "session_id",
+                 "encoder", "decoder", "stats", "transcript", "config", "disconnect_reason", "timeout", "host_key_verifier",
+                 "socket_timeout")
     
     SSH_PROTOVERSION = "2.0"
 
+    # Seconds, None disables the timeout
+    CONNECT_TIMEOUT = 10.0
+    VERSION_EXCHANGE_TIMEOUT = 10.0
+    HANDSHAKE_TIMEOUT = 60.0
+
     # Valid keys for configuration dictionary
     VALID_CONFIGS = [
             "DEFAULT_KEX_ALGS",
@@ -22,13 +70,19 @@ class SSH_Transport_Layer_Protocol():
         ]
     
     # key exchange algorithms
-    DEFAULT_KEX_ALGS = [] #TODO: fill up
+    DEFAULT_KEX_ALGS = [
+        "diffie-hellman-group14-sha1",  # REQUIRED
+        "diffie-hellman-group1-sha1"    # REQUIRED
+    ]
     # 
-    SERVER_HOST_KEY_ALGS = [] #TODO: fill up
-    #
-    ENCRYP_CLIENT_TO_SERVER_ALGS = [] #TODO: fill up
+    SERVER_HOST_KEY_ALGS = [
+        "ssh-rsa",      # RECOMMENDED  sign   Raw RSA Key
+        "ssh-dss"       # REQUIRED     sign   Raw DSS Key
+    ]
+    # Every algorithm registered in `SSH_Cipher` when this module is loaded, in its order of preference
+    ENCRYP_CLIENT_TO_SERVER_ALGS = SSH_Cipher.algorithms()
     #
-    ENCRYP_SERVER_TO_CLIENT_ALGS = [] #TODO: fill up
+    ENCRYP_SERVER_TO_CLIENT_ALGS = SSH_Cipher.algorithms()
     #
     MAC_CLIENT_TO_SERVER_ALGS = [
         "hmac-sha1-96", # RECOMMENDED     first 96 bits of HMAC-SHA1
@@ -49,13 +103,15 @@ class SSH_Transport_Layer_Protocol():
     ]
     #
     COMPRSS_CLIENT_TO_SERVER_ALGS = [
-        "none",         # REQUIRED        no compression
-        "zlib"          # OPTIONAL        ZLIB (LZ77) compression
+        "none",             # REQUIRED        no compression
+        "zlib",             # OPTIONAL        ZLIB (LZ77) compression
+        "zlib@openssh.com"  # OPTIONAL        ZLIB, starting after user authentication
     ]
     #
     COMPRSS_SERVER_TO_CLIENT_ALGS = [
-        "none",         # REQUIRED        no compression
-        "zlib"          # OPTIONAL        ZLIB (LZ77) compression
+        "none",             # REQUIRED        no compression
+        "zlib",             # OPTIONAL        ZLIB (LZ77) compression
+        "zlib@openssh.com"  # OPTIONAL        ZLIB, starting after user authentication
     ]
     #
     LANGUAGES_CLIENT_TO_SERVER = [] #TODO: fill up
@@ -72,52 +128,97 @@ class SSH_Transport_Layer_Protocol():
     
     """ Constructors """
     def server(port:int, config:dict={}):
+        SSH_Host_Key.generate_signers(SSH_Config.intern(config)["SERVER_HOST_KEY_ALGS"])
         return SSH_Transport_Layer_Protocol(port=port, ip="localhost", server_role=True, config=config)
 
-    def client(port:int, ip:str, config:dict={}):
-        return SSH_Transport_Layer_Protocol(port=port, ip=ip, server_role=False, config=config)
+    def client(port:int, ip:str, config:dict={}, host_key_verifier=None, socket_timeout:float=None):
+        transport = SSH_Transport_Layer_Protocol(port=port, ip=ip, server_role=False, config=config, host_key_verifier=host_key_verifier)
+        transport.socket_timeout = socket_timeout
+        return transport
+
+    def from_socket(connection:socket.socket, server_role:bool, config:dict={}, host_key_verifier=None):
+        """
+        Description:
+            Runs the protocol over an already connected socket instead of opening one, e.g. an end of
+            `socket.socketpair()` in benchmarks and tests. The verifier is called with None as ip and port.
+        """
+        if server_role:
+            SSH_Host_Key.generate_signers(SSH_Config.intern(config)["SERVER_HOST_KEY_ALGS"])
+        transport = SSH_Transport_Layer_Protocol(port=None, ip=None, server_role=server_role, config=config, host_key_verifier=host_key_verifier)
+        transport.connection = connection
+        return transport
 
-    def __init__(self, ip:str, port:int, server_role:bool, config:dict):
+    def __init__(self, ip:str, port:int, server_role:bool, config:dict, host_key_verifier=None):
         self.ip = ip
         self.port = port
         self.server_role = server_role
         self.connection = None
+        self.send_queue = None
         self.id_str = None
+        self.others_id_str = None
+        self.own_kexinit = None
+        self.others_kexinit = None
+        self.others_name_lists = None
+        self.algorithms = None
+        self.shared_secret = None
+        self.exchange_hash = None
+        self.session_id = None
+        self.encoder = SSH_Packet_Encoder()
+        self.decoder = SSH_Packet_Decoder()
+        self.stats = SSH_Instrumentation.connection_stats(server_role)
+        self.transcript = SSH_Transcript.recorder(server_role)
+        self.disconnect_reason = None   # (reason, description) of the other side's SSH_MSG_DISCONNECT
+        self.timeout = None             # (reason, description) of the handshake timeout that expired
+        self.host_key_verifier = host_key_verifier
+        self.socket_timeout = None
 
-        self.__set_up_config(config)
-    
+        # Shared with every connection configured the same way
+        self.config = SSH_Config.intern(config)
 
-    """ Configuration """
-    def __set_up_config(self, config:dict):
-        self.config = {
-            "DEFAULT_KEX_ALGS" : SSH_Transport_Layer_Protocol.DEFAULT_KEX_ALGS,
-            "SERVER_HOST_KEY_ALGS" : SSH_Transport_Layer_Protocol.SERVER_HOST_KEY_ALGS,
-            "ENCRYP_CLIENT_TO_SERVER_ALGS" : SSH_Transport_Layer_Protocol.ENCRYP_CLIENT_TO_SERVER_ALGS,
-            "ENCRYP_SERVER_TO_CLIENT_ALGS" : SSH_Transport_Layer_Protocol.ENCRYP_SERVER_TO_CLIENT_ALGS,
-            "MAC_CLIENT_TO_SERVER_ALGS" : SSH_Transport_Layer_Protocol.MAC_CLIENT_TO_SERVER_ALGS,
-            "MAC_SERVER_TO_CLIENT_ALGS" : SSH_Transport_Layer_Protocol.MAC_SERVER_TO_CLIENT_ALGS,
-            "COMPRSS_CLIENT_TO_SERVER_ALGS" : SSH_Transport_Layer_Protocol.COMPRSS_CLIENT_TO_SERVER_ALGS,
-            "COMPRSS_SERVER_TO_CLIENT_ALGS" : SSH_Transport_Layer_Protocol.COMPRSS_SERVER_TO_CLIENT_ALGS,
-            "LANGUAGES_CLIENT_TO_SERVER" : SSH_Transport_Layer_Protocol.LANGUAGES_CLIENT_TO_SERVER,
-            "LANGUAGES_SERVER_TO_CLIENT" : SSH_Transport_Layer_Protocol.LANGUAGES_SERVER_TO_CLIENT
-        }
-
-        for k,v in config.items():
-            if k in SSH_Transport_Layer_Protocol.VALID_CONFIGS:
-                self.config = v 
-    
 
     """ With Methods """
     # Notes about whith methods:
     #     1. If an error occurs in `__enter__`, `__exit__` is not called.
     def __enter__(self):
-        self.__connect_socket()
-        self.__protocol_verion_exchange(sw_version="None", comments="None")
-        self.__algorithm_negotiation()
-        self.__key_exchange()
+        # A timer that can't be cancelled anymore has expired (or is expiring), whatever the handshake got to
+        timer = timeout = None
+        try:
+            self.__phase("connect")
+            self.__connect_socket()
+            self.send_queue = SSH_Send_Queue(self.connection)
+            self.__phase("version_exchange")
+            timeout = ("SSH_DISCONNECT_PROTOCOL_ERROR", "Timed out waiting for the identification string")
+            timer = self.__arm_timeout(SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT)
+            self.__protocol_verion_exchange(sw_version="None", comments="None")
+            if timer is None or timer.cancel():
+                timeout = ("SSH_DISCONNECT_KEY_EXCHANGE_FAILED", "Timed out waiting for the key exchange")
+                timer = self.__arm_timeout(SSH_Transport_Layer_Protocol.HANDSHAKE_TIMEOUT)
+            self.__phase("algorithm_negotiation")
+            self.__algorithm_negotiation()
+            self.__phase("key_exchange")
+            self.__key_exchange()
+            if timer is not None and not timer.cancel():
+                Logs.error(msg="Handshake timed out!")
+            # Nothing is held between packets, idle connections don't keep a recieve buffer
+            self.decoder.release()
+        except:
+            self.__phase("failed")
+            if timer is not None and not timer.cancel():
+                self.timeout = timeout
+                self.__disconnect_on_timeout()
+            raise
+        self.__phase("established")
+        return self
     
     def __exit__(self, *exc_details):
-        self.connection.close()
+        try:
+            if self.send_queue is not None:
+                self.send_queue.close()
+        finally:
+            self.connection.close()
+            self.decoder.release()
+            if self.transcript is not None:
+                self.transcript.close()
 
 
     """ Connection """
@@ -131,6 +232,8 @@ class SSH_Transport_Layer_Protocol():
 
             Returns: Nothing
         """
+        if self.connection is not None: # Connected socket given to `from_socket`
+            return
         if self.server_role: # It's role is a server's role
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.bind(("localhost", self.port))
@@ -138,7 +241,9 @@ class SSH_Transport_Layer_Protocol():
                 self.connection, _ = s.accept()
         else: # It's a client
             self.connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.connection.settimeout(SSH_Transport_Layer_Protocol.CONNECT_TIMEOUT)
             self.connection.connect((self.ip, self.port))
+            self.connection.settimeout(self.socket_timeout if self.socket_timeout is not None else socket.getdefaulttimeout())
 
     # 2nd Step: Change ID strings
     def __protocol_verion_exchange(self, sw_version:str, comments:str):
@@ -152,58 +257,222 @@ class SSH_Transport_Layer_Protocol():
             
             Returns: Nothing
         """
-        if self.server_role: # It's role is of a server
-            others_id_str = self.connection.recv(SSH_Transport_Layer_Protocol_Utils.MAX_CHAR_LEN_ID_STRING*2).decode()
+        self.id_str = SSH_Transport_Layer_Protocol_Utils.create_id_str(SSH_Transport_Layer_Protocol.SSH_PROTOVERSION, sw_version, comments=comments)
 
-            self.id_str = SSH_Transport_Layer_Protocol_Utils.create_id_str(SSH_Transport_Layer_Protocol.SSH_PROTOVERSION, sw_version, comments=comments)
-            self.connection.send(self.id_str.encode())
-        else: # It's a client
-            self.id_str = SSH_Transport_Layer_Protocol_Utils.create_id_str(SSH_Transport_Layer_Protocol.SSH_PROTOVERSION, sw_version, comments=comments)
+        # RFC 4253 allows sending the first KEXINIT right after the ID string without waiting for the other side's,
+        # so both go out in a single write and the handshake saves a round trip.
+        self.own_kexinit = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, self.config)
+        data = self.id_str.encode() + self.encoder.encode(self.own_kexinit)
+        self.__queue(data)
+        self.send_queue.flush()
+        if self.stats is not None:
+            self.stats.sent(self.own_kexinit, len(data))
 
-            self.connection.send(self.id_str.encode())
-            others_id_str = self.connection.recv(SSH_Transport_Layer_Protocol_Utils.MAX_CHAR_LEN_ID_STRING*2).decode()
-        
-        compatible, msg = self.__compare_id_strs(others_id_str)
+        # Anything recieved after the ID line stays in the decoder for the binary packet protocol.
+        # Only servers may send lines before their ID string (RFC 4253 4.2)
+        reader = SSH_ID_String_Reader(max_pre_id_lines=0 if self.server_role else SSH_ID_String_Reader.DEFAULT_MAX_PRE_ID_LINES)
+        while reader.read_from(self.decoder) is None:
+            self.__recv()
+        self.others_id_str = reader.id_str
+
+        compatible, msg = self.__compare_id_strs(self.others_id_str)
 
         if not compatible:
-            Logs.error(msg=msg, additional=f"Own ID string: {repr(self.id_str)}\n\tOther's ID string: {repr(others_id_str)}")
+            Logs.error(msg=msg, additional=f"Own ID string: {repr(self.id_str)}\n\tOther's ID string: {repr(self.others_id_str)}", reason="SSH_DISCONNECT_PROTOCOL_VERSION_NOT_SUPPORTED")
 
     # 3rd Step: Algorithm Negotiation
-    def __algorithm_negotiation(self):
+    def __algorithm_negotiation(self, others_kexinit=None):
         """
             Description:
-                Recieves configuration preferences and chooses them for communication.
+                Recieves the other side's configuration preferences and chooses the algorithms for communication.
+                The result is stored in `self.algorithms`, keyed like the configuration dictionary.
+
+            Parameters:
+                `others_kexinit`: the other side's SSH_MSG_KEXINIT if it was already read (key re-exchange).
         """
+        # Own KEXINIT was already sent together with the ID string, or by `__rekey`
+        self.others_kexinit = bytes(others_kexinit if others_kexinit is not None else self.__read_packet())
+        _, self.others_name_lists, _ = SSH_Transport_Layer_Protocol_Utils.parse_kex_packet(self.others_kexinit)
+
+        own_name_lists = self.config.name_lists
         if self.server_role:
-            # Recieve
+            client_name_lists, server_name_lists = self.others_name_lists, own_name_lists
         else:
-            # Send
-            pass
+            client_name_lists, server_name_lists = own_name_lists, self.others_name_lists
+        chosen = SSH_Algorithm_Negotiation.negotiate(client_name_lists, server_name_lists)
+        self.algorithms = dict(zip(SSH_Transport_Layer_Protocol.VALID_CONFIGS, chosen))
      
     # 4th Step: Key exchange
     def __key_exchange(self):
-        pass
-        # if self.server_role: # It's a server
-        #     text = self.connection.recv(8**6).decode()
-        #     print(text)
-        # else:
-        #     algorithms = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(
-        #         False,
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"],
-        #         ["hello","world"]
-        #     )
-        #     self.connection.send()
-    
+        """
+            Description:
+                Diffie-Hellman key exchange, with H signed by the server's host key, followed by SSH_MSG_NEWKEYS. Sets `self.shared_secret`, `self.exchange_hash`
+                and `self.session_id`.
+        """
+        method = self.algorithms["DEFAULT_KEX_ALGS"]
+        if method is None: # Nothing to negotiate
+            return
+
+        host_key_algorithm = self.algorithms["SERVER_HOST_KEY_ALGS"]
+
+        if self.server_role: # It's a server
+            e = SSH_Key_Exchange.parse_kexdh_init(self.__read_packet())
+            y, f = SSH_Key_Exchange.get_keypair(method)
+            k = SSH_Key_Exchange.shared_secret(method, e, y)
+            signer = SSH_Host_Key.get_signer(host_key_algorithm) if host_key_algorithm is not None else None
+            k_s = signer.k_s if signer is not None else b""
+            h = SSH_Key_Exchange.exchange_hash(method, self.others_id_str, self.id_str, self.others_kexinit, self.own_kexinit, k_s, e, f, k)
+            signature = signer.sign(h) if signer is not None else b""
+            self.__send_packet(SSH_Key_Exchange.create_kexdh_reply(k_s, f, signature))
+        else: # It's a client
+            x, e = SSH_Key_Exchange.get_keypair(method)
+            self.__send_packet(SSH_Key_Exchange.create_kexdh_init(e))
+            k_s, f, signature = SSH_Key_Exchange.parse_kexdh_reply(self.__read_packet())
+            k = SSH_Key_Exchange.shared_secret(method, f, x)
+            h = SSH_Key_Exchange.exchange_hash(method, self.id_str, self.others_id_str, self.own_kexinit, self.others_kexinit, k_s, e, f, k)
+            if host_key_algorithm is not None:
+                if SSH_Transport_Layer_Protocol_Utils.read_string(k_s, 0)[0] != host_key_algorithm.encode() or not SSH_Host_Key.verify(k_s, h, signature):
+                    self.__reject_host_key("Server's host key signature is not valid!", host_key_algorithm)
+            if self.host_key_verifier is not None and not self.host_key_verifier(self.ip, self.port, bytes(k_s)):
+                self.__reject_host_key("Server's host key is not known!", host_key_algorithm)
+
+        self.shared_secret = k
+        self.exchange_hash = h
+        if self.session_id is None:
+            self.session_id = h
+        # Only needed for the exchange hash, don't keep them for the rest of the connection
+        self.own_kexinit = self.others_kexinit = self.others_name_lists = None
+
+        outgoing_keys, incoming_keys = SSH_Key_Exchange.derive_session_keys(method, k, h, self.session_id, self.algorithms, self.server_role)
+
+        # Each direction switches to the new keys at its own SSH_MSG_NEWKEYS
+        self.__send_packet(SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_NEWKEYS"].to_bytes(1))
+        self.encoder.set_keys(**outgoing_keys)
+        if bytes(self.__read_packet()) != SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_NEWKEYS"].to_bytes(1):
+            Logs.error(msg="Expected SSH_MSG_NEWKEYS!", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+        self.decoder.set_keys(**incoming_keys)
+
+
+    # Key re-exchange started by the other side
+    def __rekey(self, others_kexinit):
+        """
+            Description:
+                Answers the other side's SSH_MSG_KEXINIT with own one and runs the exchange. The other side sends
+                nothing but key exchange messages until its SSH_MSG_NEWKEYS (RFC 4253 7.1), so it runs right away.
+        """
+        self.own_kexinit = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, self.config)
+        self.__send_packet(self.own_kexinit)
+        self.__algorithm_negotiation(others_kexinit)
+        self.__key_exchange()
+
 
     """ Private Methods """
+    def __arm_timeout(self, seconds:float):
+        """
+        Description:
+            Arms a timer shutting the socket down, so a handshake waiting for the other side wakes up.
+
+        Returns:
+            The `SSH_Timer`, or None if the timeout is disabled.
+
+        Notes:
+            The handshake flushes what it sends before reading, so bytes still queued mean it's blocked writing to
+            a side that doesn't read: the socket is shut down for writing too, which also wakes that write. Otherwise
+            only for reading, so the SSH_MSG_DISCONNECT of the timeout can still be sent.
+        """
+        if seconds is None:
+            return None
+        connection = self.connection
+        send_queue = self.send_queue
+        def expire():
+            try:
+                connection.shutdown(socket.SHUT_RDWR if send_queue.queued_bytes else socket.SHUT_RD)
+            except OSError: # Already closed
+                pass
+        return SSH_Timer_Wheel.shared().schedule(seconds, expire)
+
+    def __disconnect_on_timeout(self):
+        """
+        Description:
+            Sends SSH_MSG_DISCONNECT with the reason of the expired timeout and closes the connection.
+        """
+        reason, description = self.timeout
+        try:
+            self.__send_packet(SSH_Transport_Layer_Protocol_Utils.create_disconnect_packet(reason, description))
+        except Exception:
+            pass
+        finally:
+            self.__exit__(None, None, None)
+        Logs.error(msg="Handshake timed out!", additional=f"Reason: {reason}\n\tDescription: {description}", reason=reason)
+
+    def __reject_host_key(self, msg:str, host_key_algorithm:str):
+        """
+        Description:
+            Sends SSH_MSG_DISCONNECT with SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE and fails the handshake.
+        """
+        try:
+            self.__send_packet(SSH_Transport_Layer_Protocol_Utils.create_disconnect_packet("SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE", msg))
+        except OSError: # The server may have closed already
+            pass
+        Logs.error(msg=msg, additional=f"Algorithm: {host_key_algorithm}", reason="SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE")
+
+    def __phase(self, name:str):
+        if self.stats is not None:
+            self.stats.phase(name)
+
+    def __send_packet(self, payload, flush:bool=True):
+        packet = self.encoder.encode(payload)
+        self.__queue(packet)
+        if flush:
+            self.send_queue.flush()
+        if self.stats is not None:
+            self.stats.sent(payload, len(packet))
+
+    def __queue(self, data):
+        self.send_queue.put(data)
+        if self.transcript is not None:
+            self.transcript.outbound(data)
+
+    def __recv(self):
+        n = self.decoder.recv_into(self.connection)
+        if n == 0:
+            Logs.error(msg="Connection closed by the other side!", reason="SSH_DISCONNECT_CONNECTION_LOST")
+        if self.stats is not None:
+            self.stats.received_bytes(n)
+        if self.transcript is not None:
+            self.transcript.inbound(self.decoder.view[self.decoder.end-n:self.decoder.end])
+
+    def __read_packet(self):
+        """
+        Description:
+            Reads until a whole packet is buffered.
+
+        Returns:
+            The packet's payload as a memoryview, valid until the next read.
+
+        Notes:
+            SSH_MSG_IGNORE is skipped. SSH_MSG_DISCONNECT raises an exception, its reason is kept in `self.disconnect_reason`.
+            Once the handshake is done, SSH_MSG_KEXINIT runs a key re-exchange before reading on (see `__rekey`).
+        """
+        while True:
+            payload = self.decoder.next_packet()
+            if payload is None:
+                self.__recv()
+                continue
+            if self.stats is not None:
+                self.stats.received(payload)
+            if not payload:
+                return payload
+            if payload[0] == SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_IGNORE"]:
+                continue
+            if payload[0] == SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_DISCONNECT"]:
+                self.disconnect_reason = SSH_Transport_Layer_Protocol_Utils.parse_disconnect_packet(payload)
+                Logs.error(msg="Disconnected by the other side!", additional=f"Reason: {self.disconnect_reason[0]}\n\tDescription: {self.disconnect_reason[1]}", reason=self.disconnect_reason[0])
+            if payload[0] == SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_KEXINIT"] and self.session_id is not None:
+                self.__rekey(bytes(payload))
+                continue
+            return payload
+
     def __compare_id_strs(self, other_id_str:str):
         """
         Description:
@@ -217,28 +486,141 @@ class SSH_Transport_Layer_Protocol():
         
         Notes:
             Any version that's not 2.0 will be rejected.
-        
-        TODO (1*): Handle comments and software-version
         """
-        if not SSH_Transport_Layer_Protocol_Utils.check_identification_str(other_id_str):
-            return False, "Other's side id string does not follow SSH's format! "
-        
-        l_self, l_other = self.id_str.split('-', maxsplit=2), other_id_str.split('-', maxsplit=2)
-        self_protoversion, others_protoversion = l_other[1], l_self[1]
-        if self_protoversion != others_protoversion:
-            return False, "Own and other's version of SSH protocol do not match!"
-        
-        if others_protoversion != SSH_Transport_Layer_Protocol.SSH_PROTOVERSION:
-            return False, f"Error: any protocol version other than {SSH_Transport_Layer_Protocol.SSH_PROTOVERSION} is not accepted!"
+        return SSH_Transport_Layer_Protocol_Utils.compare_id_strs(self.id_str, other_id_str, SSH_Transport_Layer_Protocol.SSH_PROTOVERSION)
+
+
+    """ API Methods """
+    def start_delayed_compression(self):
+        """
+        Description:
+            Starts `zlib@openssh.com` compression in both directions. Must be called once the user is authenticated.
+        """
+        self.encoder.compressor.activate()
+        self.decoder.decompressor.activate()
 
-        # 1*
+    def send(self, payload):
+        """
+        Description:
+            Sends `payload` in a binary packet. The packet is queued and written together with other queued ones
+            (see `SSH_Send_Queue`), so this only blocks when the send queue is over its high watermark.
+        """
+        self.__send_packet(payload, flush=False)
 
-        return True, ""
+    def send_batch(self, payloads:list):
+        """
+        Description:
+            Sends several payloads, encoded into one buffer.
+        """
+        batch = self.encoder.encode_batch(payloads)
+        self.__queue(batch)
+        if self.stats is not None:
+            for payload in payloads:
+                self.stats.sent(payload, 0)
+            self.stats.bytes_sent += len(batch)
 
+    def flush(self):
+        """
+        Description:
+            Writes every queued packet, blocking until the socket took them.
+        """
+        self.send_queue.flush()
 
-    """ API Methods """
-    def send():
-        pass
-    
-    def recieve():
-        pass
\ No newline at end of file
+    def is_alive(self):
+        """
+        Description:
+            Checks, without blocking, that the connection is still usable: the socket is open, no write failed and
+            nothing was recieved that wasn't read.
+
+        Notes:
+            Any unread byte makes the connection unusable, whatever it is: the other side closing it, a
+            SSH_MSG_DISCONNECT, or a packet no caller is waiting for.
+        """
+        if self.connection is None or self.connection.fileno() == -1:
+            return False
+        if self.send_queue is None or self.send_queue.error is not None or self.send_queue.closed:
+            return False
+        if self.decoder.pending():
+            return False
+        try:
+            self.connection.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except BlockingIOError: # Nothing to read: still open
+            return True
+        except OSError:
+            pass
+        return False
+
+    def recieve(self):
+        """
+        Description:
+            Writes any queued packets, since the other side may be waiting for them, and waits for the next packet.
+
+        Returns:
+            The packet's payload as bytes.
+        """
+        self.send_queue.flush()
+        payload = bytes(self.__read_packet())
+        self.decoder.release()
+        return payload
+
+    receive = recieve
+
+
+class SSH_Config(collections.abc.Mapping):
+    """
+    Description:
+        Immutable configuration: the ten name-lists of `SSH_Transport_Layer_Protocol.VALID_CONFIGS`, in KEXINIT
+        order, as tuples. Missing keys take the class defaults of `SSH_Transport_Layer_Protocol` and unknown keys
+        are ignored.
+
+        Configurations are interned: `intern` returns the same object for equal settings, so every connection
+        with the same settings shares one (instead of a dictionary each) and configurations can be compared and
+        hashed cheaply. Only configurations in use are kept: one is dropped with the last connection holding it.
+
+        It's a read only mapping, so it's used like the configuration dictionary it's made from.
+    """
+
+    __slots__ = ("name_lists", "hash", "__weakref__")
+
+    interned = weakref.WeakValueDictionary()    # Name-lists -> SSH_Config
+    lock = threading.Lock()
+
+    def intern(config:dict={}):
+        """
+        Returns:
+            The shared `SSH_Config` with the settings of the configuration dictionary `config`. An `SSH_Config`
+            is returned as is.
+        """
+        if isinstance(config, SSH_Config):
+            return config
+        T = SSH_Transport_Layer_Protocol
+        name_lists = tuple(tuple(config[k]) if k in config else tuple(getattr(T, k)) for k in T.VALID_CONFIGS)
+        interned = SSH_Config.interned.get(name_lists)
+        if interned is not None:
+            return interned
+        with SSH_Config.lock:
+            return SSH_Config.interned.setdefault(name_lists, SSH_Config(name_lists))
+
+    def __init__(self, name_lists:tuple):
+        object.__setattr__(self, "name_lists", name_lists)
+        object.__setattr__(self, "hash", hash(name_lists))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SSH_Config is immutable")
+
+    def __getitem__(self, key:str):
+        return self.name_lists[SSH_Config.INDEXES[key]]
+
+    def __iter__(self):
+        return iter(SSH_Transport_Layer_Protocol.VALID_CONFIGS)
+
+    def __len__(self):
+        return len(self.name_lists)
+
+    def __hash__(self):
+        return self.hash
+
+    def __repr__(self):
+        return f"SSH_Config({dict(self)})"
+
+SSH_Config.INDEXES = {k : i for i, k in enumerate(SSH_Transport_Layer_Protocol.VALID_CONFIGS)}
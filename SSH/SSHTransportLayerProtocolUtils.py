@@ -1,5 +1,8 @@
 import re
 import secrets
+import struct
+import functools
+from utils import Logs
 
 class SSH_Transport_Layer_Protocol_Utils():
 
@@ -8,12 +11,30 @@ class SSH_Transport_Layer_Protocol_Utils():
     #
     
     MAX_CHAR_LEN_ID_STRING = 255
+    # SSH-2.0-{softwareversion}[ SP {comments}] CR LF, compiled once. `SSH_Validator` compiles the same expression for bytes
+    ID_STR_REGEX = r"SSH-2\.0-[\x21-\x2C\x2E-\x7E]+(?: [\x20-\x7E]+)?\r\n"
+    ID_STR_PATTERN = re.compile(ID_STR_REGEX)
 
     #
     # KEY EXCHANGE RELATED VARIBLES
     #
 
     LENGTH_COOKIE = 16
+    # Number of compiled KEXINIT templates and parsed peer name-list sections kept in cache
+    KEXINIT_CACHE_SIZE = 128
+
+    #
+    # BINARY PACKET RELATED VARIABLES
+    #
+
+    PACKET_LENGTH_FIELD_LEN = 4
+    PADDING_LENGTH_FIELD_LEN = 1
+    PACKET_HEADER_LEN = PACKET_LENGTH_FIELD_LEN + PADDING_LENGTH_FIELD_LEN
+    MIN_PADDING_LEN = 4
+    MAX_PADDING_LEN = 255
+    MIN_BLOCK_SIZE = 8
+    MIN_PACKET_LEN = 16
+    MAX_PACKET_LEN = 35000      # RFC 4253 6.1: all implementations must handle packets of this size
 
     #
     # MESSAGE CODES
@@ -27,7 +48,29 @@ class SSH_Transport_Layer_Protocol_Utils():
         "SSH_MSG_SERVICE_REQUEST"   :   5,
         "SSH_MSG_SERVICE_ACCEPT"    :   6,
         "SSH_MSG_KEXINIT"           :   20,
-        "SSH_MSG_NEWKEYS"           :   21
+        "SSH_MSG_NEWKEYS"           :   21,
+        "SSH_MSG_KEXDH_INIT"        :   30,
+        "SSH_MSG_KEXDH_REPLY"       :   31,
+        "SSH_MSG_GLOBAL_REQUEST"            :   80,
+        "SSH_MSG_REQUEST_SUCCESS"           :   81,
+        "SSH_MSG_REQUEST_FAILURE"           :   82,
+        "SSH_MSG_CHANNEL_OPEN"              :   90,
+        "SSH_MSG_CHANNEL_OPEN_CONFIRMATION" :   91,
+        "SSH_MSG_CHANNEL_OPEN_FAILURE"      :   92,
+        "SSH_MSG_CHANNEL_WINDOW_ADJUST"     :   93,
+        "SSH_MSG_CHANNEL_DATA"              :   94,
+        "SSH_MSG_CHANNEL_EXTENDED_DATA"     :   95,
+        "SSH_MSG_CHANNEL_EOF"               :   96,
+        "SSH_MSG_CHANNEL_CLOSE"             :   97,
+        "SSH_MSG_CHANNEL_REQUEST"           :   98,
+        "SSH_MSG_CHANNEL_SUCCESS"           :   99,
+        "SSH_MSG_CHANNEL_FAILURE"           :   100
+    }
+    CHANNEL_OPEN_FAILURE_CODES = {
+        "SSH_OPEN_ADMINISTRATIVELY_PROHIBITED"  :   1,
+        "SSH_OPEN_CONNECT_FAILED"               :   2,
+        "SSH_OPEN_UNKNOWN_CHANNEL_TYPE"         :   3,
+        "SSH_OPEN_RESOURCE_SHORTAGE"            :   4
     }    
     DISCONNECT_MSG_CODES = {
         "SSH_DISCONNECT_HOST_NOT_ALLOWED_TO_CONNECT"    :   1,
@@ -46,6 +89,8 @@ class SSH_Transport_Layer_Protocol_Utils():
         "SSH_DISCONNECT_NO_MORE_AUTH_METHODS_AVAILABLE" :   14,
         "SSH_DISCONNECT_ILLEGAL_USER_NAME"              :   15
     }
+    # Reason code -> name
+    DISCONNECT_REASONS = {code : name for name, code in DISCONNECT_MSG_CODES.items()}
 
     #
     # Supported Algorithms
@@ -65,13 +110,12 @@ class SSH_Transport_Layer_Protocol_Utils():
     ]
     SUPPORTED_COMPRESSION_ALGORITHMS = [
         "zlib",             # OPTIONAL      ZLIB (LZ77) compression
+        "zlib@openssh.com", # OPTIONAL      ZLIB, starting after user authentication
         "none"              # REQUIRED      no compression
     ]
     SUPPORTED_PUBLIC_KEY_ALGORITHMS = [
-        "ssh-dss"           # REQUIRED     sign   Raw DSS Key
+        "ssh-dss",          # REQUIRED     sign   Raw DSS Key
         "ssh-rsa"           # RECOMMENDED  sign   Raw RSA Key
-        "pgp-sign-rsa"      # OPTIONAL     sign   OpenPGP certificates (RSA key)
-        "pgp-sign-dss"      # OPTIONAL     sign   OpenPGP certificates (DSS key)
     ]
 
     def create_id_str(protoversion:str, sw_version:str, comments:str=None):
@@ -123,9 +167,42 @@ class SSH_Transport_Layer_Protocol_Utils():
         Notes:
             I will not implement compatibility with SSH versions previous to 2.0. An identification string with version other than 2.0 will be rejected.
         """
-        pattern = fr'^SSH-2.0-[\x21-\x7E]+( [\x20-\x7E]+)?\r\n'
-        return len(id_str) > 255 or re.match(pattern, id_str) is not None
+        return (len(id_str) <= SSH_Transport_Layer_Protocol_Utils.MAX_CHAR_LEN_ID_STRING
+                and SSH_Transport_Layer_Protocol_Utils.ID_STR_PATTERN.fullmatch(id_str) is not None)
     
+    def compare_id_strs(own_id_str:str, other_id_str:str, protoversion:str):
+        """
+        Description:
+            Checks if a recieved id string and a sent one are compatible.
+
+        Parameters:
+            `own_id_str`: sent id string.
+            `other_id_str`: recieved id string.
+            `protoversion`: the only protocol version accepted.
+
+        Returns:
+            Returns a boolean value and a string. The boolean value will be true if the ID strings are compatible, false otherwise. The string will be empty if they are compatible or a short description of why they aren't.
+
+        Notes:
+            Any version that's not `protoversion` will be rejected.
+
+        TODO (1*): Handle comments and software-version
+        """
+        if not SSH_Transport_Layer_Protocol_Utils.check_identification_str(other_id_str):
+            return False, "Other's side id string does not follow SSH's format! "
+
+        l_self, l_other = own_id_str.split('-', maxsplit=2), other_id_str.split('-', maxsplit=2)
+        self_protoversion, others_protoversion = l_self[1], l_other[1]
+        if self_protoversion != others_protoversion:
+            return False, "Own and other's version of SSH protocol do not match!"
+
+        if others_protoversion != protoversion:
+            return False, f"Error: any protocol version other than {protoversion} is not accepted!"
+
+        # 1*
+
+        return True, ""
+
     def create_kex_packet(first_kex_packet_follows:bool, config:dict):
         """
         Description:
@@ -145,71 +222,253 @@ class SSH_Transport_Layer_Protocol_Utils():
                 boolean      first_kex_packet_follows
                 uint32       0 (reserved for future extension)
 
+        Parameters:
+            `first_kex_packet_follows`: whether a guessed key exchange packet follows.
+            `config`: dictionary with the ten name-lists, in the order they appear in the packet.
+
+        Returns:
+            The SSH_MSG_KEXINIT payload.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        template = U.compile_kex_packet(first_kex_packet_follows, config)
+        packet = bytearray(template)
+        packet[1:1+U.LENGTH_COOKIE] = secrets.token_bytes(U.LENGTH_COOKIE)
+        return packet
+
+    def compile_kex_packet(first_kex_packet_follows:bool, config:dict):
+        """
+        Description:
+            Returns the SSH_MSG_KEXINIT template for `config`: the whole packet with a zeroed cookie. Templates
+            are cached by the contents of the name-lists, so a changed configuration gets a new template.
+
+        Parameters:
+            See `create_kex_packet`.
+
+        Returns:
+            The template as bytes.
         """
-        content = SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_KEXINIT"].to_bytes(1)
-        content += secrets.token_bytes(16)
-        for arg in args:
-            content += SSH_Transport_Layer_Protocol_Utils.name_list_to_bytes(arg)
+        key = tuple(tuple(name_list) for name_list in config.values())
+        return SSH_Transport_Layer_Protocol_Utils.__compile_kex_packet(first_kex_packet_follows, key)
+
+    @functools.lru_cache(maxsize=KEXINIT_CACHE_SIZE)
+    def __compile_kex_packet(first_kex_packet_follows:bool, name_lists:tuple):
+        U = SSH_Transport_Layer_Protocol_Utils
+        content = bytearray(U.MSG_CODE["SSH_MSG_KEXINIT"].to_bytes(1))
+        content += bytes(U.LENGTH_COOKIE)
+        for name_list in name_lists:
+            content += U.name_list_to_bytes(name_list)
         content += first_kex_packet_follows.to_bytes(1)
         content += (0).to_bytes(4)
-        return content
-    
+        return bytes(content)
 
+    def parse_kex_packet(payload):
+        """
+        Description:
+            Parses a SSH_MSG_KEXINIT payload (see `create_kex_packet` for its fields).
 
+        Parameters:
+            `payload`: the packet's payload.
 
+        Returns:
+            A tuple with the cookie, a list with the ten name-lists and the `first_kex_packet_follows` boolean.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        if len(payload) < 1 + U.LENGTH_COOKIE + 10*4 + 5 or payload[0] != U.MSG_CODE["SSH_MSG_KEXINIT"]:
+            Logs.error(msg="Invalid SSH_MSG_KEXINIT packet!", additional=f"Payload: {repr(bytes(payload[:32]))}")
+        cookie = bytes(payload[1:1+U.LENGTH_COOKIE])
+        name_lists = U.bytes_to_name_lists(payload[1+U.LENGTH_COOKIE:-5])
+        if len(name_lists) != 10:
+            Logs.error(msg="SSH_MSG_KEXINIT packet must contain 10 name-lists!", additional=f"Found: {len(name_lists)}")
+        return cookie, name_lists, payload[-5] != 0
 
     def name_list_to_bytes(l:list):
         content = ','.join(l).encode()
         return len(content).to_bytes(4) + content
     
     def bytes_to_name_lists(b:bytes):
+        """
+        Description:
+            Parses consecutive name-lists. Sections seen recently (byte for byte) are not parsed again.
+
+        Returns:
+            A list with a list of names for every name-list.
+        """
+        return [list(name_list) for name_list in SSH_Transport_Layer_Protocol_Utils.__parse_name_lists(bytes(b))]
+
+    @functools.lru_cache(maxsize=KEXINIT_CACHE_SIZE)
+    def __parse_name_lists(b:bytes):
         lists = []
         index = 0
-        while index >= len(b):
-            length = int(b[index:index+4])
+        while index < len(b):
+            length = int.from_bytes(b[index:index+4])
             index += 4
-            name_list = b[index:index+length].decode().split(',')
+            if index + length > len(b):
+                Logs.error(msg="Name-list length exceeds the data!", additional=f"Length: {length}")
+            name_list = b[index:index+length].decode()
+            lists.append(tuple(name_list.split(',')) if name_list else ())
             index += length
-            list.append(name_list)
-        return lists
-    
-    # def generate_base_packet(payload: bytearray, cipher_block_size:int):
-    #     """
-    #     Description:
-    #         Given the payload, it creates a packet to be encrypted and sent. The packet contains:
-    #             1. Packet length field (4 bytes long)
-    #             2. Random padding length field (1 byte long)
-    #             3. Payload
-    #             4. Random Padding
-
-    #         Restrictions are:
-    #             1. Random padding has to be at least 4 bytes long and no more than 255 bytes long.
-    #             2. Packet minimum size is 16.
-    #             3. Length of 1, 2, 3 and 4 must be multiple of the cipher block size or 8 if the cipher block size is smaller than 8.
-
-    #     Parameters:
-    #         `paylaod`: the payload of the packet.
-
-    #     Returns:
-    #         A byte array containing the all 4 components concatenated in that order.
-    #     """
-    #     PACKET_FIELD_LENGTH = 4
-    #     PADDING_FIELD_LENGTH =  1
-    #     len_payload = len(payload)
-    #     len_no_padding = PACKET_FIELD_LENGTH + PADDING_FIELD_LENGTH + len_payload
-    #     c = cipher_block_size if cipher_block_size > 8 else 8
-    #     len_padding = (c - (len_no_padding % c))
-
-    #     if len_padding < 4: len_padding += c
-        
-    #     assert len_padding > 3, "Padding length has te be at lest 4 bytes!"
-    #     assert len_padding < 256, "Padding length can't be more than 255 bytes!"
-    #     assert (len_no_padding + len_padding) % c == 0, "Length of fields excluding the HMAC have to be multiple of ciphe block size or 8!"
+        return tuple(lists)
 
-    #     packet_lenght_bytes = (PADDING_FIELD_LENGTH + len_payload + len_padding).to_bytes(4)
-    #     padding_length_byte = len_padding.to_bytes(1)
+    def kexinit_cache_info():
+        """
+        Returns:
+            A dictionary with the `functools` cache statistics of the KEXINIT template and name-list caches.
+        """
+        return {
+            "templates" : SSH_Transport_Layer_Protocol_Utils.__compile_kex_packet.cache_info(),
+            "name_lists" : SSH_Transport_Layer_Protocol_Utils.__parse_name_lists.cache_info()
+        }
 
+    def create_disconnect_packet(reason:str, description:str=""):
+        """
+        Description:
+            Creates a disconnect packet. This packet contains the following fields:
+                byte         SSH_MSG_DISCONNECT
+                uint32       reason code
+                string       description in ISO-10646 UTF-8 encoding
+                string       language tag
 
+        Parameters:
+            `reason`: name of the reason in `DISCONNECT_MSG_CODES`.
+            `description`: human readable description of the reason.
 
-    #     return packet_lenght_bytes + padding_length_byte + payload + padding_bytes
+        Returns:
+            The SSH_MSG_DISCONNECT payload.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        return U.MSG_CODE["SSH_MSG_DISCONNECT"].to_bytes(1) + U.DISCONNECT_MSG_CODES[reason].to_bytes(4) + \
+               U.string_to_bytes(description.encode()) + U.string_to_bytes(b"")
+
+    def parse_disconnect_packet(payload):
+        """
+        Description:
+            Parses a SSH_MSG_DISCONNECT payload (see `create_disconnect_packet` for its fields).
+
+        Returns:
+            A tuple with the name of the reason in `DISCONNECT_MSG_CODES` (the code itself if unknown) and the description.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        if len(payload) < 1 + 4 + 4 or payload[0] != U.MSG_CODE["SSH_MSG_DISCONNECT"]:
+            Logs.error(msg="Invalid SSH_MSG_DISCONNECT packet!", additional=f"Payload: {repr(bytes(payload[:32]))}")
+        code = int.from_bytes(payload[1:5])
+        description, _ = U.read_string(payload, 5)
+        return U.DISCONNECT_REASONS.get(code, code), description.decode(errors="replace")
+
+    def string_to_bytes(b:bytes):
+        """
+        Description:
+            Encodes `b` as a SSH string: uint32 length followed by the bytes.
+        """
+        return len(b).to_bytes(4) + b
+
+    def mpint_to_bytes(n:int):
+        """
+        Description:
+            Encodes `n` as a SSH mpint: a string with the two's complement, big endian and minimal length, representation of `n`.
+        """
+        if n == 0:
+            return (0).to_bytes(4)
+        length = (n.bit_length() + 8) // 8 if n > 0 else ((-n - 1).bit_length() + 8) // 8
+        return length.to_bytes(4) + n.to_bytes(length, signed=True)
+
+    def read_string(b, index:int):
+        """
+        Description:
+            Reads the SSH string starting at `index` of `b`.
+
+        Returns:
+            A tuple with the string's bytes and the index right after it.
+        """
+        length = int.from_bytes(b[index:index+4])
+        index += 4
+        if index + length > len(b):
+            Logs.error(msg="String length exceeds the data!", additional=f"Length: {length}")
+        return bytes(b[index:index+length]), index + length
+
+    def read_mpint(b, index:int):
+        """
+        Description:
+            Reads the SSH mpint starting at `index` of `b`.
+
+        Returns:
+            A tuple with the integer and the index right after it.
+        """
+        data, index = SSH_Transport_Layer_Protocol_Utils.read_string(b, index)
+        return int.from_bytes(data, signed=True), index
 
+    def packet_lengths(len_payload:int, cipher_block_size:int):
+        """
+        Description:
+            Computes the size of the binary packet that will carry a payload of `len_payload` bytes.
+
+        Parameters:
+            `len_payload`: length of the payload.
+            `cipher_block_size`: block size of the cipher in use (8 is used if smaller).
+
+        Returns:
+            A tuple (total length, padding length). Total length includes the packet length field but not the MAC.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        c = cipher_block_size if cipher_block_size > U.MIN_BLOCK_SIZE else U.MIN_BLOCK_SIZE
+        len_no_padding = U.PACKET_HEADER_LEN + len_payload
+        len_padding = c - (len_no_padding % c)
+        if len_padding < U.MIN_PADDING_LEN: len_padding += c
+        if len_no_padding + len_padding < U.MIN_PACKET_LEN: len_padding += c
+
+        assert len_padding < 256, "Padding length can't be more than 255 bytes!"
+        return len_no_padding + len_padding, len_padding
+
+    def write_base_packet(buffer:bytearray, offset:int, payload, cipher_block_size:int):
+        """
+        Description:
+            Writes the binary packet carrying `payload` into `buffer` starting at `offset`. The packet contains:
+                1. Packet length field (4 bytes long)
+                2. Random padding length field (1 byte long)
+                3. Payload
+                4. Random Padding
+
+            Restrictions are:
+                1. Random padding has to be at least 4 bytes long and no more than 255 bytes long.
+                2. Packet minimum size is 16.
+                3. Length of 1, 2, 3 and 4 must be multiple of the cipher block size or 8 if the cipher block size is smaller than 8.
+
+            Every field is written in place, so the payload is copied exactly once and no intermediate bytes objects are created.
+
+        Parameters:
+            `buffer`: preallocated buffer. Must have room for the whole packet (see `packet_lengths`).
+            `offset`: position of `buffer` where the packet starts.
+            `payload`: the payload of the packet. Any object supporting the buffer protocol.
+            `cipher_block_size`: block size of the cipher in use.
+
+        Returns:
+            The number of bytes written.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        len_payload = len(payload)
+        total, len_padding = U.packet_lengths(len_payload, cipher_block_size)
+        if total - U.PACKET_LENGTH_FIELD_LEN > U.MAX_PACKET_LEN:
+            Logs.error(msg="Payload too big for a single packet!", additional=f"Payload length: {len_payload}")
+
+        struct.pack_into(">IB", buffer, offset, total - U.PACKET_LENGTH_FIELD_LEN, len_padding)
+        index = offset + U.PACKET_HEADER_LEN
+        buffer[index:index+len_payload] = payload
+        index += len_payload
+        buffer[index:index+len_padding] = secrets.token_bytes(len_padding)
+        return total
+
+    def generate_base_packet(payload, cipher_block_size:int):
+        """
+        Description:
+            Given the payload, it creates a packet to be encrypted and sent. See `write_base_packet` for the packet format.
+
+        Parameters:
+            `payload`: the payload of the packet.
+            `cipher_block_size`: block size of the cipher in use.
+
+        Returns:
+            A bytearray containing the packet.
+        """
+        total, _ = SSH_Transport_Layer_Protocol_Utils.packet_lengths(len(payload), cipher_block_size)
+        packet = bytearray(total)
+        SSH_Transport_Layer_Protocol_Utils.write_base_packet(packet, 0, payload, cipher_block_size)
+        return packet
@@ -0,0 +1,126 @@
+import re
+import struct
+import threading
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+
+
+class SSH_Validator():
+    """
+    Description:
+        Byte-level checks of what a client sends before the binary packet protocol starts: its ID string and the
+        header of its first packet. They work on the recieved bytes (`bytes`, `bytearray` or `memoryview`) without
+        decoding them, with matchers compiled once, so a server flooded with junk connections drops them as
+        cheaply as possible.
+
+        `screen` judges the first bytes of a connection (its preamble) and `screen_batch` a whole batch of
+        preambles in one call. A verdict is None while nothing is wrong (the preamble may still be incomplete),
+        or the name in `DISCONNECT_MSG_CODES` of the reason to drop the connection.
+
+        `SSH_Async_Transport_Layer_Protocol` servers read the first bytes of every connection into the thread's
+        `scratch` buffer and screen them there, so a rejected connection never takes a buffer from
+        `SSH_Buffer_Pool`.
+
+    Notes:
+        RFC 4253 4.2 only lets the server send lines before its ID string, so a client's preamble must start
+        with it.
+
+        The packet header rules are the ones `SSH_Packet_Decoder.next_packet` enforces on every packet.
+    """
+
+    ID_STR_PATTERN = re.compile(SSH_Transport_Layer_Protocol_Utils.ID_STR_REGEX.encode())
+    # Beginning of an ID string whose CR LF didn't arrive yet
+    PARTIAL_ID_STR_PATTERN = re.compile(rb"SSH-2\.0-[\x21-\x2C\x2E-\x7E]*(?: [\x20-\x7E]*)?\r?")
+    ID_STR_PREFIX = b"SSH-2.0-"
+    HEADER = struct.Struct(">IB")
+    # Bytes of a first read screened before the connection takes a pool buffer, an ID string and KEXINIT usually fit
+    SCRATCH_SIZE = 4096
+
+    PROTOCOL_ERROR = "SSH_DISCONNECT_PROTOCOL_ERROR"
+    VERSION_NOT_SUPPORTED = "SSH_DISCONNECT_PROTOCOL_VERSION_NOT_SUPPORTED"
+
+    local = threading.local()   # `scratch` buffer of every thread
+
+    def check_id_str(line):
+        """
+        Description:
+            Bytes version of `SSH_Transport_Layer_Protocol_Utils.check_identification_str`.
+
+        Parameters:
+            `line`: the ID string, CR LF included.
+
+        Returns:
+            True if `line` is exactly one valid ID string, False otherwise.
+        """
+        return (len(line) <= SSH_Transport_Layer_Protocol_Utils.MAX_CHAR_LEN_ID_STRING
+                and SSH_Validator.ID_STR_PATTERN.fullmatch(line) is not None)
+
+    def check_packet_header(header, block_size:int=8):
+        """
+        Parameters:
+            `header`: the first `PACKET_HEADER_LEN` bytes (packet length and padding length) of a decrypted packet.
+            `block_size`: block size of the cipher, 8 before the first key exchange.
+
+        Returns:
+            None if the length fields are valid, the error otherwise.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        packet_length, len_padding = SSH_Validator.HEADER.unpack_from(header)
+        total = U.PACKET_LENGTH_FIELD_LEN + packet_length
+        if packet_length > U.MAX_PACKET_LEN or total < U.MIN_PACKET_LEN or total % max(block_size, 8) != 0:
+            return "Invalid packet length!"
+        if len_padding < U.MIN_PADDING_LEN or len_padding > packet_length - 1:
+            return "Invalid padding length!"
+        return None
+
+    def screen(preamble):
+        """
+        Description:
+            Judges the first bytes a client sent: they must be the beginning of a valid ID string, and the packet
+            following a complete one (if its header arrived) must have valid length fields.
+
+        Parameters:
+            `preamble`: bytes recieved so far, from the start of the connection.
+
+        Returns:
+            None if nothing is wrong so far, or the reason to drop the connection.
+        """
+        U = SSH_Transport_Layer_Protocol_Utils
+        n = len(preamble)
+        head = bytes(preamble[:8])
+        if not SSH_Validator.ID_STR_PREFIX.startswith(head):
+            return SSH_Validator.VERSION_NOT_SUPPORTED if head.startswith(b"SSH-") else SSH_Validator.PROTOCOL_ERROR
+        if n <= len(SSH_Validator.ID_STR_PREFIX):
+            return None
+
+        # Nothing past the longest valid ID string is looked at
+        match = SSH_Validator.ID_STR_PATTERN.match(preamble, 0, U.MAX_CHAR_LEN_ID_STRING)
+        if match is None:
+            if n < U.MAX_CHAR_LEN_ID_STRING and SSH_Validator.PARTIAL_ID_STR_PATTERN.fullmatch(preamble) is not None:
+                return None
+            return SSH_Validator.PROTOCOL_ERROR
+        end = match.end()
+        if n - end >= U.PACKET_HEADER_LEN and SSH_Validator.check_packet_header(preamble[end:end+U.PACKET_HEADER_LEN]) is not None:
+            return SSH_Validator.PROTOCOL_ERROR
+        return None
+
+    def screen_batch(preambles):
+        """
+        Description:
+            Screens many preambles at once, e.g. every connection accepted in one round.
+
+        Returns:
+            The verdict of `screen` for every preamble, in order.
+        """
+        screen = SSH_Validator.screen
+        return [screen(preamble) for preamble in preambles]
+
+    def scratch():
+        """
+        Returns:
+            A memoryview of the calling thread's `SCRATCH_SIZE` bytes buffer, for screening a first read before
+            copying it anywhere. It is overwritten by the next read of any connection of the thread.
+        """
+        view = getattr(SSH_Validator.local, "view", None)
+        if view is None:
+            view = SSH_Validator.local.view = memoryview(bytearray(SSH_Validator.SCRATCH_SIZE))
+        return view
@@ -0,0 +1,35 @@
+import sys
+import os
+import time
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHCipher import SSH_Cipher, SSH_AES_CTR_Cipher
+
+PACKET_SIZE = 32 * 1024
+# Bytes processed per backend; the pure Python one is much slower
+TOTAL = {"python" : 2 * 2**20, "cryptography" : 256 * 2**20}
+
+
+def throughput(algorithm:str, backend:str, total:int):
+    """
+    Returns:
+        MB/s encrypting `total` bytes in packets of `PACKET_SIZE`.
+    """
+    key_length = SSH_Cipher.key_length(algorithm)
+    cipher = SSH_AES_CTR_Cipher(os.urandom(key_length), os.urandom(16), backend=backend)
+    view = memoryview(bytearray(PACKET_SIZE))
+    start = time.perf_counter()
+    for _ in range(total // PACKET_SIZE):
+        cipher.process(view)
+    return total / (time.perf_counter() - start) / 2**20
+
+
+def main():
+    print(f"Default backend: {SSH_AES_CTR_Cipher.DEFAULT_BACKEND}")
+    for backend in SSH_AES_CTR_Cipher.BACKENDS:
+        for algorithm in ["aes128-ctr", "aes192-ctr", "aes256-ctr"]:
+            print(f"{backend:>12} {algorithm}: {throughput(algorithm, backend, TOTAL.get(backend, 16 * 2**20)):8.2f} MB/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import gc
+import asyncio
+import argparse
+import tracemalloc
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHBufferPool import SSH_Buffer_Pool
+
+CONNECTIONS = 200
+# Group 1 keeps the handshakes fast, the memory of a connection doesn't depend on the group
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+
+def resident_bytes():
+    """
+    Returns:
+        The resident set size of this process, in bytes (0 where /proc isn't available).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+async def idle(connection):
+    try:
+        await connection.receive()
+    except ConnectionError:
+        pass
+
+async def idle_connections(n:int, traced:bool):
+    """
+    Description:
+        Opens `n` connections to a local server and leaves them idle. Both ends live in this process, so every
+        connection is counted twice.
+
+    Returns:
+        A tuple with the allocated (if `traced`) and resident bytes per connection end.
+    """
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=idle)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        # Warm up caches shared by every connection
+        (await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG)).close()
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        allocated, resident = tracemalloc.get_traced_memory()[0], resident_bytes()
+        connections = [await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) for _ in range(n)]
+        await asyncio.sleep(0.1)
+        gc.collect()
+        allocated, resident = tracemalloc.get_traced_memory()[0] - allocated, resident_bytes() - resident
+        tracemalloc.stop()
+        for connection in connections:
+            connection.close()
+    return allocated / (2 * n), resident / (2 * n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of idle connections.")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS, help="idle connections to open")
+    args = parser.parse_args()
+
+    # Resident memory is measured first, while freed memory can't be reused, and without tracemalloc, which has
+    # its own per-allocation overhead
+    _, resident = asyncio.run(idle_connections(args.connections, traced=False))
+    allocated, _ = asyncio.run(idle_connections(args.connections, traced=True))
+    print(f"{args.connections} idle connections")
+    print(f"allocated: {allocated:10.0f} B per connection end")
+    print(f"resident:  {resident:10.0f} B per connection end")
+    print(f"buffer pool: {SSH_Buffer_Pool.stats()}")
+
+if __name__ == "__main__":
+    main()
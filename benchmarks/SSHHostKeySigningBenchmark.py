@@ -0,0 +1,48 @@
+import sys
+import os
+import time
+import statistics
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHHostKey import SSH_RSA_Host_Key, SSH_Host_Key_Signer
+
+N_SIGNATURES = 200
+
+
+def latency(signer, n:int):
+    """
+    Returns:
+        Latency in seconds of `n` signatures requested one after another.
+    """
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        signer.sign(i.to_bytes(20))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def throughput(signer, n:int):
+    """
+    Returns:
+        Signatures per second when `n` signatures are requested at once, like concurrent handshakes would.
+    """
+    start = time.perf_counter()
+    futures = [signer.submit(i.to_bytes(20)) for i in range(n)]
+    for future in futures:
+        future.result()
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    key = SSH_RSA_Host_Key.generate(2048)
+    for backend, workers in [("inline", None), ("process", 1), ("process", os.cpu_count())]:
+        signer = SSH_Host_Key_Signer(key, backend=backend, workers=workers)
+        signer.sign(b"warm up")
+        latencies = latency(signer, N_SIGNATURES // 4)
+        print(f"{backend:<8} workers={workers or 1:<3} latency p50 {statistics.median(latencies)*1000:7.2f} ms   "
+              f"{throughput(signer, N_SIGNATURES):8.1f} signatures/s")
+        signer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+import os
+import time
+import asyncio
+import statistics
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHKeyExchange import SSH_Key_Exchange
+
+N_HANDSHAKES = 20
+# Idle time between handshakes. The pool moves work off the critical path, it does not remove it: it refills
+# while connections are idle, so on a machine with few cores it needs gaps like a real server has.
+GAP = 0.15
+
+
+async def handshake_latencies(method:str, n:int, gap:float):
+    """
+    Description:
+        Runs `n` sequential handshakes against a local server, waiting `gap` seconds between them.
+
+    Returns:
+        A list with the latency in seconds of every handshake.
+    """
+    config = {"DEFAULT_KEX_ALGS" : [method]}
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, config)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+    async with server:
+        for _ in range(n):
+            start = time.perf_counter()
+            connection = await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", config)
+            latencies.append(time.perf_counter() - start)
+            connection.close()
+            await asyncio.sleep(gap)
+    return latencies
+
+def report(name:str, latencies:list):
+    print(f"{name:<28} mean {statistics.mean(latencies)*1000:8.2f} ms   p50 {statistics.median(latencies)*1000:8.2f} ms")
+
+
+def main():
+    for method in SSH_Key_Exchange.GROUPS:
+        report(f"{method} (no pool)", asyncio.run(handshake_latencies(method, N_HANDSHAKES, GAP)))
+
+        # Both ends of every handshake take a keypair, so the pool needs two per handshake
+        pool = SSH_Key_Exchange.start_keypair_pool(size=2*N_HANDSHAKES, use_processes=True, workers=os.cpu_count())
+        pool.wait_until_full()
+        report(f"{method} (pool)", asyncio.run(handshake_latencies(method, N_HANDSHAKES, GAP)))
+        SSH_Key_Exchange.stop_keypair_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sys
+import os
+import time
+import argparse
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHLoadGenerator import SSH_Load_Generator
+from SSH.SSHMultiProcessServer import SSH_Multi_Process_Server
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+
+CONNECTIONS = 1000
+CONCURRENCY = 100
+# Group 1 keeps the handshakes fast, use --group14 for the default group
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+
+async def drain(connection):
+    """
+    Description:
+        `on_connection` of the local server: reads the bulk packets until the client closes.
+    """
+    try:
+        while True:
+            await connection.receive()
+    except OSError:
+        pass
+
+def wait_listening(port:int, ip:str, config:dict, timeout:float=10):
+    """
+    Description:
+        Workers bind their listeners after `start` returns: waits until one completes a handshake.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with SSH_Transport_Layer_Protocol.client(port, ip, config):
+                return
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def raise_file_limit():
+    """
+    Description:
+        Every connection is a file descriptor, raise the soft limit to the hard one.
+    """
+    try:
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def print_report(report:dict):
+    print(f"{report['handshakes']}/{report['connections']} handshakes in {report['seconds']:.2f} s: "
+          f"{report['handshakes_per_sec']:.1f} handshakes/s")
+    print(f"{'phase':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for phase, summary in report["phases"].items():
+        print(f"{phase:<22} {summary['p50']*1000:9.2f} {summary['p95']*1000:9.2f} {summary['p99']*1000:9.2f} {summary['max']*1000:9.2f}")
+    for reason, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+        print(f"error {reason}: {count}")
+    if report["bulk_bytes"]:
+        print(f"bulk send: {report['bulk_bytes'] / 1e6:.1f} MB at {report['bulk_bytes_per_sec'] / 1e6:.2f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opens many concurrent client connections against a server.")
+    parser.add_argument("--port", type=int, default=0, help="server's port (default: start a local server)")
+    parser.add_argument("--ip", default="localhost", help="server's address")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS, help="connections opened in total")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="connections open at the same time")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds until every connection thread has started")
+    parser.add_argument("--bulk-bytes", type=int, default=0, help="bytes every connection sends after its handshake")
+    parser.add_argument("--timeout", type=float, default=30.0, help="socket timeout of every connection")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes of the local server")
+    parser.add_argument("--group14", action="store_true", help="use diffie-hellman-group14-sha1")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    config = {} if args.group14 else CONFIG
+    generator_args = dict(ip=args.ip, config=config, connections=args.connections, concurrency=args.concurrency,
+                          ramp_up=args.ramp_up, bulk_bytes=args.bulk_bytes, timeout=args.timeout)
+    if args.port:
+        print_report(SSH_Load_Generator(args.port, **generator_args).run())
+        return
+    # Workers are forked before the generator starts any thread
+    with SSH_Multi_Process_Server(0, config, on_connection=drain, ip=args.ip, workers=args.workers) as server:
+        wait_listening(server.port, args.ip, config)
+        print_report(SSH_Load_Generator(server.port, **generator_args).run())
+        print(f"server: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
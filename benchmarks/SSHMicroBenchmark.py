@@ -0,0 +1,236 @@
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import tracemalloc
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol, SSH_Config
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHAlgorithmNegotiation import SSH_Algorithm_Negotiation
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHHostKey import SSH_Host_Key
+from SSH.SSHValidator import SSH_Validator
+
+BASELINE = os.path.join(SCRIPT_DIR, "SSHMicroBenchmarkBaseline.json")
+# Minimum time spent measuring every benchmark
+MIN_TIME = 0.5
+# Relative change in ops/sec or allocated bytes reported as a regression. Speeds are compared relative to the
+# reference benchmark, measured in the same run, so a baseline recorded on another machine still compares; timing
+# noise differs between machines though, so raise it (--threshold) on noisy ones. Allocated bytes depend on the
+# Python version: record a new baseline (--save-baseline) when it changes.
+THRESHOLD = 0.2
+# Pure Python work measured with every run: the speed of the machine and interpreter
+REFERENCE = "reference"
+
+U = SSH_Transport_Layer_Protocol_Utils
+# The defaults of `SSH_Transport_Layer_Protocol`
+CONFIG = SSH_Config.intern({})
+
+
+""" Benchmarks """
+# Every benchmark returns the function to measure, with its inputs already built
+
+def bench_reference():
+    data = [bytes([i % 256]) * 16 for i in range(64)]
+    def reference():
+        total = 0
+        for item in data:
+            total += len(item.hex()) + item[0]
+        return total
+    return reference
+
+def bench_create_id_str():
+    return lambda: U.create_id_str("2.0", "UnderstandingSSH_1.0", comments="benchmark")
+
+def bench_check_identification_str():
+    id_str = U.create_id_str("2.0", "UnderstandingSSH_1.0", comments="benchmark")
+    return lambda: U.check_identification_str(id_str)
+
+def bench_check_id_str_bytes():
+    line = U.create_id_str("2.0", "UnderstandingSSH_1.0", comments="benchmark").encode()
+    return lambda: SSH_Validator.check_id_str(line)
+
+def bench_screen_batch():
+    # What a flooded server sees: mostly junk, some real clients sending their ID string and KEXINIT
+    valid = U.create_id_str("2.0", "UnderstandingSSH_1.0").encode() + bytes(U.generate_base_packet(U.create_kex_packet(False, CONFIG), 8))
+    preambles = [b"GET / HTTP/1.1\r\n", b"\x16\x03\x01\x02\x00\x01\x00\x01\xfc\x03\x03", b"SSH-1.5-old\r\n", valid] * 25
+    return lambda: SSH_Validator.screen_batch(preambles)
+
+def bench_create_kex_packet():
+    return lambda: U.create_kex_packet(False, CONFIG)
+
+def bench_name_list_to_bytes():
+    name_list = CONFIG["MAC_CLIENT_TO_SERVER_ALGS"]
+    return lambda: U.name_list_to_bytes(name_list)
+
+def bench_bytes_to_name_lists():
+    data = b"".join(U.name_list_to_bytes(name_list) for name_list in CONFIG.values())
+    return lambda: U.bytes_to_name_lists(data)
+
+def bench_encode_packet():
+    encoder = SSH_Packet_Encoder()
+    payload = bytes(1024)
+    return lambda: encoder.encode(payload)
+
+def bench_decode_packet():
+    decoder = SSH_Packet_Decoder()
+    packet = bytes(U.generate_base_packet(bytes(1024), 8))
+    def decode():
+        decoder.feed(packet)
+        decoder.next_packet()
+    return decode
+
+def bench_negotiate():
+    lists = list(CONFIG.values())
+    return lambda: SSH_Algorithm_Negotiation.negotiate(lists, lists)
+
+def bench_negotiate_uncached():
+    lists = list(CONFIG.values())
+    def negotiate():
+        SSH_Algorithm_Negotiation.clear_cache()
+        SSH_Algorithm_Negotiation.negotiate(lists, lists)
+    return negotiate
+
+def bench_handshake():
+    SSH_Host_Key.generate_signers(CONFIG["SERVER_HOST_KEY_ALGS"]) # Generate the host keys outside of the measurement
+    def handshake():
+        server_socket, client_socket = socket.socketpair()
+        errors = []
+        def run_server():
+            try:
+                with SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True):
+                    pass
+            except Exception as e:
+                errors.append(e)
+        server = threading.Thread(target=run_server)
+        server.start()
+        try:
+            with SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False):
+                pass
+        finally:
+            server.join()
+        if errors:
+            raise errors[0]
+    return handshake
+
+BENCHMARKS = {
+    REFERENCE : bench_reference,
+    "create_id_str" : bench_create_id_str,
+    "check_identification_str" : bench_check_identification_str,
+    "check_id_str_bytes" : bench_check_id_str_bytes,
+    "screen_batch_100" : bench_screen_batch,
+    "create_kex_packet" : bench_create_kex_packet,
+    "name_list_to_bytes" : bench_name_list_to_bytes,
+    "bytes_to_name_lists" : bench_bytes_to_name_lists,
+    "encode_packet" : bench_encode_packet,
+    "decode_packet" : bench_decode_packet,
+    "negotiate" : bench_negotiate,
+    "negotiate_uncached" : bench_negotiate_uncached,
+    "handshake_socketpair" : bench_handshake
+}
+
+
+""" Measurement """
+def ops_per_sec(function, min_time:float):
+    """
+    Description:
+        Calls `function` in batches, doubling the batch until a batch takes a tenth of `min_time`, and keeps going
+        until `min_time` has passed.
+
+    Returns:
+        Calls per second.
+    """
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            function()
+        if time.perf_counter() - start >= min_time / 10:
+            break
+        batch *= 2
+
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        for _ in range(batch):
+            function()
+        calls += batch
+    return calls / (time.perf_counter() - start)
+
+def allocated_bytes(function):
+    """
+    Returns:
+        Peak memory allocated during one call of `function`, in bytes.
+    """
+    function() # Warm up caches so only the steady state is measured
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+def run(names:list, min_time:float):
+    results = {}
+    for name in [REFERENCE] + [name for name in names if name != REFERENCE]:
+        function = BENCHMARKS[name]()
+        results[name] = {"ops_per_sec" : ops_per_sec(function, min_time), "allocated_bytes" : allocated_bytes(function)}
+        print(f"{name:>26}: {results[name]['ops_per_sec']:14.1f} ops/s {results[name]['allocated_bytes']:10d} B/op")
+    return results
+
+def compare(results:dict, baseline:dict, threshold:float):
+    """
+    Description:
+        Prints every benchmark that got slower, or allocates more, than `threshold` relative to `baseline`.
+        Speeds are divided by the speed of the reference benchmark of their own run before being compared.
+
+    Returns:
+        The names of the benchmarks that regressed.
+    """
+    regressions = []
+    machine = results[REFERENCE]["ops_per_sec"] / baseline[REFERENCE]["ops_per_sec"]
+    for name, result in results.items():
+        if name not in baseline or name == REFERENCE:
+            continue
+        old = baseline[name]
+        speed = result["ops_per_sec"] / old["ops_per_sec"] / machine
+        memory = (result["allocated_bytes"] + 1) / (old["allocated_bytes"] + 1)
+        if speed < 1 - threshold or memory > 1 + threshold:
+            regressions.append(name)
+            print(f"REGRESSION {name}: {speed:.2f}x ops/s, {memory:.2f}x allocated bytes")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transport layer microbenchmarks.")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds spent measuring each benchmark")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args.benchmarks, args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import sys
+import os
+import time
+import asyncio
+import multiprocessing
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHMultiProcessServer import SSH_Multi_Process_Server
+
+DURATION = 5.0
+# Concurrent handshakes of every client process
+CONCURRENCY = 8
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group14-sha1"]}
+
+
+async def handshake_loop(port:int, deadline:float):
+    handshakes = 0
+    while time.monotonic() < deadline:
+        connection = await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG)
+        connection.close()
+        handshakes += 1
+    return handshakes
+
+async def client_process(port:int, duration:float):
+    deadline = time.monotonic() + duration
+    return sum(await asyncio.gather(*(handshake_loop(port, deadline) for _ in range(CONCURRENCY))))
+
+def run_client(port:int, duration:float):
+    return asyncio.run(client_process(port, duration))
+
+def handshakes_per_sec(workers:int, clients:int, duration:float):
+    """
+    Description:
+        Runs `clients` client processes handshaking for `duration` seconds against a server with `workers`
+        worker processes. Clients run in their own processes so their half of the crypto doesn't cap the result.
+
+    Returns:
+        Handshakes per second.
+    """
+    with SSH_Multi_Process_Server(0, CONFIG, workers=workers) as server:
+        with multiprocessing.get_context("fork").Pool(clients) as pool:
+            start = time.perf_counter()
+            handshakes = sum(pool.starmap(run_client, [(server.port, duration)] * clients))
+            return handshakes / (time.perf_counter() - start)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        rate = handshakes_per_sec(workers, clients=cores, duration=DURATION)
+        print(f"{workers:>3} workers: {rate:10.1f} handshakes/s")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+
+
+def bench_encode(payload_size:int, total_bytes:int):
+    """
+    Description:
+        Encodes packets back to back into one preallocated buffer.
+
+    Returns:
+        Throughput in MB/s of payload.
+    """
+    payload = bytes(payload_size)
+    packet_size, _ = SSH_Transport_Layer_Protocol_Utils.packet_lengths(payload_size, 8)
+    buffer = bytearray(packet_size)
+    n = total_bytes // payload_size
+
+    start = time.perf_counter()
+    for _ in range(n):
+        SSH_Transport_Layer_Protocol_Utils.write_base_packet(buffer, 0, payload, 8)
+    elapsed = time.perf_counter() - start
+    return n * payload_size / elapsed / 1e6
+
+def bench_decode(payload_size:int, total_bytes:int, chunk_size:int):
+    """
+    Description:
+        Decodes a stream of packets fed in chunks of `chunk_size` bytes, as `recv_into` would deliver them.
+
+    Returns:
+        Throughput in MB/s of payload.
+    """
+    packet = bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(bytes(payload_size), 8))
+    n = max(1, total_bytes // payload_size)
+    stream = memoryview(packet * min(n, 1024))
+    repeats = max(1, n // 1024)
+
+    decoder = SSH_Packet_Decoder()
+    decoded = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for i in range(0, len(stream), chunk_size):
+            decoder.feed(stream[i:i+chunk_size])
+            for payload in decoder.packets():
+                decoded += len(payload)
+    elapsed = time.perf_counter() - start
+    return decoded / elapsed / 1e6
+
+
+def main():
+    total = 64 * 2**20
+    for payload_size in [64, 1024, 32768]:
+        print(f"encode payload={payload_size:>6}: {bench_encode(payload_size, total):10.1f} MB/s")
+    for payload_size in [64, 1024, 32768]:
+        for chunk_size in [1460, 16384]:
+            print(f"decode payload={payload_size:>6} chunk={chunk_size:>6}: {bench_decode(payload_size, total, chunk_size):10.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+import socket
+import argparse
+import tempfile
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHTranscript import SSH_Transcript, SSH_Transcript_Reader, SSH_Transcript_Replay
+
+# Handshakes recorded when no transcripts are given
+RECORDED = 10
+REPEAT = 200
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+
+def record(directory:str, n:int):
+    """
+    Description:
+        Records `n` handshakes over socketpairs into `directory`.
+    """
+    SSH_Transcript.enable(directory)
+    try:
+        for _ in range(n):
+            server_socket, client_socket = socket.socketpair()
+            def serve():
+                with SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=CONFIG):
+                    pass
+            thread = threading.Thread(target=serve)
+            thread.start()
+            with SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False, config=CONFIG):
+                pass
+            thread.join()
+    finally:
+        SSH_Transcript.disable()
+
+def transcripts(paths:list):
+    files = []
+    for path in paths:
+        files.extend(SSH_Transcript.files(path) if os.path.isdir(path) else [path])
+    return files
+
+def replay(files:list, repeat:int):
+    summary = SSH_Transcript_Replay.parse_files(files, repeat)
+    print(f"parse:      {summary['handshakes_per_sec']:12.1f} handshakes/s {summary['bytes_per_sec'] / 1e6:8.2f} MB/s"
+          f" ({summary['transcripts']} transcripts, {summary['invalid']} invalid streams)")
+
+    start = time.perf_counter()
+    for path in files:
+        with SSH_Transcript_Reader(path) as reader:
+            SSH_Transcript_Replay.through_socketpair(reader, CONFIG)
+    print(f"socketpair: {len(files) / (time.perf_counter() - start):12.1f} handshakes/s (full server stack)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays recorded transcripts.")
+    parser.add_argument("paths", nargs="*", help="transcripts or directories of transcripts (default: record new ones)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="times every transcript is parsed")
+    args = parser.parse_args()
+
+    if args.paths:
+        replay(transcripts(args.paths), args.repeat)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        record(directory, RECORDED)
+        replay(SSH_Transcript.files(directory), args.repeat)
+
+if __name__ == "__main__":
+    main()
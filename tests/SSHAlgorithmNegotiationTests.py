@@ -0,0 +1,58 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAlgorithmNegotiation import SSH_Algorithm_Negotiation
+
+SERVER = [
+    ["diffie-hellman-group14-sha1", "diffie-hellman-group1-sha1"],
+    ["ssh-rsa"],
+    ["aes128-ctr", "none"], ["aes128-ctr", "none"],
+    ["hmac-sha1", "hmac-sha256"], ["hmac-sha1", "hmac-sha256"],
+    ["none", "zlib"], ["none", "zlib"],
+    [], []]
+
+def test_negotiate():
+    client = [
+        ["diffie-hellman-group1-sha1", "diffie-hellman-group14-sha1"],
+        ["ssh-dss", "ssh-rsa"],
+        ["aes256-ctr", "aes128-ctr"], ["none"],
+        ["hmac-sha256", "hmac-sha1"], ["hmac-md5", "hmac-sha1"],
+        ["zlib", "none"], ["none"],
+        ["en-US"], []]
+    expected = ("diffie-hellman-group1-sha1", "ssh-rsa", "aes128-ctr", "none", "hmac-sha256", "hmac-sha1", "zlib", "none", None, None)
+
+    SSH_Algorithm_Negotiation.clear_cache()
+    for _ in range(3):
+        result = SSH_Algorithm_Negotiation.negotiate(client, SERVER)
+        assert result == expected, f"negotiation returned {result} instead of {expected}!"
+
+    info = SSH_Algorithm_Negotiation.cache_info()
+    assert info["hits"] == 2 and info["misses"] == 1, f"wrong cache counters {info}!"
+
+def test_no_common_algorithm():
+    client = [list(l) for l in SERVER]
+    client[4] = ["hmac-md5"]
+    try:
+        SSH_Algorithm_Negotiation.negotiate(client, SERVER)
+    except Exception as e:
+        assert "No common algorithm" in str(e), f"wrong error for a negotiation without a common MAC algorithm: {e}"
+    else:
+        assert False, "negotiation without a common MAC algorithm should have failed!"
+
+def test_cache_is_bounded():
+    SSH_Algorithm_Negotiation.clear_cache()
+    for i in range(SSH_Algorithm_Negotiation.CACHE_SIZE + 10):
+        client = [list(l) for l in SERVER]
+        client[8] = [f"lang-{i}"]
+        SSH_Algorithm_Negotiation.negotiate(client, SERVER)
+    assert SSH_Algorithm_Negotiation.cache_info()["size"] == SSH_Algorithm_Negotiation.CACHE_SIZE, "negotiation cache grew past its maximum size!"
+
+
+def main():
+    test_negotiate()
+    test_no_common_algorithm()
+    test_cache_is_bounded()
+
+main()
@@ -0,0 +1,254 @@
+import sys
+import os
+import asyncio
+import tracemalloc
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+from SSH.SSHBufferPool import SSH_Buffer_Pool
+from SSH.SSHHostKey import SSH_Host_Key
+
+N_CLIENTS = 100
+# Memory a connection may keep while idle after its handshake
+MAX_IDLE_CONNECTION_BYTES = 16 * 1024
+N_IDLE = 20
+# Group 1 keeps the test fast, the key exchange code is the same for both groups
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+async def echo(connection):
+    try:
+        while True:
+            await connection.send(await connection.receive())
+    except ConnectionError:
+        pass
+
+async def run_client(port:int, i:int):
+    async with await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as connection:
+        message = f"hello {i}".encode() * (i % 7 + 1)
+        await connection.send(message)
+        return await connection.receive() == message
+
+async def run_concurrent_clients():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        results = await asyncio.gather(*(run_client(port, i) for i in range(N_CLIENTS)), return_exceptions=True)
+    failed = [r for r in results if r is not True]
+    assert not failed, f"{len(failed)} of {N_CLIENTS} concurrent clients failed! First: {repr(failed[0])}"
+
+async def run_bad_id_str():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("localhost", port)
+        writer.write(b"SSH-1.5-oldSoftware\r\n")
+        await reader.read(1024)
+        assert await reader.read(1024) == b"", "server didn't close a connection with an incompatible ID string!"
+        writer.close()
+
+async def run_junk_preambles():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        before = SSH_Buffer_Pool.stats()
+        for junk in (b"GET / HTTP/1.1\r\n", b"\x16\x03\x01\x02\x00", b"SSH-2.0-ok\r\n" + bytes(16)):
+            reader, writer = await asyncio.open_connection("localhost", port)
+            writer.write(junk)
+            try:
+                while await asyncio.wait_for(reader.read(1024), 5):
+                    pass
+            except ConnectionError:
+                pass
+            except asyncio.TimeoutError:
+                assert False, f"junk connection {repr(junk)} wasn't dropped!"
+            writer.close()
+        after = SSH_Buffer_Pool.stats()
+    assert (after["allocated"], after["reused"]) == (before["allocated"], before["reused"]), f"junk connections took buffers from the pool ({before} -> {after})!"
+
+async def run_known_hosts():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        known = SSH_Host_Key.known_hosts({"localhost" : [SSH_Host_Key.get_signer("ssh-rsa").k_s]})
+        (await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG, host_key_verifier=known)).close()
+        unknown = SSH_Host_Key.known_hosts({"localhost" : [b"other key"]})
+        try:
+            await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG, host_key_verifier=unknown)
+        except ConnectionError as e:
+            assert "SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE" in str(e), f"wrong reason for an unknown host key: {e}"
+        else:
+            assert False, "handshake with an unknown host key didn't fail!"
+
+async def run_rekey(rekey_packets:int=None, rekey_seconds:float=None):
+    """
+    Returns:
+        The client after echoing packets while rekeying by packet count or time.
+    """
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        async with await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as connection:
+            session_id, exchange_hash = connection.session_id, connection.exchange_hash
+            if rekey_packets is not None:
+                connection.rekey_packets = rekey_packets
+            messages = [b"\x5e" + os.urandom(i % 2000) for i in range(400)]
+            for i, message in enumerate(messages):
+                await connection.send(message)
+                if rekey_seconds is not None and i % 100 == 0:
+                    await asyncio.sleep(rekey_seconds)
+            echoed = [await connection.receive() for _ in messages]
+            assert echoed == messages, "packets were lost or changed while rekeying!"
+            assert connection.session_id == session_id and connection.exchange_hash != exchange_hash, "rekeying changed the session ID or kept the exchange hash!"
+            return connection
+
+def blocking_echo_client(port:int, messages:list):
+    with SSH_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as client:
+        client.connection.settimeout(10) # Fail instead of waiting forever for an echo held by the exchange
+        session_id, exchange_hash = client.session_id, client.exchange_hash
+        echoed = []
+        for message in messages:
+            client.send(message)
+            echoed.append(client.recieve())
+        return echoed, client.session_id == session_id and client.exchange_hash != exchange_hash
+
+async def run_rekey_blocking_client():
+    """
+    Returns:
+        The server connection after a blocking client echoed packets through it while it rekeyed.
+    """
+    connections = []
+    async def rekeying_echo(connection):
+        connection.rekey_packets = 50
+        connections.append(connection)
+        await echo(connection)
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=rekeying_echo)
+    port = server.sockets[0].getsockname()[1]
+    messages = [b"\x5e" + os.urandom(i % 500) for i in range(200)]
+    async with server:
+        echoed, rekeyed = await asyncio.get_running_loop().run_in_executor(None, blocking_echo_client, port, messages)
+    assert echoed == messages, "packets were lost or changed while the server rekeyed a blocking client!"
+    assert rekeyed, "blocking client's exchange hash didn't change or its session ID did!"
+    return connections[0]
+
+async def run_idle_memory():
+    """
+    Returns:
+        Bytes allocated per connection (each side counted as one) by `N_IDLE` idle connections.
+    """
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        await run_client(port, 0) # Warm up caches shared by every connection
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            connections = [await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) for _ in range(N_IDLE)]
+            await asyncio.sleep(0.1)
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        for connection in connections:
+            connection.close()
+    return used / (2 * N_IDLE)
+
+def payloads_after_id_str(data:bytes):
+    decoder, reader = SSH_Packet_Decoder(), SSH_ID_String_Reader()
+    decoder.writable()[:len(data)] = data
+    decoder.advance(len(data))
+    reader.read_from(decoder)
+    return [bytes(payload) for payload in decoder.packets()]
+
+async def run_version_exchange_timeout():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("localhost", port)
+        data = await asyncio.wait_for(reader.read(), 5) # Never sends its ID string
+        writer.close()
+    payloads = payloads_after_id_str(data)
+    assert len(payloads) == 2 and SSH_Transport_Layer_Protocol_Utils.parse_disconnect_packet(payloads[1])[0] == "SSH_DISCONNECT_PROTOCOL_ERROR", f"no SSH_MSG_DISCONNECT on the version exchange timeout ({payloads})!"
+
+def idle_client(port:int):
+    with SSH_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as client:
+        try:
+            client.recieve()
+        except Exception:
+            pass
+        return client.disconnect_reason
+
+async def run_idle_timeout():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reason = await asyncio.get_running_loop().run_in_executor(None, idle_client, port)
+    assert reason == ("SSH_DISCONNECT_BY_APPLICATION", "Idle timeout"), f"idle connection wasn't disconnected ({reason})!"
+
+async def run_keepalive():
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        async with await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as connection:
+            await asyncio.sleep(0.8)
+            await connection.send(b"\x5ehello")
+            assert await asyncio.wait_for(connection.receive(), 5) == b"\x5ehello", "keepalives were delivered to `receive`!"
+
+def test_timeouts():
+    T = SSH_Async_Transport_Layer_Protocol
+    timeouts = (T.VERSION_EXCHANGE_TIMEOUT, T.IDLE_TIMEOUT, T.KEEPALIVE_INTERVAL)
+    SSH_Async_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT = 0.2
+    SSH_Async_Transport_Layer_Protocol.IDLE_TIMEOUT = 0.2
+    try:
+        asyncio.run(run_version_exchange_timeout())
+        asyncio.run(run_idle_timeout())
+        # Keepalives from both sides keep either from idling out
+        SSH_Async_Transport_Layer_Protocol.IDLE_TIMEOUT = 0.3
+        SSH_Async_Transport_Layer_Protocol.KEEPALIVE_INTERVAL = 0.05
+        asyncio.run(run_keepalive())
+    finally:
+        T.VERSION_EXCHANGE_TIMEOUT, T.IDLE_TIMEOUT, T.KEEPALIVE_INTERVAL = timeouts
+
+def test_idle_memory():
+    per_connection = asyncio.run(run_idle_memory())
+    assert per_connection <= MAX_IDLE_CONNECTION_BYTES, f"an idle connection uses {per_connection:.0f} bytes, more than {MAX_IDLE_CONNECTION_BYTES}!"
+
+def test_rekey():
+    connection = asyncio.run(run_rekey(rekey_packets=100))
+    # Packets sent during an exchange are held back and counted after it, so bursts need fewer exchanges
+    assert connection.rekeys >= 2, f"only {connection.rekeys} rekeys after 800 packets with a limit of 100!"
+
+    rekey_seconds = SSH_Async_Transport_Layer_Protocol.REKEY_SECONDS
+    SSH_Async_Transport_Layer_Protocol.REKEY_SECONDS = 0.05
+    try:
+        connection = asyncio.run(run_rekey(rekey_seconds=0.1))
+    finally:
+        SSH_Async_Transport_Layer_Protocol.REKEY_SECONDS = rekey_seconds
+    assert connection.rekeys >= 2, f"only {connection.rekeys} rekeys by time!"
+
+    connection = asyncio.run(run_rekey_blocking_client())
+    assert connection.rekeys >= 2, f"only {connection.rekeys} rekeys with a blocking client!"
+
+def test_concurrent_clients():
+    asyncio.run(run_concurrent_clients())
+
+def test_known_hosts():
+    asyncio.run(run_known_hosts())
+
+def test_bad_id_str():
+    asyncio.run(run_bad_id_str())
+    asyncio.run(run_junk_preambles())
+
+
+def main():
+    test_concurrent_clients()
+    test_bad_id_str()
+    test_known_hosts()
+    test_rekey()
+    test_idle_memory()
+    test_timeouts()
+
+main()
@@ -0,0 +1,29 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHBufferPool import SSH_Buffer_Pool
+
+def test_reuse():
+    SSH_Buffer_Pool.clear()
+    buffer = SSH_Buffer_Pool.acquire(1024)
+    SSH_Buffer_Pool.release(buffer)
+    assert SSH_Buffer_Pool.acquire(1024) is buffer, "a released buffer wasn't reused!"
+    assert len(SSH_Buffer_Pool.acquire(2048)) == 2048, "pool returned a buffer of the wrong size!"
+    assert SSH_Buffer_Pool.stats()["allocated"] == 2 and SSH_Buffer_Pool.stats()["reused"] == 1, f"wrong pool counters {SSH_Buffer_Pool.stats()}!"
+
+def test_bounded():
+    SSH_Buffer_Pool.clear()
+    buffers = [SSH_Buffer_Pool.acquire(64) for _ in range(SSH_Buffer_Pool.MAX_FREE * 2)]
+    for buffer in buffers:
+        SSH_Buffer_Pool.release(buffer)
+    assert SSH_Buffer_Pool.stats()["free"] == SSH_Buffer_Pool.MAX_FREE, f"pool kept {SSH_Buffer_Pool.stats()['free']} free buffers, more than {SSH_Buffer_Pool.MAX_FREE}!"
+    SSH_Buffer_Pool.clear()
+
+
+def main():
+    test_reuse()
+    test_bounded()
+
+main()
@@ -0,0 +1,91 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHCipher import SSH_Cipher, SSH_AES, SSH_AES_CTR_Cipher
+from SSH.SSHMac import SSH_MAC
+from SSH.SSHCompression import SSH_Compressor, SSH_Decompressor
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+
+def test_aes_vectors():
+    # FIPS-197 appendix C
+    plaintext = bytes.fromhex("00112233445566778899aabbccddeeff")
+    vectors = [
+        (bytes(range(16)), "69c4e0d86a7b0430d8cdb78070b4c55a"),
+        (bytes(range(24)), "dda97ca4864cdfe06eaf70a0ec0d7191"),
+        (bytes(range(32)), "8ea2b7ca516745bfeafc49904b496089")
+    ]
+    for key, ciphertext in vectors:
+        assert SSH_AES(key).encrypt_block(plaintext).hex() == ciphertext, f"AES-{len(key) * 8} doesn't match FIPS-197!"
+
+def test_ctr_vector():
+    # NIST SP 800-38A F.5.1, processed in uneven pieces
+    key = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+    iv = bytes.fromhex("f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff")
+    data = bytearray.fromhex("6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e51")
+    for backend in SSH_AES_CTR_Cipher.BACKENDS:
+        buffer = bytearray(data)
+        view = memoryview(buffer)
+        cipher = SSH_AES_CTR_Cipher(key, iv, backend=backend)
+        cipher.process(view[:5])
+        cipher.process(view[5:21])
+        cipher.process(view[21:])
+        assert buffer.hex() == "874d6191b620e3261bef6864990db6ce9806f66b7970fdff8617187bb9fffdff", f"AES-CTR ({backend}) doesn't match SP 800-38A!"
+
+def test_keystream_refill():
+    key, iv = bytes(16), b"\xff" * 16 # The counter wraps around after the first block
+    data = os.urandom(3 * SSH_AES_CTR_Cipher.MAX_KEYSTREAM_CHUNK + 7)
+    encrypted = bytearray(data)
+    SSH_Cipher.create("aes128-ctr", key, iv).process(memoryview(encrypted))
+
+    decrypted = bytearray(encrypted)
+    view = memoryview(decrypted)
+    cipher = SSH_Cipher.create("aes128-ctr", key, iv)
+    offset = 0
+    for size in [1, 15, 1000, 70000, 16, 100000]:
+        cipher.process(view[offset:offset+size])
+        offset += size
+    cipher.process(view[offset:])
+    assert decrypted == data, "AES-CTR didn't decrypt across keystream refills!"
+
+def test_unknown():
+    try:
+        SSH_Cipher.create("3des-cbc")
+    except Exception as e:
+        assert "Unsupported encryption algorithm" in str(e), f"wrong error for an unknown cipher: {e}"
+    else:
+        assert False, "unknown cipher was accepted!"
+
+def test_defaults():
+    T = SSH_Transport_Layer_Protocol
+    assert T.ENCRYP_CLIENT_TO_SERVER_ALGS == SSH_Cipher.algorithms() and T.ENCRYP_SERVER_TO_CLIENT_ALGS == SSH_Cipher.algorithms(), "default encryption algorithms aren't the registered ones!"
+    assert T.ENCRYP_CLIENT_TO_SERVER_ALGS is not T.ENCRYP_SERVER_TO_CLIENT_ALGS, "both directions share one list of defaults!"
+
+def test_encoder_decoder():
+    encoder, decoder = SSH_Packet_Encoder(), SSH_Packet_Decoder()
+    key, iv = os.urandom(32), os.urandom(16)
+    encoder.set_keys(cipher=SSH_Cipher.create("aes256-ctr", key, iv), mac=SSH_MAC("hmac-sha1", bytes(20)), compressor=SSH_Compressor("none"))
+    decoder.set_keys(cipher=SSH_Cipher.create("aes256-ctr", key, iv), mac=SSH_MAC("hmac-sha1", bytes(20)), decompressor=SSH_Decompressor("none"))
+
+    payloads = [bytes([i]) * (i * 37) for i in range(1, 60)]
+    stream = encoder.encode_batch(payloads[:30]) + b"".join(encoder.encode(p) for p in payloads[30:])
+    assert payloads[0] not in stream, "packets were sent unencrypted!"
+    decoded = []
+    for i in range(0, len(stream), 7):
+        decoder.feed(stream[i:i+7])
+        decoded.extend(bytes(p) for p in decoder.packets())
+    assert decoded == payloads, "encrypted packets didn't decode back!"
+
+
+def main():
+    test_aes_vectors()
+    test_ctr_vector()
+    test_keystream_refill()
+    test_unknown()
+    test_defaults()
+    test_encoder_decoder()
+
+main()
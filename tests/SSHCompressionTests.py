@@ -0,0 +1,54 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHCompression import SSH_Compressor, SSH_Decompressor
+
+def round_trip(compressor:SSH_Compressor, decompressor:SSH_Decompressor, payloads:list):
+    for payload in payloads:
+        if decompressor.decompress(compressor.compress(payload)) != payload:
+            return False
+    return True
+
+def test_stream():
+    compressor, decompressor = SSH_Compressor("zlib"), SSH_Decompressor("zlib")
+    payloads = [b"ls -la\n" * (i + 1) for i in range(50)]
+    assert round_trip(compressor, decompressor, payloads), "zlib payloads didn't decompress back!"
+    assert compressor.ratio() <= 0.5, f"repetitive payloads compressed badly ({compressor.ratio()})!"
+
+def test_adaptive_bypass():
+    compressor, decompressor = SSH_Compressor("zlib"), SSH_Decompressor("zlib")
+    random_payloads = [os.urandom(1024) for _ in range(SSH_Compressor.WINDOW + 1)]
+    assert round_trip(compressor, decompressor, random_payloads), "incompressible payloads didn't decompress back!"
+    assert compressor.current_level == SSH_Compressor.BYPASS_LEVEL, "compressor didn't drop its level for incompressible payloads!"
+
+    # The stream must stay valid when the level goes back up
+    text_payloads = [b"hello " * 100] * (SSH_Compressor.RETRY_AFTER + 10)
+    assert round_trip(compressor, decompressor, text_payloads), "payloads after changing the level didn't decompress back!"
+    assert compressor.current_level == compressor.level, "compressor didn't go back to its level for compressible payloads!"
+
+def test_delayed():
+    compressor, decompressor = SSH_Compressor("zlib@openssh.com"), SSH_Decompressor("zlib@openssh.com")
+    assert compressor.compress(b"abc") == b"abc", "delayed compression started before being activated!"
+    compressor.activate()
+    decompressor.activate()
+    assert round_trip(compressor, decompressor, [b"abc" * 100]), "delayed compression didn't work after being activated!"
+
+def test_bomb():
+    compressor, decompressor = SSH_Compressor("zlib"), SSH_Decompressor("zlib", max_output=64 * 1024)
+    try:
+        decompressor.decompress(compressor.compress(bytes(10 * 2**20)))
+    except Exception as e:
+        assert "too big" in str(e), f"wrong error for a payload over the decompression limit: {e}"
+    else:
+        assert False, "payload over the decompression limit was accepted!"
+
+
+def main():
+    test_stream()
+    test_adaptive_bypass()
+    test_delayed()
+    test_bomb()
+
+main()
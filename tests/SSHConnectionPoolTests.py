@@ -0,0 +1,125 @@
+import sys
+import os
+import time
+import socket
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHConnectionPool import SSH_Connection_Pool
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+
+class Echo_Server():
+    """
+    Accepts connections and echoes every packet, following the echo of LAST_WORDS with a SSH_MSG_DISCONNECT.
+    `drop_all` closes the connections it has.
+    """
+    LAST_WORDS = b"\x5f"
+
+    def __init__(self):
+        self.listener = socket.create_server(("localhost", 0))
+        self.port = self.listener.getsockname()[1]
+        self.connections = []
+        self.handshakes = 0
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        try:
+            with SSH_Transport_Layer_Protocol.from_socket(connection, server_role=True) as transport:
+                self.handshakes += 1
+                self.connections.append(connection)
+                while True:
+                    payload = transport.recieve()
+                    transport.send(payload)
+                    if payload == Echo_Server.LAST_WORDS:
+                        transport.send(SSH_Transport_Layer_Protocol_Utils.create_disconnect_packet("SSH_DISCONNECT_BY_APPLICATION", "Bye"))
+        except Exception:
+            pass
+
+    def drop_all(self):
+        for connection in self.connections:
+            connection.shutdown(socket.SHUT_RDWR)
+        self.connections = []
+
+    def close(self):
+        self.listener.close()
+
+def echo(pool, port:int, message:bytes):
+    with pool.connection("localhost", port) as transport:
+        transport.send(message)
+        return transport.recieve() == message
+
+def test_reuse():
+    server, pool = Echo_Server(), SSH_Connection_Pool()
+    for i in range(5):
+        assert echo(pool, server.port, b"\x5e" + bytes([i])), "pooled connection echoed wrong data!"
+    assert server.handshakes == 1 and pool.hits == 4, f"pool didn't reuse the connection ({server.handshakes} handshakes, {pool.hits} hits)!"
+    pool.close()
+    server.close()
+
+def test_liveness():
+    server, pool = Echo_Server(), SSH_Connection_Pool()
+    echo(pool, server.port, b"\x5e")
+    server.drop_all()
+    time.sleep(0.05)
+    assert echo(pool, server.port, b"\x5e"), "pool handed out a dead connection!"
+    assert server.handshakes == 2, "dead connection wasn't replaced!"
+    pool.close()
+    server.close()
+
+def test_unread_data():
+    server, pool = Echo_Server(), SSH_Connection_Pool()
+    echo(pool, server.port, Echo_Server.LAST_WORDS)
+    time.sleep(0.05)
+    assert echo(pool, server.port, b"\x5e"), "pool handed out a connection with a SSH_MSG_DISCONNECT not read!"
+    assert server.handshakes == 2, "connection with unread data was reused!"
+    pool.close()
+    server.close()
+
+def test_max_per_key():
+    server, pool = Echo_Server(), SSH_Connection_Pool(max_per_key=2)
+    first = pool.checkout("localhost", server.port)
+    second = pool.checkout("localhost", server.port)
+    try:
+        pool.checkout("localhost", server.port, timeout=0.1)
+    except Exception:
+        pass
+    else:
+        assert False, "pool went over its maximum per key!"
+    threading.Timer(0.1, pool.checkin, args=(first,)).start()
+    assert pool.checkout("localhost", server.port, timeout=5) is first, "waiting checkout didn't get the connection checked in!"
+    pool.close()
+    server.close()
+
+def test_eviction():
+    server = Echo_Server()
+    pool = SSH_Connection_Pool(max_idle=1, idle_ttl=0.1)
+    first = pool.checkout("localhost", server.port)
+    second = pool.checkout("localhost", server.port)
+    pool.checkin(first)
+    pool.checkin(second)
+    assert not first.is_alive() and second.is_alive(), "least recently used connection wasn't evicted!"
+    time.sleep(0.15)
+    pool.checkout("localhost", server.port)
+    assert not second.is_alive(), "connection idle past its TTL wasn't evicted!"
+    pool.close()
+    server.close()
+
+
+def main():
+    test_reuse()
+    test_liveness()
+    test_unread_data()
+    test_max_per_key()
+    test_eviction()
+
+main()
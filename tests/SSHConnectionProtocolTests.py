@@ -0,0 +1,117 @@
+import sys
+import os
+import asyncio
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHConnectionProtocol import SSH_Connection_Protocol
+
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"], "ENCRYP_CLIENT_TO_SERVER_ALGS" : ["none"], "ENCRYP_SERVER_TO_CLIENT_ALGS" : ["none"]}
+N_CHANNELS = 50
+
+async def read_all(channel):
+    data = bytearray()
+    while True:
+        chunk = await channel.read()
+        if not chunk:
+            return bytes(data)
+        data += chunk
+
+async def echo_channel(channel):
+    while True:
+        chunk = await channel.read()
+        if not chunk:
+            break
+        await channel.write(chunk)
+    await channel.close()
+
+async def connect(on_channel=None, **options):
+    """
+    Returns:
+        A tuple (server, client connection protocol, server connection protocols).
+    """
+    server_connections = []
+    async def on_connection(transport):
+        server_connections.append(SSH_Connection_Protocol(transport, on_channel=on_channel, **options))
+    server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=on_connection)
+    port = server.sockets[0].getsockname()[1]
+    transport = await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG)
+    return server, SSH_Connection_Protocol(transport, **options), server_connections
+
+async def run_echo():
+    server, connection, _ = await connect(on_channel=echo_channel)
+    async def one_channel(i:int):
+        channel = await connection.open_channel()
+        message = os.urandom(1000 * i + 1)
+        await channel.write(message)
+        await channel.send_eof()
+        echoed = await read_all(channel)
+        await channel.close()
+        return echoed == message
+    results = await asyncio.gather(*(one_channel(i) for i in range(N_CHANNELS)))
+    assert all(results), f"{results.count(False)} of {N_CHANNELS} channels echoed wrong data!"
+    assert not connection.channels, "closed channels were not released!"
+    connection.close()
+    server.close()
+
+async def run_window():
+    # The consumer doesn't read, so the writer must stop after one window
+    window = 64 * 1024
+    server, connection, server_connections = await connect(window_size=window, max_packet_size=8 * 1024)
+    channel = await connection.open_channel()
+    remote = await server_connections[0].accept()
+    write = asyncio.ensure_future(channel.write(bytes(3 * window)))
+    await asyncio.sleep(0.2)
+    assert not write.done() and channel.remote_window == 0, "writer sent more than the window!"
+    received = 0
+    while received < 3 * window:
+        chunk = await remote.read()
+        assert len(chunk) <= 8 * 1024, "packet over the maximum packet size!"
+        received += len(chunk)
+    await write
+    connection.close()
+    server.close()
+
+class Recording_Transport():
+    """Records the recipient channel of every SSH_MSG_CHANNEL_DATA sent through `transport`."""
+    def __init__(self, transport):
+        self.transport = transport
+        self.data_packets = []
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    async def send(self, payload):
+        if payload[0] == 94: # SSH_MSG_CHANNEL_DATA
+            self.data_packets.append(int.from_bytes(payload[1:5]))
+        await self.transport.send(payload)
+
+async def run_fairness():
+    # A channel with a lot of data must not delay a channel with a little
+    server, connection, server_connections = await connect(max_packet_size=4 * 1024)
+    busy, quiet = await connection.open_channel(), await connection.open_channel()
+    connection.transport = Recording_Transport(connection.transport)
+    data_packets = connection.transport.data_packets
+
+    await asyncio.gather(busy.write(bytes(1024 * 1024)), quiet.write(bytes(8 * 1024)))
+    assert data_packets.index(quiet.remote_id) <= 1 and data_packets[:4].count(quiet.remote_id) == 2, f"the quiet channel waited for the busy one ({data_packets[:8]})!"
+    connection.close()
+    server.close()
+
+def test_echo():
+    asyncio.run(run_echo())
+
+def test_window():
+    asyncio.run(run_window())
+
+def test_fairness():
+    asyncio.run(run_fairness())
+
+
+def main():
+    test_echo()
+    test_window()
+    test_fairness()
+
+main()
@@ -0,0 +1,59 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHHostKey import SSH_Host_Key, SSH_RSA_Host_Key, SSH_DSS_Host_Key, SSH_Host_Key_Signer
+
+RSA_KEY = SSH_RSA_Host_Key.generate(1024)
+DSS_KEY = SSH_DSS_Host_Key.generate()
+
+def test_sign_and_verify():
+    for key in [RSA_KEY, DSS_KEY]:
+        data = b"exchange hash"
+        signature = key.sign(data)
+        assert SSH_Host_Key.verify(key.public_blob(), data, signature), f"valid {key.ALGORITHM} signature was rejected!"
+        assert not SSH_Host_Key.verify(key.public_blob(), b"another hash", signature), f"{key.ALGORITHM} signature of other data was accepted!"
+        tampered = signature[:-1] + bytes([signature[-1] ^ 1])
+        assert not SSH_Host_Key.verify(key.public_blob(), data, tampered), f"tampered {key.ALGORITHM} signature was accepted!"
+
+    assert not SSH_Host_Key.verify(DSS_KEY.public_blob(), b"data", RSA_KEY.sign(b"data")), "signature made with another key was accepted!"
+
+def test_backends():
+    inline = SSH_Host_Key_Signer(RSA_KEY, backend="inline")
+    process = SSH_Host_Key_Signer(RSA_KEY, backend="process", workers=2)
+    futures = [process.submit(bytes([i])) for i in range(8)]
+    for i, future in enumerate(futures):
+        # PKCS#1 v1.5 signatures are deterministic, both backends must agree
+        assert future.result() == inline.sign(bytes([i])), "process pool backend returned a different signature!"
+    process.close()
+    inline.close()
+
+    try:
+        SSH_Host_Key_Signer(RSA_KEY, backend="unknown")
+    except Exception as e:
+        assert "Unknown signing backend" in str(e), f"wrong error for an unknown backend: {e}"
+    else:
+        assert False, "unknown backend was accepted!"
+
+def test_signers():
+    SSH_Host_Key.reset()
+    # Handshakes never generate keys: a missing signer is an error
+    try:
+        SSH_Host_Key.get_signer("ssh-dss")
+    except Exception as e:
+        assert "No host key for the algorithm" in str(e), f"wrong error for a missing signer: {e}"
+    else:
+        assert False, "a signer was created by get_signer!"
+    SSH_Host_Key.set_signer("ssh-rsa", SSH_Host_Key_Signer(RSA_KEY))
+    SSH_Host_Key.generate_signers(["ssh-rsa", "ssh-dss"])
+    assert SSH_Host_Key.get_signer("ssh-rsa").host_key is RSA_KEY, "generate_signers replaced a registered signer!"
+    assert SSH_Host_Key.get_signer("ssh-dss").algorithm == "ssh-dss", "generate_signers didn't register a missing signer!"
+
+
+def main():
+    test_sign_and_verify()
+    test_backends()
+    test_signers()
+
+main()
@@ -0,0 +1,58 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+
+ID_STR = b"SSH-2.0-exampleSoftware comment\r\n"
+KEXINIT = b"\x14" + bytes(60)
+
+def read_in_chunks(stream:bytes, chunk_size:int, max_pre_id_lines:int=SSH_ID_String_Reader.DEFAULT_MAX_PRE_ID_LINES):
+    decoder = SSH_Packet_Decoder(buffer_size=4096)
+    reader = SSH_ID_String_Reader(max_pre_id_lines)
+    payloads = []
+    for i in range(0, len(stream), chunk_size):
+        decoder.feed(stream[i:i+chunk_size])
+        if reader.read_from(decoder) is not None:
+            payloads.extend(bytes(p) for p in decoder.packets())
+    return reader, payloads
+
+def test_pipelined_kexinit():
+    stream = b"Welcome!\r\nSecond banner line\r\n" + ID_STR + bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(KEXINIT, 8))
+    for chunk_size in [1, 2, 3, 10, len(stream)]:
+        reader, payloads = read_in_chunks(stream, chunk_size)
+        assert reader.id_str == ID_STR.decode(), f"wrong ID string {repr(reader.id_str)} with chunks of {chunk_size} bytes!"
+        assert reader.pre_id_lines == [b"Welcome!\r\n", b"Second banner line\r\n"], f"wrong lines before the ID string {reader.pre_id_lines}!"
+        assert payloads == [KEXINIT], f"KEXINIT sent after the ID string was lost with chunks of {chunk_size} bytes!"
+
+    # A server reading a client allows no line before the ID string
+    stream = ID_STR + bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(KEXINIT, 8))
+    for chunk_size in [1, 5, len(stream)]:
+        reader, payloads = read_in_chunks(stream, chunk_size, max_pre_id_lines=0)
+        assert reader.id_str == ID_STR.decode() and payloads == [KEXINIT], f"valid stream rejected or lost without lines before the ID string (chunks of {chunk_size} bytes)!"
+
+def test_limits():
+    fail_tests = [
+        (b"banner\r\n" * 3 + ID_STR, 2),                # Too many lines before the ID string
+        (b"SSH-2.0-" + b"a" * 300 + b"\r\n", 32),       # ID string too long
+        (b"b" * 2000, 32),                              # Line without end
+        (b"SSH-2.0-bad-software\r\n", 32),              # Invalid ID string
+        (b"GET / HTTP/1.1", 0),                         # Not an ID string, before its CR LF arrives
+    ]
+    for stream, max_pre_id_lines in fail_tests:
+        try:
+            read_in_chunks(stream, 7, max_pre_id_lines)
+        except Exception:
+            pass
+        else:
+            assert False, f"{repr(stream[:20])} should have been rejected!"
+
+
+def main():
+    test_pipelined_kexinit()
+    test_limits()
+
+main()
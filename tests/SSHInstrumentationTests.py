@@ -0,0 +1,65 @@
+import sys
+import os
+import socket
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHInstrumentation import SSH_Instrumentation, SSH_Histogram
+
+def test_histogram():
+    histogram = SSH_Histogram()
+    for i in range(1, 1001):
+        histogram.add(i / 1000)
+    p50, p99 = histogram.percentile(50), histogram.percentile(99)
+    assert 0.5 <= p50 <= 0.5 * (1 + 1 / SSH_Histogram.SUB_BUCKETS), f"wrong p50 ({p50})!"
+    assert 0.99 <= p99 <= 1.0, f"wrong p99 ({p99})!"
+    assert SSH_Histogram().percentile(50) == 0.0, "empty histogram has a percentile!"
+
+def test_disabled():
+    assert SSH_Instrumentation.connection_stats(True) is None, "connection stats created while instrumentation is disabled!"
+
+def handshake():
+    server_socket, client_socket = socket.socketpair()
+    server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True)
+    client = SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False)
+    thread = threading.Thread(target=lambda: server.__enter__())
+    thread.start()
+    client.__enter__()
+    thread.join()
+    server.__exit__()
+    client.__exit__()
+    return server, client
+
+def test_handshake():
+    phases = []
+    hook = lambda stats, phase: phases.append((stats.server_role, phase))
+    SSH_Instrumentation.reset()
+    SSH_Instrumentation.enable()
+    SSH_Instrumentation.add_hook(hook)
+    try:
+        server, client = handshake()
+    finally:
+        SSH_Instrumentation.remove_hook(hook)
+        SSH_Instrumentation.disable()
+
+    assert [phase for role, phase in phases if not role] == SSH_Instrumentation.PHASES, f"wrong phase transitions ({phases})!"
+    assert client.stats.bytes_sent == server.stats.bytes_received and server.stats.bytes_sent == client.stats.bytes_received, "bytes sent and received don't match!"
+    assert client.stats.packets_sent == server.stats.packets_received and client.stats.packets_sent == 3, "wrong packet counts!"
+    sent, received = client.stats.message_counts()
+    assert sent == {"SSH_MSG_KEXINIT" : 1, "SSH_MSG_KEXDH_INIT" : 1, "SSH_MSG_NEWKEYS" : 1}, f"wrong message counts ({sent})!"
+    assert received == {"SSH_MSG_KEXINIT" : 1, "SSH_MSG_KEXDH_REPLY" : 1, "SSH_MSG_NEWKEYS" : 1}, f"wrong message counts ({received})!"
+
+    durations = client.stats.durations()
+    assert set(durations) == set(SSH_Instrumentation.PHASES[:-1]) | {"handshake"} and min(durations.values()) >= 0, f"wrong phase durations ({durations})!"
+    summary = SSH_Instrumentation.summary()
+    assert summary["phases"]["handshake"]["count"] == 2 and summary["failures"] == 0, f"wrong aggregate ({summary})!"
+
+
+def main():
+    test_histogram()
+    test_disabled()
+    test_handshake()
+
+main()
@@ -0,0 +1,105 @@
+import sys
+import os
+import json
+import hashlib
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHKeyExchange import SSH_Key_Exchange
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+
+METHOD = "diffie-hellman-group14-sha1"
+# Exchange recorded against OpenSSH, see its "source"
+with open(os.path.join(SCRIPT_DIR, "SSHKeyExchangeVectors.json")) as f:
+    VECTORS = json.load(f)
+
+def vector_int(name:str):
+    return int(VECTORS[name], 16)
+
+def test_mpint():
+    # Examples from RFC 4251 5
+    vectors = [
+        (0, "00000000"),
+        (0x9a378f9b2e332a7, "0000000809a378f9b2e332a7"),
+        (0x80, "000000020080"),
+        (-0x1234, "00000002edcc"),
+        (-0xdeadbeef, "00000005ff21524111")]
+    for n, expected in vectors:
+        assert SSH_Transport_Layer_Protocol_Utils.mpint_to_bytes(n).hex() == expected, f"mpint encoding of {hex(n)} should be {expected}!"
+        assert SSH_Transport_Layer_Protocol_Utils.read_mpint(bytes.fromhex(expected), 0)[0] == n, f"mpint {expected} didn't decode to {hex(n)}!"
+
+def test_groups():
+    # SHA-1 of the big endian primes, as printed in RFC 2409 6.2 and RFC 3526 3
+    vectors = [
+        ("diffie-hellman-group1-sha1", 128, "c033bd4351fba3732545ea2e016d52b0fc3e69ec"),
+        ("diffie-hellman-group14-sha1", 256, "b95c799aa5dd388c6df5e72398cb9d7df40519e4")]
+    for method, length, expected in vectors:
+        p, g, _ = SSH_Key_Exchange.GROUPS[method]
+        assert p.bit_length() == length * 8 and hashlib.sha1(p.to_bytes(length)).hexdigest() == expected, f"wrong prime for {method}!"
+        assert g == 2, f"wrong generator for {method}!"
+        # Safe primes: both p and (p-1)/2 pass a Fermat test
+        for n in (p, (p - 1) // 2):
+            assert all(pow(a, n - 1, n) == 1 for a in (3, 5, 7)), f"modulus of {method} is not a safe prime!"
+
+def test_shared_secret():
+    p, g, _ = SSH_Key_Exchange.GROUPS[METHOD]
+    y, e, f = vector_int("y"), vector_int("e"), vector_int("f")
+    assert pow(g, y, p) == f, "recorded f doesn't match the recorded y!"
+    assert SSH_Key_Exchange.shared_secret(METHOD, e, y) == vector_int("k"), "wrong shared secret for OpenSSH's public value!"
+
+    for bad in [0, 1, p - 1, p]:
+        try:
+            SSH_Key_Exchange.shared_secret(METHOD, bad, y)
+        except Exception:
+            continue
+        assert False, f"public value {bad} should have been rejected!"
+
+def test_exchange_hash():
+    h = SSH_Key_Exchange.exchange_hash(METHOD, VECTORS["v_c"], VECTORS["v_s"], bytes.fromhex(VECTORS["i_c"]), bytes.fromhex(VECTORS["i_s"]),
+                                       bytes.fromhex(VECTORS["k_s"]), vector_int("e"), vector_int("f"), vector_int("k"))
+    assert h.hex() == VECTORS["h"], f"exchange hash {h.hex()} differs from the one OpenSSH verified!"
+
+def test_derive_key():
+    k, h = vector_int("k"), bytes.fromhex(VECTORS["h"])
+    # OpenSSH's first encrypted packet only decrypts and passes its MAC with the right client to server IV, key and MAC key
+    algorithms = {"ENCRYP_CLIENT_TO_SERVER_ALGS" : "aes128-ctr", "MAC_CLIENT_TO_SERVER_ALGS" : "hmac-sha1"}
+    _, incoming = SSH_Key_Exchange.derive_session_keys(METHOD, k, h, h, algorithms, server_role=True)
+    decoder = SSH_Packet_Decoder()
+    decoder.set_keys(**incoming)
+    decoder.sequence_number = VECTORS["sequence_number"]
+    decoder.feed(bytes.fromhex(VECTORS["ciphertext"]))
+    payload = decoder.next_packet()
+    assert payload is not None and bytes(payload).hex() == VECTORS["payload"], "OpenSSH's packet didn't decrypt with the derived keys!"
+
+    # Keys longer than a hash are extended with K2 = HASH(K || H || K1) (RFC 4253 7.2)
+    prefix = SSH_Transport_Layer_Protocol_Utils.mpint_to_bytes(k) + h
+    k1 = hashlib.sha1(prefix + b"C" + h).digest()
+    k2 = hashlib.sha1(prefix + k1).digest()
+    assert SSH_Key_Exchange.derive_key(METHOD, k, h, "C", h, 40) == (k1 + k2)[:40], "wrong key extension!"
+
+def test_kexdh_messages():
+    assert SSH_Key_Exchange.parse_kexdh_init(SSH_Key_Exchange.create_kexdh_init(12345)) == 12345, "SSH_MSG_KEXDH_INIT didn't parse back!"
+    assert SSH_Key_Exchange.parse_kexdh_reply(SSH_Key_Exchange.create_kexdh_reply(b"key", 678, b"sig")) == (b"key", 678, b"sig"), "SSH_MSG_KEXDH_REPLY didn't parse back!"
+
+def test_keypair_pool():
+    pool = SSH_Key_Exchange.start_keypair_pool(size=2)
+    try:
+        assert pool.wait_until_full(timeout=30), "keypair pool didn't fill up!"
+        p, g, _ = SSH_Key_Exchange.GROUPS[METHOD]
+        x, e = SSH_Key_Exchange.get_keypair(METHOD)
+        assert pow(g, x, p) == e and pool.hits == 1, "keypair pool returned a wrong keypair!"
+    finally:
+        SSH_Key_Exchange.stop_keypair_pool()
+
+
+def main():
+    test_mpint()
+    test_groups()
+    test_shared_secret()
+    test_exchange_hash()
+    test_derive_key()
+    test_kexdh_messages()
+    test_keypair_pool()
+
+main()
@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+import socket
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHLoadGenerator import SSH_Load_Generator
+from SSH.SSHMultiProcessServer import SSH_Multi_Process_Server
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from utils import Logs
+
+# Group 1 keeps the test fast, the key exchange code is the same for both groups
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+N_CONNECTIONS = 8
+
+async def drain(connection):
+    try:
+        while True:
+            await connection.receive()
+    except OSError:
+        pass
+
+def wait_listening(port:int, timeout:float=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with SSH_Transport_Layer_Protocol.client(port, "localhost", CONFIG):
+                return
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def test_load():
+    with SSH_Multi_Process_Server(0, CONFIG, on_connection=drain, workers=1) as server:
+        wait_listening(server.port)
+        generator = SSH_Load_Generator(server.port, config=CONFIG, connections=N_CONNECTIONS, concurrency=3, ramp_up=0.1, bulk_bytes=1)
+        report = generator.run()
+    assert report["handshakes"] == N_CONNECTIONS and not report["errors"], f"load didn't complete ({report['handshakes']} handshakes, errors {report['errors']})!"
+    for phase in ("connect", "version_exchange", "algorithm_negotiation", "key_exchange", "handshake"):
+        summary = report["phases"].get(phase)
+        assert summary is not None and summary["count"] == N_CONNECTIONS and summary["p50"] <= summary["p95"] <= summary["p99"] <= summary["max"], f"wrong latencies of phase {phase} ({summary})!"
+    assert report["bulk_bytes"] == N_CONNECTIONS * len(generator.bulk_payload) and report["bulk_bytes_per_sec"] > 0, f"wrong bulk send report ({report['bulk_bytes']} bytes, {report['bulk_bytes_per_sec']} B/s)!"
+
+def test_disconnect_reason():
+    U = SSH_Transport_Layer_Protocol_Utils
+    payload = U.create_disconnect_packet("SSH_DISCONNECT_TOO_MANY_CONNECTIONS", "Busy")
+    assert U.parse_disconnect_packet(payload) == ("SSH_DISCONNECT_TOO_MANY_CONNECTIONS", "Busy"), f"SSH_MSG_DISCONNECT didn't parse back ({U.parse_disconnect_packet(payload)})!"
+
+    # A server turning every connection away right after its ID string
+    listener = socket.create_server(("localhost", 0))
+    def serve():
+        for _ in range(N_CONNECTIONS):
+            connection, _ = listener.accept()
+            with connection:
+                connection.sendall(U.create_id_str("2.0", "Busy").encode() + SSH_Packet_Encoder().encode(payload))
+                while connection.recv(65536):
+                    pass
+    thread = threading.Thread(target=serve)
+    thread.start()
+    report = SSH_Load_Generator(listener.getsockname()[1], config=CONFIG, connections=N_CONNECTIONS, concurrency=2).run()
+    thread.join()
+    listener.close()
+    assert report["errors"] == {"SSH_DISCONNECT_TOO_MANY_CONNECTIONS" : N_CONNECTIONS} and report["handshakes"] == 0, f"wrong errors for a server disconnecting ({report['errors']})!"
+
+def test_refused():
+    with socket.create_server(("localhost", 0)) as s:
+        port = s.getsockname()[1]
+    report = SSH_Load_Generator(port, config=CONFIG, connections=3, concurrency=3).run()
+    assert report["errors"] == {"SSH_DISCONNECT_CONNECTION_LOST" : 3}, f"wrong errors for a refused connection ({report['errors']})!"
+    try:
+        Logs.error(msg="No common algorithm for DEFAULT_KEX_ALGS!", reason="SSH_DISCONNECT_KEY_EXCHANGE_FAILED")
+    except Exception as e:
+        assert SSH_Load_Generator.disconnect_reason(e) == "SSH_DISCONNECT_KEY_EXCHANGE_FAILED", "the reason an error was raised with wasn't used!"
+    assert SSH_Load_Generator.disconnect_reason(Exception("No common algorithm")) == "SSH_DISCONNECT_PROTOCOL_ERROR", "an error without a reason was matched by its message!"
+    assert socket.getdefaulttimeout() is None, "the run changed the process-wide socket timeout!"
+
+def test_timeout():
+    # A server that never answers: the clients' sockets time out, not the handshake timers
+    listener = socket.create_server(("localhost", 0))
+    report = SSH_Load_Generator(listener.getsockname()[1], config=CONFIG, connections=2, concurrency=2, timeout=0.3).run()
+    listener.close()
+    assert report["errors"] == {"SSH_DISCONNECT_CONNECTION_LOST" : 2} and report["seconds"] <= 5, f"clients didn't time out ({report['errors']} after {report['seconds']:.1f} s)!"
+
+
+def main():
+    test_load()
+    test_disconnect_reason()
+    test_refused()
+    test_timeout()
+
+main()
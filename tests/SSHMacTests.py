@@ -0,0 +1,60 @@
+import sys
+import os
+import hmac
+import hashlib
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHCipher import SSH_Cipher
+from SSH.SSHMac import SSH_MAC
+from SSH.SSHPacketEncoder import SSH_Packet_Encoder
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHCompression import SSH_Compressor, SSH_Decompressor
+
+def test_compute():
+    for algorithm, (digestmod, length, key_length) in SSH_MAC.ALGORITHMS.items():
+        key = bytes(range(key_length))
+        mac = SSH_MAC(algorithm, key)
+        expected = hmac.new(key, (7).to_bytes(4) + b"packet", digestmod).digest()[:length] if digestmod else b""
+        assert mac.compute(7, memoryview(b"packet")) == expected, f"wrong {algorithm} MAC!"
+        assert mac.verify(7, b"packet", expected), f"valid {algorithm} MAC was rejected!"
+        assert not (length and mac.verify(8, b"packet", expected)), f"{algorithm} MAC with a wrong sequence number was accepted!"
+
+def test_rfc2202():
+    # RFC 2202 test case 1 (the sequence number is part of the MAC'd data, so it's given as the first 4 bytes)
+    mac = SSH_MAC("hmac-sha1", b"\x0b" * 20)
+    data = b"Hi There"
+    assert mac.compute(int.from_bytes(data[:4]), data[4:]).hex() == "b617318655057264e28bc0b6fb378c8ef146be00", "hmac-sha1 doesn't match RFC 2202!"
+
+def test_batch():
+    mac = SSH_MAC("hmac-sha256", bytes(32))
+    packets = [bytes([i]) * (i + 1) for i in range(10)]
+    assert mac.compute_batch(100, packets) == [mac.compute(100 + i, p) for i, p in enumerate(packets)], "batch MACs differ from single MACs!"
+
+def test_encoder_decoder():
+    payloads = [b"first", b"second" * 10, b"third"]
+    encoder, decoder = SSH_Packet_Encoder(), SSH_Packet_Decoder()
+    encoder.set_keys(cipher=SSH_Cipher.create("none"), mac=SSH_MAC("hmac-sha1", bytes(20)), compressor=SSH_Compressor("none"))
+    decoder.set_keys(cipher=SSH_Cipher.create("none"), mac=SSH_MAC("hmac-sha1", bytes(20)), decompressor=SSH_Decompressor("none"))
+    stream = bytes(encoder.encode(payloads[0])) + bytes(encoder.encode_batch(payloads[1:]))
+    decoder.feed(stream)
+    assert [bytes(p) for p in decoder.packets()] == payloads, "packets with MACs didn't decode back!"
+
+    decoder = SSH_Packet_Decoder()
+    decoder.set_keys(cipher=SSH_Cipher.create("none"), mac=SSH_MAC("hmac-sha1", b"\x01" * 20), decompressor=SSH_Decompressor("none"))
+    decoder.feed(stream)
+    try:
+        decoder.next_packet()
+    except Exception as e:
+        assert "MAC error" in str(e), f"wrong error for a packet with a wrong MAC: {e}"
+    else:
+        assert False, "packet with a wrong MAC was accepted!"
+
+
+def main():
+    test_compute()
+    test_rfc2202()
+    test_batch()
+    test_encoder_decoder()
+
+main()
@@ -0,0 +1,129 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHMultiProcessServer import SSH_Multi_Process_Server
+from SSH.SSHHostKey import SSH_Host_Key
+
+N_CLIENTS = 20
+# Group 1 keeps the test fast, the key exchange code is the same for both groups
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+async def echo(connection):
+    try:
+        while True:
+            message = await connection.receive()
+            if message == b"\x5ecrash":
+                os._exit(1)
+            await connection.send(message)
+    except ConnectionError:
+        pass
+
+async def run_client(port:int, message:bytes, delay:float=0):
+    async with await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as connection:
+        await asyncio.sleep(delay)
+        await connection.send(message)
+        return await connection.receive() == message
+
+async def run_clients(port:int):
+    return await asyncio.gather(*(run_client(port, b"\x5e" + bytes([i])) for i in range(N_CLIENTS)), return_exceptions=True)
+
+async def run_crash(port:int):
+    connection = await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG)
+    await connection.send(b"\x5ecrash")
+    try:
+        await connection.receive()
+    except ConnectionError: # The worker exited
+        pass
+    connection.close()
+
+def wait_for(condition, timeout:float=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+def wait_serving(port:int, timeout:float=10):
+    """
+    Description:
+        Workers bind their listeners after `start` returns: waits until one completes a handshake.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            asyncio.run(run_client(port, b"\x5eready"))
+            return
+        except ConnectionRefusedError:
+            assert time.monotonic() < deadline, "workers never started listening!"
+            time.sleep(0.05)
+
+def check_serves(reuse_port:bool):
+    with SSH_Multi_Process_Server(0, CONFIG, on_connection=echo, workers=2, reuse_port=reuse_port) as server:
+        wait_serving(server.port)
+        results = asyncio.run(run_clients(server.port))
+        failed = [r for r in results if r is not True]
+        assert not failed, f"{len(failed)} of {N_CLIENTS} clients failed (reuse_port={reuse_port})! First: {repr(failed[0])}"
+        assert wait_for(lambda: server.stats()["handshakes"] == N_CLIENTS + 1), f"workers reported {server.stats()} after {N_CLIENTS + 1} handshakes (reuse_port={reuse_port})!"
+
+def test_reuse_port():
+    check_serves(reuse_port=True)
+
+def test_inherited_listener():
+    check_serves(reuse_port=False)
+
+def test_host_key():
+    # Record the host key every client is shown
+    seen = set()
+    verify = SSH_Host_Key.verify
+    def record(k_s, data, signature):
+        seen.add(bytes(k_s))
+        return verify(k_s, data, signature)
+    SSH_Host_Key.verify = record
+    try:
+        with SSH_Multi_Process_Server(0, CONFIG, on_connection=echo, workers=2) as server:
+            wait_serving(server.port)
+            asyncio.run(run_clients(server.port))
+            # Both workers must have served, SO_REUSEPORT spreads the connections by their source port
+            assert wait_for(lambda: sum(1 for counts in server.worker_stats.values() if counts["handshakes"]) == 2), f"a worker served no client! {server.worker_stats}"
+    finally:
+        SSH_Host_Key.verify = verify
+    assert seen == {SSH_Host_Key.get_signer("ssh-rsa").k_s}, f"workers served {len(seen)} different host keys!"
+
+def test_restart():
+    with SSH_Multi_Process_Server(0, CONFIG, on_connection=echo, workers=2) as server:
+        wait_serving(server.port)
+        asyncio.run(run_crash(server.port))
+        assert wait_for(lambda: server.stats()["restarts"] == 1 and server.stats()["workers"] == 2), f"crashed worker wasn't restarted! {server.stats()}"
+        wait_serving(server.port)
+        assert asyncio.run(run_clients(server.port)) == [True] * N_CLIENTS, "server didn't serve after a worker was restarted!"
+
+def test_drain():
+    server = SSH_Multi_Process_Server(0, CONFIG, on_connection=echo, workers=2, drain_timeout=5)
+    server.start()
+    wait_serving(server.port)
+    results = []
+    client = threading.Thread(target=lambda: results.append(asyncio.run(run_client(server.port, b"\x5edrain", delay=1))))
+    client.start()
+    try:
+        assert wait_for(lambda: server.stats()["active"] == 1), f"connection never became active! {server.stats()}"
+    finally:
+        server.stop() # Returns once the connection finished
+        client.join()
+    assert results == [True], f"connection wasn't drained before the worker stopped! {results}"
+    assert server.stats()["workers"] == 0 and server.stats()["active"] == 0, f"workers still running after stop! {server.stats()}"
+
+def main():
+    test_reuse_port()
+    test_inherited_listener()
+    test_host_key()
+    test_restart()
+    test_drain()
+
+main()
@@ -0,0 +1,75 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+
+PAYLOADS = [b"\x14" + bytes(range(200)), b"a", b"", b"hello world" * 50, bytes(1000)]
+
+def test_generate_base_packet():
+    for block_size in [0, 8, 16]:
+        for payload in PAYLOADS:
+            packet = SSH_Transport_Layer_Protocol_Utils.generate_base_packet(payload, block_size)
+            packet_length = int.from_bytes(packet[:4])
+            padding_length = packet[4]
+            assert len(packet) % max(block_size, 8) == 0 and len(packet) >= 16, f"packet of length {len(packet)} isn't aligned to block size {block_size}!"
+            assert packet_length == len(packet) - 4 and padding_length >= 4, f"wrong length fields ({packet_length}, {padding_length})!"
+            assert packet[5:5+len(payload)] == payload, f"payload {repr(payload[:10])} wasn't written correctly!"
+
+def test_decoder_any_split():
+    stream = b"".join(bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(p, 8)) for p in PAYLOADS)
+
+    for chunk_size in [1, 2, 3, 5, 7, 16, 100, len(stream)]:
+        decoder = SSH_Packet_Decoder(buffer_size=4096)
+        decoded = []
+        for i in range(0, len(stream), chunk_size):
+            decoder.feed(stream[i:i+chunk_size])
+            decoded.extend(bytes(p) for p in decoder.packets())
+        assert decoded == PAYLOADS, f"decoding with chunks of {chunk_size} bytes returned the wrong payloads!"
+        assert decoder.pending() == 0 and decoder.sequence_number == len(PAYLOADS), f"decoder state is wrong after chunks of {chunk_size} bytes!"
+
+def test_decoder_recv_into():
+    import socket
+    a, b = socket.socketpair()
+    with a, b:
+        for p in PAYLOADS:
+            a.sendall(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(p, 8))
+        a.close()
+        decoder = SSH_Packet_Decoder()
+        decoded = []
+        while decoder.recv_into(b) > 0:
+            decoded.extend(bytes(p) for p in decoder.packets())
+        assert decoded == PAYLOADS, "decoding from a socket returned the wrong payloads!"
+
+def test_decoder_release():
+    packet = bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(PAYLOADS[0], 8))
+    decoder = SSH_Packet_Decoder(buffer_size=4096)
+    assert decoder.buffer is None, "decoder took a buffer before any data arrived!"
+    decoder.feed(packet + packet[:10])
+    next(decoder.packets())
+    assert not decoder.release() and decoder.buffer is not None, "decoder gave back a buffer holding part of a packet!"
+    decoder.feed(packet[10:])
+    assert bytes(decoder.next_packet()) == PAYLOADS[0], "packet split across the release attempt was decoded wrong!"
+    assert decoder.release() and decoder.buffer is None, "decoder kept its buffer with nothing buffered!"
+
+def test_decoder_rejects_bad_length():
+    decoder = SSH_Packet_Decoder()
+    decoder.feed((10**6).to_bytes(4) + b"\x04")
+    try:
+        decoder.next_packet()
+    except Exception as e:
+        assert "Invalid packet length" in str(e), f"wrong error for a packet length over the maximum: {e}"
+    else:
+        assert False, "a packet length over the maximum was accepted!"
+
+
+def main():
+    test_generate_base_packet()
+    test_decoder_any_split()
+    test_decoder_recv_into()
+    test_decoder_release()
+    test_decoder_rejects_bad_length()
+
+main()
@@ -0,0 +1,165 @@
+import sys
+import os
+import time
+import socket
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHSendQueue import SSH_Send_Queue
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+
+class Partial_Socket():
+    """Accepts at most 7 bytes per call, like a socket with a full buffer."""
+    def __init__(self):
+        self.data = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers, ancdata, flags):
+        self.calls += 1
+        taken = b"".join(bytes(b) for b in buffers)[:7]
+        self.data += taken
+        return len(taken)
+
+def read_exactly(connection:socket.socket, n:int):
+    data = bytearray()
+    while len(data) < n:
+        data += connection.recv(n - len(data))
+    return bytes(data)
+
+def test_coalescing():
+    a, b = socket.socketpair()
+    queue = SSH_Send_Queue(a, flush_threshold=1 << 20, flush_deadline=None)
+    packets = [bytes([i]) * 40 for i in range(100)]
+    for packet in packets:
+        queue.put(packet)
+    queue.flush()
+    assert queue.syscalls == 1, f"100 small packets took {queue.syscalls} system calls!"
+    assert read_exactly(b, 4000) == b"".join(packets), "coalesced packets arrived wrong!"
+    queue.close()
+    a.close(); b.close()
+
+def test_partial_writes():
+    connection = Partial_Socket()
+    queue = SSH_Send_Queue(connection, flush_deadline=None)
+    packets = [os.urandom(n) for n in (3, 20, 1, 50)]
+    for packet in packets:
+        queue.put(packet)
+    queue.flush()
+    assert bytes(connection.data) == b"".join(packets) and queue.queued_bytes == 0, "partial writes lost or reordered bytes!"
+
+def test_deadline():
+    a, b = socket.socketpair()
+    queue = SSH_Send_Queue(a, flush_threshold=1 << 20, flush_deadline=0.01)
+    queue.put(b"ping")
+    b.settimeout(1)
+    try:
+        data = b.recv(4)
+    except socket.timeout:
+        data = None
+    assert data == b"ping", f"queued packet wasn't written after the flush deadline! ({data})"
+    queue.close()
+    a.close(); b.close()
+
+def test_shared_flusher():
+    pairs = [socket.socketpair() for _ in range(20)]
+    threads = threading.active_count()
+    queues = [SSH_Send_Queue(a, flush_threshold=1 << 20, flush_deadline=0.01) for a, _ in pairs]
+    for i, queue in enumerate(queues):
+        queue.put(bytes([i]) * 4)
+    assert threading.active_count() <= threads + 1, f"{threading.active_count() - threads} flusher threads for {len(queues)} queues!"
+    for i, (_, b) in enumerate(pairs):
+        b.settimeout(1)
+        assert b.recv(4) == bytes([i]) * 4, f"queue {i} wasn't written after its flush deadline!"
+    for queue in queues:
+        queue.close()
+    for a, b in pairs:
+        a.close(); b.close()
+
+def test_stalled_queue():
+    # A producer blocked on a peer that doesn't read must not stall the flusher of the other queues
+    stalled_a, stalled_b = socket.socketpair()
+    stalled_a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    stalled = SSH_Send_Queue(stalled_a, flush_threshold=1 << 20, flush_deadline=0.01, high_watermark=64 * 1024, low_watermark=16 * 1024)
+    def produce():
+        try:
+            while True:
+                stalled.put(bytes(1024))
+        except OSError:
+            pass
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    time.sleep(0.05)
+
+    a, b = socket.socketpair()
+    queue = SSH_Send_Queue(a, flush_threshold=1 << 20, flush_deadline=0.01)
+    queue.put(b"ping")
+    b.settimeout(1)
+    try:
+        data = b.recv(4)
+    except socket.timeout:
+        data = None
+    assert data == b"ping", f"queue wasn't flushed while another one was stalled! ({data})"
+    queue.close()
+    a.close(); b.close()
+    stalled_b.close()
+    producer.join()
+    stalled_a.close()
+
+def test_watermarks():
+    a, b = socket.socketpair()
+    a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    queue = SSH_Send_Queue(a, flush_threshold=1024, flush_deadline=None, high_watermark=64 * 1024, low_watermark=16 * 1024)
+    total = 4 * 2**20
+    done = threading.Event()
+    peak = [0]
+    def produce():
+        for _ in range(total // 1024):
+            queue.put(bytes(1024))
+            peak[0] = max(peak[0], queue.queued_bytes)
+        queue.flush()
+        done.set()
+    producer = threading.Thread(target=produce)
+    producer.start()
+    time.sleep(0.1)
+    assert not done.is_set(), "producer wasn't blocked by a reader that doesn't read!"
+    received = 0
+    while received < total:
+        received += len(b.recv(65536))
+    producer.join()
+    assert peak[0] <= queue.high_watermark, f"send queue grew to {peak[0]} bytes, over its high watermark!"
+    queue.close()
+    a.close(); b.close()
+
+def test_transport_send_recieve():
+    server_socket, client_socket = socket.socketpair()
+    server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True)
+    client = SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False)
+    payloads = [b"\x5e" + bytes([i]) * i for i in range(200)]
+    received = []
+    def run_server():
+        with server:
+            for _ in range(len(payloads)):
+                received.append(server.recieve())
+            server.send_batch(received)
+    thread = threading.Thread(target=run_server)
+    thread.start()
+    with client:
+        for payload in payloads:
+            client.send(payload)
+        echoed = [client.recieve() for _ in payloads]
+    thread.join()
+    assert received == payloads and echoed == payloads, "payloads sent through the transport arrived wrong!"
+    assert client.send_queue.syscalls < len(payloads), f"{len(payloads)} packets took {client.send_queue.syscalls} system calls!"
+
+
+def main():
+    test_coalescing()
+    test_partial_writes()
+    test_deadline()
+    test_shared_flusher()
+    test_stalled_queue()
+    test_watermarks()
+    test_transport_send_recieve()
+
+main()
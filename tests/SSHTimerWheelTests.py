@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTimerWheel import SSH_Timer_Wheel
+
+def test_fire_and_cancel():
+    wheel = SSH_Timer_Wheel(tick=0.01, slots=16)
+    fired = []
+    done = threading.Event()
+    start = time.monotonic()
+    wheel.schedule(0.05, lambda: fired.append(("first", time.monotonic() - start)))
+    wheel.schedule(0.1, lambda: (fired.append(("second", time.monotonic() - start)), done.set()))
+    cancelled = wheel.schedule(0.07, lambda: fired.append(("cancelled", 0)))
+    assert cancelled.cancel() and not cancelled.cancel(), "cancel didn't return whether the timer was still armed!"
+    assert done.wait(5), "timers didn't fire!"
+    assert [name for name, _ in fired] == ["first", "second"], f"wrong timers fired ({fired})!"
+    for (name, elapsed), delay in zip(fired, (0.05, 0.1)):
+        assert elapsed >= delay, f"timer {name} fired early ({elapsed} < {delay})!"
+    time.sleep(0.05)
+    assert len(wheel) == 0 and wheel.driver is None, "driver thread still running without timers!"
+
+def test_later_revolution():
+    # 8 slots of 10 ms: a 0.2 s timer is two revolutions away and shares its slot with nearer ticks
+    wheel = SSH_Timer_Wheel(tick=0.01, slots=8)
+    fired = threading.Event()
+    start = time.monotonic()
+    wheel.schedule(0.2, fired.set)
+    assert not fired.wait(0.15), f"timer more than a revolution away fired early ({time.monotonic() - start} s)!"
+    assert fired.wait(5), "timer more than a revolution away didn't fire!"
+
+def test_many_timers():
+    wheel = SSH_Timer_Wheel(tick=0.01)
+    fired = []
+    timers = [wheel.schedule(0.5 + (i % 10) * 0.01, lambda i=i: fired.append(i)) for i in range(10000)]
+    for timer in timers[::2]:
+        timer.cancel()
+    deadline = time.monotonic() + 5
+    while wheel.driver is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(fired) == list(range(1, 10000, 2)), f"{len(fired)} of 5000 timers fired!"
+
+async def loop_timers():
+    wheel = SSH_Timer_Wheel.of_loop(asyncio.get_running_loop())
+    assert SSH_Timer_Wheel.of_loop(asyncio.get_running_loop()) is wheel, "the event loop has more than one wheel!"
+    fired = asyncio.get_running_loop().create_future()
+    wheel.schedule(0.05, lambda: fired.set_result(threading.current_thread()))
+    return await asyncio.wait_for(fired, 5)
+
+def test_loop():
+    assert asyncio.run(loop_timers()) is threading.current_thread(), "event loop timer didn't run on the loop!"
+
+
+def main():
+    test_fire_and_cancel()
+    test_later_revolution()
+    test_many_timers()
+    test_loop()
+
+main()
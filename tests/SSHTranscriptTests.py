@@ -0,0 +1,115 @@
+import sys
+import os
+import socket
+import asyncio
+import tempfile
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol
+from SSH.SSHAsyncTransportLayerProtocol import SSH_Async_Transport_Layer_Protocol
+from SSH.SSHTranscript import SSH_Transcript, SSH_Transcript_Reader, SSH_Transcript_Replay
+
+# Group 1 keeps the test fast, the key exchange code is the same for both groups
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"]}
+
+def record_sync(directory:str):
+    """
+    Returns:
+        The server's and client's transcript paths of a handshake followed by a few packets.
+    """
+    SSH_Transcript.enable(directory)
+    try:
+        server_socket, client_socket = socket.socketpair()
+        def serve():
+            with SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=CONFIG) as server:
+                for _ in range(3):
+                    server.send(server.recieve())
+                server.flush()
+        thread = threading.Thread(target=serve)
+        thread.start()
+        with SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False, config=CONFIG) as client:
+            for i in range(3):
+                client.send(b"\x5e" + bytes([i]) * 100)
+                client.recieve()
+        thread.join()
+    finally:
+        SSH_Transcript.disable()
+    paths = SSH_Transcript.files(directory)
+    return [p for p in paths if p.endswith("server.sshtr")][0], [p for p in paths if p.endswith("client.sshtr")][0]
+
+def stream(reader, direction:int):
+    return b"".join(bytes(data) for d, _, data in reader.records() if d == direction)
+
+def test_record():
+    with tempfile.TemporaryDirectory() as directory:
+        server_path, client_path = record_sync(directory)
+        with SSH_Transcript_Reader(server_path) as server, SSH_Transcript_Reader(client_path) as client:
+            assert server.server_role and not client.server_role, "transcripts have the wrong roles!"
+            assert stream(server, SSH_Transcript.INBOUND) == stream(client, SSH_Transcript.OUTBOUND), "what the client recorded sending isn't what the server recorded recieving!"
+            assert stream(client, SSH_Transcript.INBOUND) == stream(server, SSH_Transcript.OUTBOUND), "what the server recorded sending isn't what the client recorded recieving!"
+            times = [t for _, t, _ in server.records()]
+            assert times == sorted(times), "record timestamps go backwards!"
+
+def test_truncated():
+    with tempfile.TemporaryDirectory() as directory:
+        server_path, _ = record_sync(directory)
+        with SSH_Transcript_Reader(server_path) as reader:
+            n = len(list(reader.records()))
+        with open(server_path, "r+b") as f:
+            f.truncate(os.path.getsize(server_path) - 1)
+        with SSH_Transcript_Reader(server_path) as reader:
+            assert len(list(reader.records())) == n - 1, "a record cut short wasn't skipped!"
+
+def test_parse():
+    with tempfile.TemporaryDirectory() as directory:
+        server_path, _ = record_sync(directory)
+        with SSH_Transcript_Reader(server_path) as reader:
+            for direction in (SSH_Transcript.INBOUND, SSH_Transcript.OUTBOUND):
+                result = SSH_Transcript_Replay.parse(reader, direction)
+                assert result["valid_id_str"] and result["handshake_length"] is not None, f"handshake of direction {direction} wasn't parsed! {result}"
+                assert result["name_lists"][0] == CONFIG["DEFAULT_KEX_ALGS"], f"wrong KEXINIT parsed ({result['name_lists'][0]})!"
+        summary = SSH_Transcript_Replay.parse_files([server_path], repeat=3)
+        assert summary["transcripts"] == 3 and summary["invalid"] == 0 and summary["bytes"] != 0, f"wrong replay summary {summary}!"
+
+def test_through_socketpair():
+    with tempfile.TemporaryDirectory() as directory:
+        server_path, client_path = record_sync(directory)
+        for path in (server_path, client_path):
+            with SSH_Transcript_Reader(path) as reader:
+                server = SSH_Transcript_Replay.through_socketpair(reader, CONFIG)
+                assert server.session_id is not None and server.algorithms["DEFAULT_KEX_ALGS"] == CONFIG["DEFAULT_KEX_ALGS"][0], f"replayed handshake didn't complete ({path})!"
+
+async def record_async(directory:str):
+    async def echo(connection):
+        await connection.send(await connection.receive())
+    SSH_Transcript.enable(directory)
+    try:
+        server = await SSH_Async_Transport_Layer_Protocol.server(0, CONFIG, on_connection=echo)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            async with await SSH_Async_Transport_Layer_Protocol.client(port, "localhost", CONFIG) as connection:
+                await connection.send(b"\x5ehello")
+                await connection.receive()
+            await asyncio.sleep(0.05)
+    finally:
+        SSH_Transcript.disable()
+
+def test_async():
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(record_async(directory))
+        paths = SSH_Transcript.files(directory)
+        assert len(paths) == 2, f"{len(paths)} transcripts recorded for one async connection!"
+        summary = SSH_Transcript_Replay.parse_files(paths)
+        assert summary["invalid"] == 0, f"async transcripts didn't parse! {summary}"
+
+
+def main():
+    test_record()
+    test_truncated()
+    test_parse()
+    test_through_socketpair()
+    test_async()
+
+main()
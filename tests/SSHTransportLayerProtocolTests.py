@@ -0,0 +1,176 @@
+import sys
+import os
+import gc
+import time
+import socket
+import threading
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocol import SSH_Transport_Layer_Protocol, SSH_Config
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHPacketDecoder import SSH_Packet_Decoder
+from SSH.SSHIdentificationStringReader import SSH_ID_String_Reader
+from SSH.SSHHostKey import SSH_Host_Key
+
+CONFIG = {"DEFAULT_KEX_ALGS" : ["diffie-hellman-group1-sha1"], "ENCRYP_CLIENT_TO_SERVER_ALGS" : ["none"], "ENCRYP_SERVER_TO_CLIENT_ALGS" : ["none"]}
+
+def handshake(config:dict, host_key_verifier=None):
+    server_socket, client_socket = socket.socketpair()
+    server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=config)
+    client = SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False, config=config, host_key_verifier=host_key_verifier)
+    thread = threading.Thread(target=lambda: server.__enter__())
+    thread.start()
+    client.__enter__()
+    thread.join()
+    return server, client
+
+def test_config():
+    # A valid key used to replace the whole configuration with its value
+    server, client = handshake(CONFIG)
+    assert client.algorithms["DEFAULT_KEX_ALGS"] == "diffie-hellman-group1-sha1" and client.algorithms["ENCRYP_CLIENT_TO_SERVER_ALGS"] == "none", f"configuration wasn't used ({client.algorithms})!"
+    assert client.config["MAC_CLIENT_TO_SERVER_ALGS"] == tuple(SSH_Transport_Layer_Protocol.MAC_CLIENT_TO_SERVER_ALGS), "missing configuration keys didn't take the defaults!"
+    server.send(b"\x5ehello")
+    assert client.recieve() == b"\x5ehello", "packet sent after the handshake was recieved wrong!"
+    server.__exit__()
+    client.__exit__()
+
+def test_config_interned():
+    config = SSH_Config.intern(CONFIG)
+    assert config is SSH_Config.intern(dict(CONFIG)) and config is SSH_Config.intern(config), "equal configurations weren't interned into one object!"
+    assert config is not SSH_Config.intern({}) and SSH_Config.intern({}) is SSH_Config.intern({"UNKNOWN" : ["x"]}), "different configurations were interned together, or unknown keys were used!"
+    assert list(config) == SSH_Transport_Layer_Protocol.VALID_CONFIGS and hash(config) == hash(SSH_Config.intern(CONFIG)), "configuration doesn't iterate in KEXINIT order or hashes differently!"
+    try:
+        config.name_lists = ()
+    except AttributeError:
+        pass
+    else:
+        assert False, "configuration could be changed!"
+
+    # Unused configurations don't stay interned
+    n = len(SSH_Config.interned)
+    SSH_Config.intern({"LANGUAGES_CLIENT_TO_SERVER" : ["unused"]})
+    gc.collect()
+    assert len(SSH_Config.interned) == n, "an unused configuration stayed interned!"
+
+def test_slots():
+    server, client = handshake(CONFIG)
+    assert not hasattr(client, "__dict__") and not hasattr(client.decoder, "__dict__") and not hasattr(client.send_queue, "__dict__"), "connection state has a per-instance __dict__!"
+    assert client.decoder.buffer is None and server.decoder.buffer is None, "idle connection kept its recieve buffer!"
+    server.__exit__()
+    client.__exit__()
+
+def read_packets(connection:socket.socket):
+    """
+    Returns:
+        The unencrypted payloads sent after the ID string, until the other side closes.
+    """
+    decoder, reader, payloads = SSH_Packet_Decoder(), SSH_ID_String_Reader(), []
+    while decoder.recv_into(connection):
+        if reader.id_str is None and reader.read_from(decoder) is None:
+            continue
+        payloads += [bytes(payload) for payload in decoder.packets()]
+    return payloads
+
+def test_version_exchange_timeout():
+    timeout = SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT
+    SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT = 0.2
+    try:
+        server_socket, silent_socket = socket.socketpair()
+        server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=CONFIG)
+        start = time.monotonic()
+        try:
+            server.__enter__()
+        except Exception:
+            pass
+        else:
+            assert False, "handshake with a silent peer didn't time out!"
+        assert 0.2 <= time.monotonic() - start < 5 and server.timeout[0] == "SSH_DISCONNECT_PROTOCOL_ERROR", f"wrong version exchange timeout ({time.monotonic() - start} s, {server.timeout})!"
+        payloads = read_packets(silent_socket)
+        assert len(payloads) == 2 and SSH_Transport_Layer_Protocol_Utils.parse_disconnect_packet(payloads[1])[0] == "SSH_DISCONNECT_PROTOCOL_ERROR", f"SSH_MSG_DISCONNECT wasn't sent on the timeout ({payloads})!"
+        silent_socket.close()
+    finally:
+        SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT = timeout
+
+def test_timeout_while_writing():
+    # The other side doesn't read: the handshake is blocked writing its ID string when the timeout expires
+    timeout = SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT
+    SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT = 0.2
+    try:
+        server_socket, deaf_socket = socket.socketpair()
+        server_socket.setblocking(False)
+        try:
+            while True:
+                server_socket.send(bytes(4096))
+        except BlockingIOError:
+            pass
+        server_socket.setblocking(True)
+        server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=CONFIG)
+        errors = []
+        def run_server():
+            try:
+                server.__enter__()
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target=run_server, daemon=True)
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive() and errors, "handshake blocked writing to a side that doesn't read didn't time out!"
+        deaf_socket.close()
+    finally:
+        SSH_Transport_Layer_Protocol.VERSION_EXCHANGE_TIMEOUT = timeout
+
+def test_ignore():
+    server, client = handshake(CONFIG)
+    server.send(SSH_Transport_Layer_Protocol_Utils.MSG_CODE["SSH_MSG_IGNORE"].to_bytes(1) + SSH_Transport_Layer_Protocol_Utils.string_to_bytes(b"keepalive"))
+    server.send(b"\x5ehello")
+    assert client.recieve() == b"\x5ehello", "SSH_MSG_IGNORE wasn't skipped!"
+    server.__exit__()
+    client.__exit__()
+
+def test_host_key_verifier():
+    seen = []
+    server, client = handshake(CONFIG, host_key_verifier=lambda ip, port, k_s: seen.append(k_s) or True)
+    assert seen == [SSH_Host_Key.get_signer("ssh-rsa").k_s], f"verifier wasn't called with the server's host key! {seen}"
+    server.__exit__()
+    client.__exit__()
+
+    # An unknown key fails both sides with SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE
+    server_socket, client_socket = socket.socketpair()
+    server = SSH_Transport_Layer_Protocol.from_socket(server_socket, server_role=True, config=CONFIG)
+    client = SSH_Transport_Layer_Protocol.from_socket(client_socket, server_role=False, config=CONFIG, host_key_verifier=lambda ip, port, k_s: False)
+    server_errors = []
+    def serve():
+        try:
+            server.__enter__()
+        except Exception as e:
+            server_errors.append(e)
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        client.__enter__()
+    except Exception as e:
+        assert "not known" in str(e), f"wrong error for an unknown host key: {e}"
+    else:
+        assert False, "handshake with an unknown host key didn't fail!"
+    thread.join()
+    client_socket.close()
+    server_socket.close()
+    assert server_errors, "server finished a handshake the client rejected!"
+    assert server.disconnect_reason is not None and server.disconnect_reason[0] == "SSH_DISCONNECT_HOST_KEY_NOT_VERIFIABLE", f"server wasn't told why! {server.disconnect_reason}"
+
+    k_s = SSH_Host_Key.get_signer("ssh-rsa").k_s
+    verifier = SSH_Host_Key.known_hosts({"localhost" : [k_s]})
+    assert verifier("localhost", 22, k_s) and not verifier("localhost", 22, b"other key") and not verifier("example.com", 22, k_s), "known_hosts accepted the wrong keys!"
+
+
+def main():
+    test_config()
+    test_config_interned()
+    test_slots()
+    test_version_exchange_timeout()
+    test_timeout_while_writing()
+    test_ignore()
+    test_host_key_verifier()
+
+main()
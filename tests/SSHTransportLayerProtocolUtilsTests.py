@@ -61,13 +61,13 @@ def test_check_id_str():
     ]
 
     for test in pass_tests:
-        if not SSH_Transport_Layer_Protocol_Utils.check_id_str(test):
+        if not SSH_Transport_Layer_Protocol_Utils.check_identification_str(test):
             print(f"Error: {repr(test)} should've passed the test and didn't!")
  
     print("==============================================")
     
     for test in fail_tests:
-        if SSH_Transport_Layer_Protocol_Utils.check_id_str(test):
+        if SSH_Transport_Layer_Protocol_Utils.check_identification_str(test):
             print(f"Error: {repr(test)} passed the test and shouldn't have!")
 
 def test_id_string():
@@ -84,11 +84,37 @@ def test_id_string():
     
     for t1,t2 in pass_tests:
         s = SSH_Transport_Layer_Protocol_Utils.create_id_str("2.0", t1,t2)
-        if not SSH_Transport_Layer_Protocol_Utils.check_id_str(s):
+        if not SSH_Transport_Layer_Protocol_Utils.check_identification_str(s):
             print(f"Error: generated string '{repr(s)}' didn't pass th check!")
 
+def test_kex_packet():
+    config = {
+        "DEFAULT_KEX_ALGS" : ["diffie-hellman-group14-sha1", "diffie-hellman-group1-sha1"],
+        "SERVER_HOST_KEY_ALGS" : ["ssh-rsa"],
+        "ENCRYP_CLIENT_TO_SERVER_ALGS" : [],
+        "ENCRYP_SERVER_TO_CLIENT_ALGS" : [],
+        "MAC_CLIENT_TO_SERVER_ALGS" : ["hmac-sha1"],
+        "MAC_SERVER_TO_CLIENT_ALGS" : ["hmac-sha1"],
+        "COMPRSS_CLIENT_TO_SERVER_ALGS" : ["none", "zlib"],
+        "COMPRSS_SERVER_TO_CLIENT_ALGS" : ["none", "zlib"],
+        "LANGUAGES_CLIENT_TO_SERVER" : [],
+        "LANGUAGES_SERVER_TO_CLIENT" : []}
+
+    p1 = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, config)
+    p2 = SSH_Transport_Layer_Protocol_Utils.create_kex_packet(False, config)
+    assert p1[1:17] != p2[1:17], "two KEXINIT packets have the same cookie!"
+    assert p1[17:] == p2[17:], "two KEXINIT packets with the same config differ outside the cookie!"
+
+    cookie, name_lists, follows = SSH_Transport_Layer_Protocol_Utils.parse_kex_packet(p1)
+    assert cookie == p1[1:17] and name_lists == list(config.values()) and not follows, f"KEXINIT packet didn't parse back to its config! {name_lists}"
+
+    config["SERVER_HOST_KEY_ALGS"] = ["ssh-dss"]
+    _, name_lists, _ = SSH_Transport_Layer_Protocol_Utils.parse_kex_packet(SSH_Transport_Layer_Protocol_Utils.create_kex_packet(True, config))
+    assert name_lists[1] == ["ssh-dss"], "cached KEXINIT template wasn't invalidated after changing the config!"
+
 
 def main():
+    test_kex_packet()
     test_check_id_str()
 
 main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import sys
+import os
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from SSH.SSHTransportLayerProtocolUtils import SSH_Transport_Layer_Protocol_Utils
+from SSH.SSHValidator import SSH_Validator
+
+ID_STR = b"SSH-2.0-exampleSoftware comment\r\n"
+KEXINIT = b"\x14" + bytes(60)
+
+def test_check_id_str():
+    pass_tests = [
+        b"SSH-2.0-exampleSoftware\r\n",
+        b"SSH-2.0-exampleSoftware 123@#$#@-m 6\r\n",
+        b"SSH-2.0-" + b"a" * 245 + b"\r\n"]    # 255 characters
+    fail_tests = [
+        b"SSH-2.0-" + b"a" * 246 + b"\r\n",     # 256 characters
+        b"SSH-2.0-bills-SSH_3.6.3q3\r\n",
+        b"SSH-2.0-billsSSH_3.6.3q3 4434\r\r\n",
+        b"SSH-2x0-exampleSoftware\r\n",
+        b"SSH-1.99-exampleSoftware\r\n",
+        b"SSH-2.0-exampleSoftware\r\nExtra data",
+        b"SSH-2.0-exampl\xe9Software\r\n"]
+    for test in pass_tests:
+        for line in (test, bytearray(test), memoryview(test)):
+            assert SSH_Validator.check_id_str(line), f"{repr(line)} should've passed the test and didn't!"
+    for test in fail_tests:
+        assert not SSH_Validator.check_id_str(test), f"{repr(test)} passed the test and shouldn't have!"
+        assert not SSH_Transport_Layer_Protocol_Utils.check_identification_str(test.decode("latin-1")), f"str {repr(test)} passed the test and shouldn't have!"
+
+def test_check_packet_header():
+    packet = bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(KEXINIT, 8))
+    assert SSH_Validator.check_packet_header(packet) is None, f"valid packet header rejected ({SSH_Validator.check_packet_header(packet)})!"
+    fail_tests = [
+        (35001).to_bytes(4, "big") + b"\x04",   # Too long
+        (4).to_bytes(4, "big") + b"\x03",        # Too short
+        (13).to_bytes(4, "big") + b"\x04",       # Not a multiple of the block size
+        (12).to_bytes(4, "big") + b"\x03",       # Too little padding
+        (12).to_bytes(4, "big") + b"\x0C"]       # Padding longer than the packet
+    for header in fail_tests:
+        assert SSH_Validator.check_packet_header(header) is not None, f"invalid packet header {repr(header)} passed the check!"
+    header = (20).to_bytes(4, "big") + b"\x04"  # 24 bytes
+    assert SSH_Validator.check_packet_header(header, block_size=8) is None and SSH_Validator.check_packet_header(header, block_size=16) is not None, "packet length not checked against the block size!"
+
+def test_screen():
+    packet = bytes(SSH_Transport_Layer_Protocol_Utils.generate_base_packet(KEXINIT, 8))
+    preambles = [
+        (ID_STR + packet, None),
+        (b"", None),
+        (b"SSH-2", None),
+        (ID_STR[:20], None),
+        (ID_STR[:-1], None),
+        (ID_STR, None),
+        (ID_STR + packet[:4], None),                # Header not complete yet
+        (b"GET / HTTP/1.1\r\n", SSH_Validator.PROTOCOL_ERROR),
+        (b"\x16\x03\x01\x02\x00", SSH_Validator.PROTOCOL_ERROR),
+        (b"SSH-1.5-oldSoftware\r\n", SSH_Validator.VERSION_NOT_SUPPORTED),
+        (b"SSH-2.0-bad-software\r\n", SSH_Validator.PROTOCOL_ERROR),
+        (b"SSH-2.0-" + b"a" * 300, SSH_Validator.PROTOCOL_ERROR),   # No CR LF within 255 characters
+        (ID_STR + (2**31).to_bytes(4, "big") + b"\x04", SSH_Validator.PROTOCOL_ERROR)]
+    for preamble, verdict in preambles:
+        assert SSH_Validator.screen(memoryview(preamble)) == verdict, f"preamble {repr(preamble[:40])} screened as {SSH_Validator.screen(preamble)}, not {verdict}!"
+    verdicts = SSH_Validator.screen_batch(preamble for preamble, _ in preambles)
+    assert verdicts == [verdict for _, verdict in preambles], f"batch verdicts differ from single ones ({verdicts})!"
+
+def test_scratch():
+    scratch = SSH_Validator.scratch()
+    assert len(scratch) == SSH_Validator.SCRATCH_SIZE and SSH_Validator.scratch() is scratch, "a thread doesn't reuse its scratch buffer!"
+
+
+def main():
+    test_check_id_str()
+    test_check_packet_header()
+    test_screen()
+    test_scratch()
+
+main()
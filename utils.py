@@ -1,5 +1,16 @@
+class SSH_Error(Exception):
+    """
+    Description:
+        Error raised by `Logs.error`. `reason` is the name in `DISCONNECT_MSG_CODES` of the reason the connection
+        fails with, None if the error has no reason of its own.
+    """
+    def __init__(self, message:str, reason:str=None):
+        super().__init__(message)
+        self.reason = reason
+
+
 class Logs():
 
     @staticmethod
-    def error(msg:str, additional:str=""):
-        raise Exception(f"\n{msg}\n\t{additional}")
\ No newline at end of file
+    def error(msg:str, additional:str="", reason:str=None):
+        raise SSH_Error(f"\n{msg}\n\t{additional}", reason)
\ No newline at end of file